@@ -0,0 +1,26 @@
+"""Add category.updated_at for the cached category tree
+
+Revision ID: add_category_updated_at
+Revises: add_chat_history_indexes
+Create Date: 2025-10-27 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_category_updated_at'
+down_revision = 'add_chat_history_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Part of the fingerprint that tells API processes to reload the category tree
+    op.add_column(
+        'category',
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute("UPDATE category SET updated_at = created_at")
+
+def downgrade() -> None:
+    op.drop_column('category', 'updated_at')
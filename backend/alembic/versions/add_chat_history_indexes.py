@@ -0,0 +1,27 @@
+"""Add chat history and conversation list indexes
+
+Revision ID: add_chat_history_indexes
+Revises: add_notification_inbox
+Create Date: 2025-10-27 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_chat_history_indexes'
+down_revision = 'add_notification_inbox'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_message_conversation_id_created_at_id',
+        'message',
+        ['conversation_id', 'created_at', 'id'],
+        if_not_exists=True,
+    )
+    op.create_index('ix_conversationmember_user_id', 'conversationmember', ['user_id'], if_not_exists=True)
+
+def downgrade() -> None:
+    op.drop_index('ix_conversationmember_user_id', table_name='conversationmember', if_exists=True)
+    op.drop_index('ix_message_conversation_id_created_at_id', table_name='message', if_exists=True)
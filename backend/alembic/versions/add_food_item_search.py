@@ -0,0 +1,70 @@
+"""Add full-text and trigram search columns on fooditem
+
+Revision ID: add_food_item_search
+Revises: add_keyset_pagination_idx
+Create Date: 2025-10-22 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_food_item_search'
+down_revision = 'add_keyset_pagination_idx'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Text search configuration that strips Vietnamese diacritics before indexing,
+    # so "banh mi" matches "Bánh mì" and ts_headline still highlights the original words
+    op.execute("""
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'wisebite_search') THEN
+                CREATE TEXT SEARCH CONFIGURATION wisebite_search (COPY = simple);
+                ALTER TEXT SEARCH CONFIGURATION wisebite_search
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+            END IF;
+        END $$
+    """)
+
+    op.execute(
+        "ALTER TABLE fooditem ADD COLUMN IF NOT EXISTS search_text text, "
+        "ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    )
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fooditem_search_update() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_text := lower(unaccent(concat_ws(' ', NEW.name, NEW.description, NEW.ingredients)));
+            NEW.search_vector :=
+                setweight(to_tsvector('wisebite_search', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('wisebite_search', coalesce(NEW.description, '')), 'B') ||
+                setweight(to_tsvector('wisebite_search', coalesce(NEW.ingredients, '')), 'C');
+            RETURN NEW;
+        END $$
+    """)
+    op.execute("DROP TRIGGER IF EXISTS fooditem_search_update ON fooditem")
+    op.execute("""
+        CREATE TRIGGER fooditem_search_update
+            BEFORE INSERT OR UPDATE OF name, description, ingredients ON fooditem
+            FOR EACH ROW EXECUTE FUNCTION fooditem_search_update()
+    """)
+
+    # Backfill existing rows through the trigger
+    op.execute("UPDATE fooditem SET name = name")
+
+    op.execute("CREATE INDEX IF NOT EXISTS ix_fooditem_search_vector ON fooditem USING gin (search_vector)")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_fooditem_search_text_trgm "
+        "ON fooditem USING gin (search_text gin_trgm_ops)"
+    )
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_fooditem_search_text_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_fooditem_search_vector")
+    op.execute("DROP TRIGGER IF EXISTS fooditem_search_update ON fooditem")
+    op.execute("DROP FUNCTION IF EXISTS fooditem_search_update()")
+    op.execute("ALTER TABLE fooditem DROP COLUMN IF EXISTS search_vector, DROP COLUMN IF EXISTS search_text")
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS wisebite_search")
@@ -0,0 +1,28 @@
+"""Add the partial food item expiry index for the surplus-expiry engine
+
+Revision ID: add_fooditem_expires_at_index
+Revises: add_category_updated_at
+Create Date: 2025-10-28 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_fooditem_expires_at_index'
+down_revision = 'add_category_updated_at'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Range scan of active items expiring within the window, grouped by store
+    op.create_index(
+        'ix_fooditem_expires_at',
+        'fooditem',
+        ['expires_at', 'store_id'],
+        postgresql_where=sa.text('is_active'),
+        if_not_exists=True,
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_fooditem_expires_at', table_name='fooditem', if_exists=True)
@@ -0,0 +1,36 @@
+"""Add idempotencykey table for Idempotency-Key request replays
+
+Revision ID: add_idempotency_key
+Revises: add_store_city_browse_idx
+Create Date: 2025-10-24 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_idempotency_key'
+down_revision = 'add_store_city_browse_idx'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'idempotencykey',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('response_body', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'key'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_idempotencykey_expires_at', 'idempotencykey', ['expires_at'], if_not_exists=True)
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotencykey_expires_at', table_name='idempotencykey', if_exists=True)
+    op.drop_table('idempotencykey', if_exists=True)
@@ -0,0 +1,29 @@
+"""Add composite indexes backing keyset pagination
+
+Revision ID: add_keyset_pagination_idx
+Revises: add_store_location_gist
+Create Date: 2025-10-21 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_keyset_pagination_idx'
+down_revision = 'add_store_location_gist'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Each index matches a (filter..., sort key..., id) keyset used by crud._keyset_page
+    op.create_index('ix_fooditem_created_at_id', 'fooditem', ['created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_fooditem_store_id_created_at_id', 'fooditem', ['store_id', 'created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_surprisebag_created_at_id', 'surprisebag', ['created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_transaction_payer_id_date_id', 'transaction', ['payer_id', 'transaction_date', 'id'], if_not_exists=True)
+    op.create_index('ix_transaction_payee_id_date_id', 'transaction', ['payee_id', 'transaction_date', 'id'], if_not_exists=True)
+
+def downgrade() -> None:
+    op.drop_index('ix_transaction_payee_id_date_id', table_name='transaction', if_exists=True)
+    op.drop_index('ix_transaction_payer_id_date_id', table_name='transaction', if_exists=True)
+    op.drop_index('ix_surprisebag_created_at_id', table_name='surprisebag', if_exists=True)
+    op.drop_index('ix_fooditem_store_id_created_at_id', table_name='fooditem', if_exists=True)
+    op.drop_index('ix_fooditem_created_at_id', table_name='fooditem', if_exists=True)
@@ -0,0 +1,56 @@
+"""Add virtual broadcast notifications and notification broadcast jobs
+
+Revision ID: add_notification_broadcast
+Revises: add_notification_outbox
+Create Date: 2025-10-26 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_broadcast'
+down_revision = 'add_notification_outbox'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        'notification',
+        sa.Column('is_broadcast', sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index(
+        'ix_notification_broadcast_created_at',
+        'notification',
+        ['created_at'],
+        postgresql_where=sa.text('is_broadcast'),
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        'notificationbroadcastjob',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('notification_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('status', sa.Enum('PENDING', 'RUNNING', 'COMPLETED', 'FAILED', name='broadcastjobstatus'), nullable=False),
+        sa.Column('last_user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('total_recipients', sa.Integer(), nullable=False),
+        sa.Column('processed_recipients', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['notification_id'], ['notification.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_notificationbroadcastjob_notification_id', 'notificationbroadcastjob', ['notification_id'], if_not_exists=True)
+    op.create_index('ix_notificationbroadcastjob_status', 'notificationbroadcastjob', ['status'], if_not_exists=True)
+
+def downgrade() -> None:
+    op.drop_index('ix_notificationbroadcastjob_status', table_name='notificationbroadcastjob', if_exists=True)
+    op.drop_index('ix_notificationbroadcastjob_notification_id', table_name='notificationbroadcastjob', if_exists=True)
+    op.drop_table('notificationbroadcastjob', if_exists=True)
+    sa.Enum(name='broadcastjobstatus').drop(op.get_bind(), checkfirst=True)
+    op.drop_index('ix_notification_broadcast_created_at', table_name='notification', if_exists=True)
+    op.drop_column('notification', 'is_broadcast')
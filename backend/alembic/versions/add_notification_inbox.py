@@ -0,0 +1,49 @@
+"""Add notification inbox unread counters and the noti_user inbox index
+
+Revision ID: add_notification_inbox
+Revises: add_notification_broadcast
+Create Date: 2025-10-27 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_inbox'
+down_revision = 'add_notification_broadcast'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_noti_user_user_id_created_at',
+        'noti_user',
+        ['user_id', sa.text('created_at DESC'), 'notification_id'],
+        if_not_exists=True,
+    )
+
+    op.create_table(
+        'notificationinbox',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+        if_not_exists=True,
+    )
+    # Backfill a counter for every user; new users get theirs in crud.create_user
+    op.execute(
+        """
+        INSERT INTO notificationinbox (user_id, unread_count, updated_at)
+        SELECT u.id, count(nu.user_id) FILTER (WHERE NOT nu.is_read), now()
+        FROM "user" u
+        LEFT JOIN noti_user nu ON nu.user_id = u.id
+        GROUP BY u.id
+        ON CONFLICT (user_id) DO NOTHING
+        """
+    )
+
+def downgrade() -> None:
+    op.drop_table('notificationinbox', if_exists=True)
+    op.drop_index('ix_noti_user_user_id_created_at', table_name='noti_user', if_exists=True)
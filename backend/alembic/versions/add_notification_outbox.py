@@ -0,0 +1,34 @@
+"""Add notificationoutbox table for asynchronous notification delivery
+
+Revision ID: add_notification_outbox
+Revises: add_idempotency_key
+Create Date: 2025-10-25 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_outbox'
+down_revision = 'add_idempotency_key'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'notificationoutbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('title', sa.String(), nullable=False),
+        sa.Column('message', sa.String(), nullable=False),
+        sa.Column('is_important', sa.Boolean(), nullable=False),
+        sa.Column('recipient_ids', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_notificationoutbox_created_at', 'notificationoutbox', ['created_at'], if_not_exists=True)
+
+def downgrade() -> None:
+    op.drop_index('ix_notificationoutbox_created_at', table_name='notificationoutbox', if_exists=True)
+    op.drop_table('notificationoutbox', if_exists=True)
@@ -0,0 +1,99 @@
+"""Add normalised store.city and the surprise bag browse index
+
+Revision ID: add_store_city_browse_idx
+Revises: add_food_item_search
+Create Date: 2025-10-23 09:00:00.000000
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_store_city_browse_idx'
+down_revision = 'add_food_item_search'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.services.city (and search_index.normalize_text) as of this
+# revision, so later changes to the app do not change what the backfill writes.
+_CITY_ALIASES = {
+    "hcm": "ho chi minh",
+    "hcmc": "ho chi minh",
+    "tphcm": "ho chi minh",
+    "sai gon": "ho chi minh",
+    "saigon": "ho chi minh",
+    "ho chi minh city": "ho chi minh",
+    "hanoi": "ha noi",
+    "hn": "ha noi",
+    "danang": "da nang",
+}
+_KNOWN_CITIES = frozenset({
+    "ha noi", "ho chi minh", "hai phong", "da nang", "can tho",
+    "an giang", "ba ria vung tau", "bac giang", "bac kan", "bac lieu", "bac ninh", "ben tre",
+    "binh dinh", "binh duong", "binh phuoc", "binh thuan", "ca mau", "cao bang", "dak lak",
+    "dak nong", "dien bien", "dong nai", "dong thap", "gia lai", "ha giang", "ha nam", "ha tinh",
+    "hai duong", "hau giang", "hoa binh", "hung yen", "khanh hoa", "kien giang", "kon tum",
+    "lai chau", "lam dong", "lang son", "lao cai", "long an", "nam dinh", "nghe an", "ninh binh",
+    "ninh thuan", "phu tho", "phu yen", "quang binh", "quang nam", "quang ngai", "quang ninh",
+    "quang tri", "soc trang", "son la", "tay ninh", "thai binh", "thai nguyen", "thanh hoa",
+    "thua thien hue", "tien giang", "tra vinh", "tuyen quang", "vinh long", "vinh phuc", "yen bai",
+})
+_PREFIX_RE = re.compile(r"^(?:thanh pho|tp|tinh|city of)\b\.?\s*")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize_text(text):
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn").lower()
+
+
+def _city_from_address(address):
+    parts = [part for part in (address or "").split(",") if part.strip()]
+    while parts and _normalize_text(parts[-1]).strip() in ("viet nam", "vietnam", "vn"):
+        parts.pop()
+    if not parts:
+        return None
+    text = _PREFIX_RE.sub("", _normalize_text(parts[-1]).strip())
+    text = _NON_WORD_RE.sub(" ", text).strip()
+    if not text:
+        return None
+    city = _CITY_ALIASES.get(text, text)
+    # Without a comma the street cannot be told from the city
+    if len(parts) < 2 and city not in _KNOWN_CITIES:
+        return None
+    return city
+
+
+def upgrade() -> None:
+    op.add_column('store', sa.Column('city', sa.String(length=100), nullable=True))
+
+    # Backfill from the free-text address, the same way crud.create_store derives it
+    connection = op.get_bind()
+    stores = connection.execute(sa.text("SELECT id, address FROM store")).all()
+    cities = [
+        {"city": city, "id": store_id}
+        for store_id, city in ((store_id, _city_from_address(address)) for store_id, address in stores)
+        if city
+    ]
+    if cities:
+        connection.execute(sa.text("UPDATE store SET city = :city WHERE id = :id"), cities)
+
+    op.create_index('ix_store_city', 'store', ['city'], if_not_exists=True)
+    # Backs crud.browse_surprise_bags; only bags with stock left are indexed
+    op.create_index(
+        'ix_surprisebag_browse',
+        'surprisebag',
+        ['is_active', 'available_until', 'pickup_start_time'],
+        postgresql_where=sa.text('quantity_available > 0'),
+        if_not_exists=True,
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_surprisebag_browse', table_name='surprisebag', if_exists=True)
+    op.drop_index('ix_store_city', table_name='store', if_exists=True)
+    op.drop_column('store', 'city')
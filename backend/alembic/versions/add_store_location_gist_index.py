@@ -0,0 +1,28 @@
+"""Add GiST indexes on store.location for KNN nearest-store search
+
+Revision ID: add_store_location_gist
+Revises: add_categories_inventory
+Create Date: 2025-10-20 09:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_store_location_gist'
+down_revision = 'add_categories_inventory'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Geometry index (GeoAlchemy2 creates this one on create_all, older databases may lack it)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_store_location ON store USING gist (location)")
+
+    # Geography expression index: used by ST_DWithin(location::geography, ...) and the
+    # `<->` KNN operator, both of which work in meters on the sphere
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_store_location_geography "
+        "ON store USING gist (CAST(location AS geography(POINT,4326)))"
+    )
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_store_location_geography")
@@ -1,17 +1,22 @@
-from collections.abc import Generator
-from typing import Annotated
+import uuid
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated, Optional
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, Request, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from starlette.requests import HTTPConnection
+from starlette.concurrency import run_in_threadpool
 
+from app import crud
 from app.core import security
 from app.core.config import settings
 from app.core.db import engine
-from app.models import User, UserRole
+from app.models import FoodItem, User, UserRole
 from app.schemas.auth import TokenPayLoad
+from app.services import idempotency
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_STR}/auth/login/access-token")
 
@@ -38,6 +43,41 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
+def _user_from_token(token: Optional[str]) -> Optional[User]:
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
+        token_data = TokenPayLoad(**payload)
+    except (InvalidTokenError, ValidationError):
+        return None
+    # A short-lived session: streams stay open for hours and must not hold a pooled connection
+    with Session(engine) as session:
+        return session.get(User, token_data.sub)
+
+async def get_stream_user(
+    connection: HTTPConnection,
+    token: Optional[str] = Query(None, description="Access token, for clients that cannot set the Authorization header"),
+) -> User:
+    """
+    Authenticates WebSocket and SSE connections. Browsers cannot send headers with
+    either, so the token may also come as a query parameter.
+    """
+    if not token:
+        scheme, _, credentials = connection.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    user = await run_in_threadpool(_user_from_token, token)
+    if user is None:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    return user
+
+StreamUser = Annotated[User, Depends(get_stream_user)]
+
 def get_current_admin(current_user: CurrentUser) -> User:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
@@ -62,6 +102,100 @@ def get_current_vendor(current_user: CurrentUser) -> User:
 
 CurrentVendor = Annotated[User, Depends(get_current_vendor)]
 
+class VendorStore:
+    """The current vendor and their store's id."""
+    def __init__(self, user: User, store_id: uuid.UUID):
+        self.user = user
+        self.store_id = store_id
+
+def get_current_vendor_store(session: SessionDep, current_user: CurrentUser) -> VendorStore:
+    """
+    Resolves the vendor's store for the merchant endpoints. The owner -> store
+    lookup is cached (crud.get_store_id_by_owner_id), so most requests skip it.
+    """
+    if current_user.role != UserRole.VENDOR:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only vendors can manage food items",
+        )
+    store_id = crud.get_store_id_by_owner_id(session, current_user.id)
+    if store_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Store not found. Please create a store first.",
+        )
+    return VendorStore(current_user, store_id)
+
+CurrentVendorStore = Annotated[VendorStore, Depends(get_current_vendor_store)]
+
+def get_vendor_food_item(session: SessionDep, current_user: CurrentUser, item_id: uuid.UUID) -> FoodItem:
+    """
+    The food item in the path, authorised against the current user's store in one
+    joined query. Always checked in the database, never against the cached store id.
+    """
+    food_item = crud.get_vendor_food_item(session, item_id, current_user.id)
+    if food_item is None:
+        # Only the failure path pays for telling a missing item from someone else's
+        if session.get(FoodItem, item_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only manage your own food items",
+        )
+    return food_item
+
+VendorFoodItem = Annotated[FoodItem, Depends(get_vendor_food_item)]
+
+class CursorParams:
+    """
+    Query parameters shared by cursor-paginated list endpoints.
+    The total count costs an extra query: by default it is computed for offset
+    requests (backward compatible) and skipped when a cursor is given.
+    """
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's next_cursor"),
+        include_count: Optional[bool] = Query(None, description="Also return the total count of matching rows")
+    ):
+        self.cursor = cursor
+        self.count_requested = bool(include_count)
+        self.include_count = cursor is None if include_count is None else include_count
+
+CursorDep = Annotated[CursorParams, Depends()]
+
+async def get_idempotency(
+    request: Request,
+    session: SessionDep,
+    current_user: CurrentUser,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Client-generated key; a retry with the same key replays the first response"
+    ),
+) -> AsyncGenerator[idempotency.IdempotencyContext, None]:
+    """
+    Idempotency-Key handling for POSTs that create orders, bookings and payments.
+    A retry of a finished request is answered from the stored response before the
+    endpoint runs; the endpoint returns `idempotency.respond(...)` to store its result.
+    """
+    if not idempotency_key:
+        yield idempotency.IdempotencyContext(session)
+        return
+
+    request_hash = idempotency.request_fingerprint(request.method, request.url.path, await request.body())
+    context = await idempotency.begin(session, current_user.id, idempotency_key, request_hash)
+    try:
+        yield context
+    except HTTPException as e:
+        await run_in_threadpool(context.fail, e)
+        raise
+    except Exception:
+        await run_in_threadpool(context.release)
+        raise
+    else:
+        # The endpoint did not store a response (should not happen); free the key
+        await run_in_threadpool(context.release)
+
+IdempotencyDep = Annotated[idempotency.IdempotencyContext, Depends(get_idempotency)]
+
 def get_current_user_ws(session: SessionDep, token: str) -> User:
     """WebSocket version of get_current_user that accepts token as a string parameter."""
     try: 
@@ -2,7 +2,6 @@ from datetime import timedelta
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import Annotated
-import requests
 import json
 
 from app.schemas.auth import Token, GoogleSignInRequest, ForgotPasswordRequest, ResetPasswordRequest, Message, LinkPhoneNumberRequest
@@ -12,9 +11,12 @@ from app.models import User
 from app.core.security import create_access_token
 from app.core.config import settings
 from app import crud
+from app.services.http_client import http_clients
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+google_client = http_clients.register("google", "https://oauth2.googleapis.com")
+
 @router.post("/login", response_model=Token)
 def login(session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
     """ Flexible login: accepts phone number OR email as username """
@@ -291,8 +293,7 @@ async def verify_google_token(id_token: str) -> dict:
     """
     try:
         # Google's token verification endpoint
-        url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
-        response = requests.get(url)
+        response = await google_client.get("/tokeninfo", params={"id_token": id_token})
         
         print(f"Google token verification response: {response.status_code}")
         print(f"Google Client ID from settings: {settings.GOOGLE_CLIENT_ID}")
@@ -1,56 +1,20 @@
 import time
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+import uuid
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
 
 from app import crud
 from app.schemas.chat import ConversationCreate, MessageCreate, ConversationPublic, MessagePublic
 from app.schemas.user import UserPublic
-from app.api.deps import SessionDep, CurrentUser  # , CurrentUserWs
-from typing import Dict, Annotated
+from app.api.deps import SessionDep, CurrentUser
+from typing import Annotated, Optional
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-active_connections: Dict[int, WebSocket] = {}
-
-# WebSocket endpoint temporarily disabled for API docs
-# @router.websocket("/ws/chat")
-# async def chat_websocket(
-#     websocket: WebSocket, 
-#     current_user: CurrentUserWs,
-#     session: SessionDep
-#     ):
-#     await websocket.accept()
-#     active_connections[current_user.id] = websocket
-# 
-#     try:
-#         while True:
-#             msg = await websocket.receive_json()
-#             type = msg.get("type")
-#             match type:
-#                 case "message":
-#                     message_in = MessageCreate(**msg.get("data"))
-#                     message = crud.create_message(session=session, message_create=message_in, sender_id=current_user.id)
-# 
-#                     members = crud.get_conversation_members(session, message_in.conversation_id)
-#                     for member in members:
-#                         if member.user_id in active_connections and member.user_id != current_user.id:
-#                             await active_connections[member.user_id].send_json({
-#                                 "type": "message",
-#                                 "data": {
-#                                     "id": str(message.id),
-#                                     "conversation_id": str(message.conversation_id),
-#                                     "sender_id": str(message.sender_id),
-#                                     "content": message.content,
-#                                     "created_at": message.created_at.isoformat()
-#                                 }
-#                             })
-#                 case _:
-#                     await websocket.send_json({"error": "Unknown message type"})
-# 
-#     except WebSocketDisconnect:
-#         del active_connections[current_user.id]
+# New messages are pushed to the other members over /realtime/ws and /realtime/events
+# (crud.create_message publishes them through app/services/realtime.py).
 
 @router.post("/conversations/", response_model=ConversationPublic)
-async def create_conversation(
+def create_conversation(
     session: SessionDep,
     conversation_create: ConversationCreate,
     current_user: CurrentUser,
@@ -59,21 +23,71 @@ async def create_conversation(
     return conversation
 
 @router.get("/conversations/", response_model=list[ConversationPublic])
-async def get_conversations(
+def get_conversations(
+    session: SessionDep,
+    current_user: CurrentUser,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor"),
+):
+    """
+    The current user's conversations, most recently active first, with the last message
+    and the user's unread count. The next page cursor is returned in X-Next-Cursor.
+    """
+    try:
+        result = crud.get_user_conversations_and_last_message(session=session, user_id=current_user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["next_cursor"]:
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    return result["data"]
+
+@router.post("/conversations/{conversation_id}/messages/", response_model=MessagePublic)
+def send_message(
+    conversation_id: uuid.UUID,
+    content: Annotated[str, Body(embed=True, min_length=1)],
     session: SessionDep,
     current_user: CurrentUser,
 ):
-    conversations = crud.get_user_conversations_and_last_message(session=session, user_id=current_user.id)
-    return conversations
+    if not crud.is_conversation_member(session, conversation_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Not a member of this conversation")
+    message_in = MessageCreate(conversation_id=conversation_id, content=content)
+    return crud.create_message(session=session, message_create=message_in, sender_id=current_user.id)
 
 @router.get("/conversations/{conversation_id}/messages/", response_model=list[MessagePublic])
-async def get_messages(
-    conversation_id: str,
+def get_messages(
+    conversation_id: uuid.UUID,
+    session: SessionDep,
+    current_user: CurrentUser,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100, description="Page size"),
+    before: Optional[str] = Query(None, description="Cursor from X-Before-Cursor: older messages"),
+    after: Optional[str] = Query(None, description="Cursor from X-After-Cursor: newer messages"),
+):
+    """
+    One page of history, oldest first: the latest messages, or the page before/after a cursor.
+    X-Before-Cursor (absent at the start of the conversation) and X-After-Cursor page onwards.
+    """
+    if not crud.is_conversation_member(session, conversation_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Not a member of this conversation")
+    try:
+        result = crud.get_messages_by_conversation(
+            session=session, conversation_id=conversation_id, limit=limit, before=before, after=after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["before_cursor"]:
+        response.headers["X-Before-Cursor"] = result["before_cursor"]
+    if result["after_cursor"]:
+        response.headers["X-After-Cursor"] = result["after_cursor"]
+    return result["data"]
+
+@router.post("/conversations/{conversation_id}/read")
+def mark_conversation_read(
+    conversation_id: uuid.UUID,
     session: SessionDep,
     current_user: CurrentUser,
 ):
-    members = crud.get_conversation_members(session, conversation_id)
-    if current_user.id not in [member.user_id for member in members]:
+    if not crud.mark_conversation_read(session, conversation_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member of this conversation")
-    messages = crud.get_messages_by_conversation(session=session, conversation_id=conversation_id)
-    return messages
+    return {"msg": "Conversation marked as read"}
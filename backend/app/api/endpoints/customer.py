@@ -1,12 +1,14 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlmodel import Session, select, and_
 from datetime import datetime, timedelta
 
-from app.api.deps import SessionDep
+from app import crud
+from app.api.deps import CursorDep, SessionDep
 from app.models import Store, SurpriseBag, User
 from app.schemas.store import StorePublic
 from app.schemas.surprise_bag import SurpriseBagPublic
+from app.services.city import normalize_city
 
 router = APIRouter()
 
@@ -21,8 +23,9 @@ def get_available_stores(
     # Get all stores
     query = select(Store)
     
-    if city:
-        query = query.where(Store.address.ilike(f"%{city}%"))
+    city_key = normalize_city(city)
+    if city_key:
+        query = query.where(Store.city == city_key)
     
     stores = session.exec(query).all()
     return stores
@@ -54,6 +57,9 @@ def get_store_surprise_bags(
 @router.get("/surprise-bags", response_model=List[SurpriseBagPublic])
 def get_all_surprise_bags(
     session: SessionDep,
+    page: CursorDep,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
     category: Optional[str] = Query(None, description="Filter by bag category"),
     city: Optional[str] = Query(None, description="Filter by city"),
     available_from: Optional[datetime] = Query(None, description="Available from time"),
@@ -61,44 +67,30 @@ def get_all_surprise_bags(
     max_price: Optional[float] = Query(None, description="Maximum price filter")
 ):
     """
-    Get all available surprise bags with optional filters.
+    Browse available surprise bags, soonest pickup first.
     Time window: Order 2-6h chiều (14:00-18:00)
+    Results are paged: the body is one page of bags, the next page cursor is returned
+    in the X-Next-Cursor header and, when include_count=true, the total in X-Total-Count.
     """
-    now = datetime.utcnow()
-    
-    # Base query for active surprise bags
-    query = select(SurpriseBag).join(Store).where(
-        and_(
-            SurpriseBag.is_active == True,
-            SurpriseBag.quantity_available > 0,
-            SurpriseBag.available_until > now,
-            # DEMO MODE: Allow pickup times far in the future for testing
-            # Changed from 5 minutes to allow any future pickup time
-            SurpriseBag.pickup_start_time > now - timedelta(days=365)  # Allow bags from up to a year ago for demo
+    try:
+        result = crud.browse_surprise_bags(
+            session=session,
+            limit=limit,
+            cursor=page.cursor,
+            include_count=page.count_requested,
+            category=category,
+            city=city,
+            available_from=available_from,
+            available_until=available_until,
+            max_price=max_price
         )
-    )
-    
-    # Apply filters
-    if category:
-        query = query.where(SurpriseBag.bag_type.ilike(category))
-    
-    if city:
-        query = query.where(Store.address.ilike(f"%{city}%"))
-    
-    if available_from:
-        query = query.where(SurpriseBag.available_from >= available_from)
-    
-    if available_until:
-        query = query.where(SurpriseBag.available_until <= available_until)
-    
-    if max_price:
-        query = query.where(SurpriseBag.discounted_price <= max_price)
-    
-    # Order by pickup time to show soonest first
-    query = query.order_by(SurpriseBag.pickup_start_time)
-    
-    surprise_bags = session.exec(query).all()
-    return surprise_bags
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result["next_cursor"]:
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    if result["count"] is not None:
+        response.headers["X-Total-Count"] = str(result["count"])
+    return result["data"]
 
 @router.get("/surprise-bags/{bag_id}", response_model=SurpriseBagPublic)
 def get_surprise_bag_details(
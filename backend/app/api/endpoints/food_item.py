@@ -1,6 +1,6 @@
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status, Query, Depends
-from app.api.deps import SessionDep, CurrentVendor, CurrentUser
+from app.api.deps import SessionDep, CurrentVendor, CurrentUser, CursorDep
 from app import crud
 from app.schemas.food_item import FoodItemCreate, FoodItemResponse, FoodItemUpdate
 import uuid
@@ -21,6 +21,7 @@ def create_food_item(session: SessionDep, current_vendor: CurrentVendor, item_in
 @router.get("/")
 def list_food_items(
     session: SessionDep,
+    page: CursorDep,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     category: Optional[str] = Query(None),
@@ -28,39 +29,67 @@ def list_food_items(
     longitude: Optional[float] = Query(None),
     radius: Optional[float] = Query(None, ge=0)
 ):
-    """ Get all available food items with optional filtering. """
-    return crud.get_food_items_with_filters(
-        session=session, 
-        skip=skip, 
-        limit=limit,
-        category=category,
-        latitude=latitude,
-        longitude=longitude,
-        radius=radius
-    )
+    """ Get all available food items with optional filtering, newest first. """
+    try:
+        return crud.get_food_items_with_filters(
+            session=session, 
+            skip=skip, 
+            limit=limit,
+            category=category,
+            latitude=latitude,
+            longitude=longitude,
+            radius=radius,
+            cursor=page.cursor,
+            include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/search")
 def search_food_items(
     session: SessionDep,
+    page: CursorDep,
     query: str = Query(..., min_length=1),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000)
 ):
-    """ Search food items by name or description. """
-    return crud.search_food_items(session=session, query=query, skip=skip, limit=limit)
+    """ Search food items by name, description or ingredients, ignoring Vietnamese accents. Results are ranked and carry a highlighted snippet. """
+    try:
+        return crud.search_food_items(
+            session=session, query=query, skip=skip, limit=limit,
+            cursor=page.cursor, include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/autocomplete", response_model=List[str])
+def autocomplete_food_items(
+    session: SessionDep,
+    q: str = Query(..., min_length=1, description="What the user has typed so far"),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """ Suggest food item names for a search box as the user types. """
+    return crud.autocomplete_food_items(session=session, prefix=q, limit=limit)
 
 @router.get("/me")
 def get_my_food_items(
     session: SessionDep, 
     current_vendor: CurrentVendor,
+    page: CursorDep,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000)
 ):
     """ Vendor lists all regular food items for their store. """
     store = crud.get_store_by_owner_id(session=session, owner_id=current_vendor.id)
     if not store:
-        return {"data": [], "count": 0}
-    return crud.get_food_items_by_store(session=session, store_id=store.id, skip=skip, limit=limit)
+        return {"data": [], "count": 0, "next_cursor": None}
+    try:
+        return crud.get_food_items_by_store(
+            session=session, store_id=store.id, skip=skip, limit=limit,
+            cursor=page.cursor, include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/{food_item_id}", response_model=FoodItemResponse)
 def get_food_item(session: SessionDep, food_item_id: uuid.UUID):
@@ -126,11 +155,18 @@ def delete_food_item(
 def get_my_food_items_legacy(
     session: SessionDep, 
     current_vendor: CurrentVendor,
+    page: CursorDep,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000)
 ):
     """ Vendor lists all regular food items for their store (legacy endpoint). """
     store = crud.get_store_by_owner_id(session=session, owner_id=current_vendor.id)
     if not store:
-        return {"data": [], "count": 0}
-    return crud.get_food_items_by_store(session=session, store_id=store.id, skip=skip, limit=limit)
\ No newline at end of file
+        return {"data": [], "count": 0, "next_cursor": None}
+    try:
+        return crud.get_food_items_by_store(
+            session=session, store_id=store.id, skip=skip, limit=limit,
+            cursor=page.cursor, include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
\ No newline at end of file
@@ -2,80 +2,59 @@
 API endpoints for merchant food item management
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Response, status, Query
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 from datetime import datetime
 import uuid
 
-from app.api.deps import SessionDep, CurrentUser
-from app.models import FoodItem, Category, Store, InventoryLog, User, UserRole
+from app import crud
+from app.api.deps import SessionDep, CurrentVendorStore, VendorFoodItem
+from app.models import FoodItem, Category, InventoryLog
 from app.schemas.food_item import (
     FoodItemCreate, 
     FoodItemUpdate, 
     FoodItemResponse, 
     FoodItemWithCategory,
     InventoryUpdateRequest,
+    InventoryImportReport,
     SurplusMarkingRequest
 )
 from app.schemas.category import CategoryResponse
-from sqlmodel import select, and_
+from app.services import inventory_import
+from app.services.food_item_cache import food_item_cache
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
 
 router = APIRouter(prefix="/merchant/food-items", tags=["Merchant Food Items"])
 
+# Levels of subcategories embedded in a listed item's category
+CATEGORY_DEPTH = 3
+
 @router.get("/categories", response_model=List[CategoryResponse])
 def get_categories(session: SessionDep):
     """Get all available product categories"""
-    categories = session.exec(select(Category).where(Category.is_active == True)).all()
-    return categories
+    return crud.get_category_tree(session).active_categories()
 
 @router.get("/categories/hierarchy", response_model=List[CategoryResponse])
-def get_category_hierarchy(session: SessionDep):
-    """Get categories in hierarchical structure"""
-    # Get top-level categories (no parent)
-    top_categories = session.exec(
-        select(Category).where(
-            and_(Category.parent_category_id.is_(None), Category.is_active == True)
-        )
-    ).all()
-    
-    result = []
-    for top_cat in top_categories:
-        # Get subcategories
-        subcategories = session.exec(
-            select(Category).where(
-                and_(Category.parent_category_id == top_cat.id, Category.is_active == True)
-            )
-        ).all()
-        
-        category_data = CategoryResponse.model_validate(top_cat)
-        category_data.subcategories = [CategoryResponse.model_validate(sub) for sub in subcategories]
-        result.append(category_data)
-    
-    return result
+def get_category_hierarchy(session: SessionDep, if_none_match: Optional[str] = Header(None)):
+    """Get categories in hierarchical structure, every level deep.
+    Send the ETag back in If-None-Match to get a 304 while the tree is unchanged."""
+    tree = crud.get_category_tree(session)
+    headers = {"ETag": tree.etag, "Cache-Control": "no-cache"}
+    if tree.etag_matches(if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=tree.hierarchy_json, media_type="application/json", headers=headers)
 
 @router.post("/", response_model=FoodItemResponse, status_code=status.HTTP_201_CREATED)
 def create_food_item(
     session: SessionDep, 
-    current_user: CurrentUser,
+    vendor: CurrentVendorStore,
     food_item_data: FoodItemCreate
 ):
     """Create a new food item for the merchant's store"""
     
-    # Verify user is a vendor
-    if current_user.role != UserRole.VENDOR:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only vendors can create food items"
-        )
-    
-    # Get merchant's store
-    store = session.exec(select(Store).where(Store.owner_id == current_user.id)).first()
-    if not store:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Store not found. Please create a store first."
-        )
-    
     # Verify category exists if provided
     if food_item_data.category_id:
         category = session.get(Category, food_item_data.category_id)
@@ -88,7 +67,7 @@ def create_food_item(
     # Create food item
     food_item = FoodItem(
         **food_item_data.model_dump(),
-        store_id=store.id,
+        store_id=vendor.store_id,
         available_quantity=food_item_data.total_quantity,  # Initially all quantity is available
         created_at=datetime.now(),
         updated_at=datetime.now()
@@ -108,6 +87,7 @@ def create_food_item(
         created_at=datetime.now()
     )
     session.add(inventory_log)
+    food_item_cache.invalidate(session, vendor.store_id)
     
     session.commit()
     session.refresh(food_item)
@@ -117,74 +97,70 @@ def create_food_item(
 @router.get("/", response_model=List[FoodItemWithCategory])
 def get_my_food_items(
     session: SessionDep,
-    current_user: CurrentUser,
-    category_id: Optional[uuid.UUID] = Query(None, description="Filter by category"),
+    vendor: CurrentVendorStore,
+    category_id: Optional[uuid.UUID] = Query(None, description="Filter by category, subcategories included"),
     is_surplus_available: Optional[bool] = Query(None, description="Filter by surplus availability"),
     is_active: Optional[bool] = Query(True, description="Filter by active status")
 ):
     """Get all food items for the current merchant's store"""
     
-    # Verify user is a vendor
-    if current_user.role != UserRole.VENDOR:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only vendors can view food items"
+    # A category filter includes the category's subcategories
+    category_ids = crud.get_category_tree(session).descendant_ids(category_id) if category_id else None
+
+    def load_items() -> list:
+        # One query per level (items, categories, each subcategory level), not per item
+        query = select(FoodItem).where(FoodItem.store_id == vendor.store_id).options(
+            selectinload(FoodItem.category).selectinload(Category.subcategories, recursion_depth=CATEGORY_DEPTH)
         )
-    
-    # Get merchant's store
-    store = session.exec(select(Store).where(Store.owner_id == current_user.id)).first()
-    if not store:
+        if category_ids:
+            query = query.where(FoodItem.category_id.in_(category_ids))
+        if is_surplus_available is not None:
+            query = query.where(FoodItem.is_marked_for_surplus == is_surplus_available)
+        if is_active is not None:
+            query = query.where(FoodItem.is_active == is_active)
+        food_items = session.exec(query).all()
+        return [FoodItemWithCategory.model_validate(item).model_dump(mode="json") for item in food_items]
+
+    # Served from the per-store cache; every write to the store's items invalidates it
+    filters = (sorted(category_ids or ()), is_surplus_available, is_active)
+    items = food_item_cache.get_or_load(vendor.store_id, filters, load_items)
+    return JSONResponse(content=items)
+
+@router.post("/inventory/import", response_model=InventoryImportReport)
+async def import_inventory(request: Request, session: SessionDep, vendor: CurrentVendorStore):
+    """
+    Set the stock of many items at once, matched by SKU within the store.
+    Send text/csv with a header row (sku, new_total, and optionally change_type,
+    reason) or application/x-ndjson objects with the same fields. Valid lines are
+    applied even when others fail; the report has a result for every line.
+    """
+    fmt = inventory_import.import_format(request.headers.get("content-type"))
+    if fmt is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Store not found"
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send the import as text/csv or application/x-ndjson"
         )
-    
-    # Build query
-    query = select(FoodItem).where(FoodItem.store_id == store.id)
-    
-    if category_id:
-        query = query.where(FoodItem.category_id == category_id)
-    if is_surplus_available is not None:
-        query = query.where(FoodItem.is_marked_for_surplus == is_surplus_available)
-    if is_active is not None:
-        query = query.where(FoodItem.is_active == is_active)
-    
-    food_items = session.exec(query).all()
-    
-    # Add category information
-    result = []
-    for item in food_items:
-        item_data = FoodItemWithCategory.model_validate(item)
-        if item.category_id:
-            category = session.get(Category, item.category_id)
-            if category:
-                item_data.category = CategoryResponse.model_validate(category)
-        result.append(item_data)
-    
-    return result
+    try:
+        lines = await inventory_import.read_lines(request.stream())
+        return await run_in_threadpool(_apply_inventory_import, session, vendor.store_id, fmt, lines)
+    except inventory_import.InventoryImportTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except inventory_import.InventoryImportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _apply_inventory_import(session, store_id: uuid.UUID, fmt: str, lines: List[str]) -> InventoryImportReport:
+    report = inventory_import.apply_inventory_import(session, store_id, inventory_import.parse_lines(fmt, lines))
+    session.commit()
+    return report
 
 @router.put("/{item_id}", response_model=FoodItemResponse)
 def update_food_item(
     session: SessionDep,
-    current_user: CurrentUser,
-    item_id: uuid.UUID,
+    food_item: VendorFoodItem,
     update_data: FoodItemUpdate
 ):
     """Update a food item"""
     
-    # Get food item and verify ownership
-    food_item = session.get(FoodItem, item_id)
-    if not food_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-    
-    # Verify store ownership
-    store = session.get(Store, food_item.store_id)
-    if not store or store.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update your own food items"
-        )
-    
     # Update fields
     update_dict = update_data.model_dump(exclude_unset=True)
     for field, value in update_dict.items():
@@ -193,6 +169,7 @@ def update_food_item(
     food_item.updated_at = datetime.now()
     
     session.add(food_item)
+    food_item_cache.invalidate(session, food_item.store_id)
     session.commit()
     session.refresh(food_item)
     
@@ -201,25 +178,11 @@ def update_food_item(
 @router.post("/{item_id}/update-inventory", response_model=FoodItemResponse)
 def update_inventory(
     session: SessionDep,
-    current_user: CurrentUser,
-    item_id: uuid.UUID,
+    food_item: VendorFoodItem,
     inventory_data: InventoryUpdateRequest
 ):
     """Update inventory quantities for a food item"""
     
-    # Get food item and verify ownership
-    food_item = session.get(FoodItem, item_id)
-    if not food_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-    
-    # Verify store ownership
-    store = session.get(Store, food_item.store_id)
-    if not store or store.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update your own food items"
-        )
-    
     # Calculate changes
     previous_total = food_item.total_quantity
     quantity_change = inventory_data.new_total_quantity - previous_total
@@ -243,6 +206,7 @@ def update_inventory(
     
     session.add(food_item)
     session.add(inventory_log)
+    food_item_cache.invalidate(session, food_item.store_id)
     session.commit()
     session.refresh(food_item)
     
@@ -251,25 +215,11 @@ def update_inventory(
 @router.post("/{item_id}/mark-surplus", response_model=FoodItemResponse)
 def mark_for_surplus(
     session: SessionDep,
-    current_user: CurrentUser,
-    item_id: uuid.UUID,
+    food_item: VendorFoodItem,
     surplus_data: SurplusMarkingRequest
 ):
     """Mark a food item as available for surplus bags"""
     
-    # Get food item and verify ownership
-    food_item = session.get(FoodItem, item_id)
-    if not food_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-    
-    # Verify store ownership
-    store = session.get(Store, food_item.store_id)
-    if not store or store.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update your own food items"
-        )
-    
     # Validate surplus quantity
     max_available = food_item.available_quantity
     if surplus_data.surplus_quantity > max_available:
@@ -304,6 +254,7 @@ def mark_for_surplus(
     
     session.add(food_item)
     session.add(inventory_log)
+    food_item_cache.invalidate(session, food_item.store_id)
     session.commit()
     session.refresh(food_item)
     
@@ -312,28 +263,14 @@ def mark_for_surplus(
 @router.get("/{item_id}/inventory-history")
 def get_inventory_history(
     session: SessionDep,
-    current_user: CurrentUser,
-    item_id: uuid.UUID
+    food_item: VendorFoodItem
 ):
     """Get inventory change history for a food item"""
     
-    # Get food item and verify ownership
-    food_item = session.get(FoodItem, item_id)
-    if not food_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-    
-    # Verify store ownership
-    store = session.get(Store, food_item.store_id)
-    if not store or store.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only view your own food items"
-        )
-    
     # Get inventory logs
     logs = session.exec(
         select(InventoryLog)
-        .where(InventoryLog.food_item_id == item_id)
+        .where(InventoryLog.food_item_id == food_item.id)
         .order_by(InventoryLog.created_at.desc())
     ).all()
     
@@ -342,30 +279,17 @@ def get_inventory_history(
 @router.delete("/{item_id}")
 def delete_food_item(
     session: SessionDep,
-    current_user: CurrentUser,
-    item_id: uuid.UUID
+    food_item: VendorFoodItem
 ):
     """Soft delete a food item (mark as inactive)"""
     
-    # Get food item and verify ownership
-    food_item = session.get(FoodItem, item_id)
-    if not food_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food item not found")
-    
-    # Verify store ownership
-    store = session.get(Store, food_item.store_id)
-    if not store or store.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete your own food items"
-        )
-    
     # Soft delete
     food_item.is_active = False
     food_item.is_available = False
     food_item.updated_at = datetime.now()
     
     session.add(food_item)
+    food_item_cache.invalidate(session, food_item.store_id)
     session.commit()
     
     return {"message": "Food item deleted successfully"}
\ No newline at end of file
@@ -1,11 +1,13 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import Session
 from app.models import User
 from app.api.deps import SessionDep, CurrentUser, CurrentAdmin, get_db
 from typing import List
 import uuid
-from app.schemas.notification import NotificationCreate, NotificationPublic
+from app.schemas.notification import BroadcastJobPublic, NotificationCreate, NotificationPublic
+from app.models import BroadcastJobStatus
+from app.services.notification_broadcast import notification_broadcaster
 from app import crud
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -24,11 +26,46 @@ def send_notification(
 def send_notification_to_all(
     notification_in: NotificationCreate,
     session: SessionDep,
-    current_admin: CurrentAdmin
+    current_admin: CurrentAdmin,
+    response: Response
 ):
-    notification = crud.create_notification_to_all(session, notification_in)
+    """
+    Broadcast to every user. Fan-out runs in the background; its progress is at
+    GET /notifications/broadcasts/{job_id}, with the id in the X-Broadcast-Job-Id header.
+    """
+    notification, job = crud.create_notification_to_all(session, notification_in)
+    if job is not None:
+        notification_broadcaster.submit(job.id)
+        response.headers["X-Broadcast-Job-Id"] = str(job.id)
     return notification
 
+@router.get("/broadcasts/{job_id}", response_model=BroadcastJobPublic)
+def get_broadcast_job(
+    job_id: uuid.UUID,
+    session: SessionDep,
+    current_admin: CurrentAdmin
+):
+    job = crud.get_broadcast_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast job not found")
+    return job
+
+@router.post("/broadcasts/{job_id}/resume", response_model=BroadcastJobPublic)
+def resume_broadcast_job(
+    job_id: uuid.UUID,
+    session: SessionDep,
+    current_admin: CurrentAdmin
+):
+    """Restart a failed broadcast from its last delivered chunk."""
+    job = crud.get_broadcast_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast job not found")
+    if job.status == BroadcastJobStatus.COMPLETED:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Broadcast job already completed")
+    job = crud.reset_broadcast_job(session, job)
+    notification_broadcaster.submit(job.id)
+    return job
+
 
 @router.get("/", response_model=List[NotificationPublic])
 def get_notifications(
@@ -2,7 +2,7 @@ import uuid
 import logging
 from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status
-from app.api.deps import SessionDep, CurrentUser, CurrentVendor
+from app.api.deps import SessionDep, CurrentUser, CurrentVendor, IdempotencyDep
 from app import crud
 from app.schemas.order import OrderCreate, OrderPublic, OrderStatusUpdate
 from app.schemas.common import PaginationResponse
@@ -15,10 +15,15 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/", response_model=OrderPublic, status_code=status.HTTP_201_CREATED)
-def create_order(session: SessionDep, current_user: CurrentUser, order_in: OrderCreate):
+def create_order(session: SessionDep, current_user: CurrentUser, order_in: OrderCreate, idempotency: IdempotencyDep):
     """ CUSTOMER: Creates a new order from a list of surprise bags in their cart. """
     try:
-        return crud.create_order(session=session, order_create=order_in, customer_id=current_user.id)
+        order = crud.create_order(
+            session=session,
+            order_create=order_in,
+            customer_id=current_user.id,
+            before_commit=lambda order: idempotency.stage(order, OrderPublic, status.HTTP_201_CREATED)
+        )
     except ValueError as e:
         error_msg = str(e)
         if "not found" in error_msg:
@@ -27,6 +32,7 @@ def create_order(session: SessionDep, current_user: CurrentUser, order_in: Order
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_msg)
+    return idempotency.respond(order, OrderPublic, status.HTTP_201_CREATED)
 
 @router.get("/me", response_model=PaginationResponse[OrderPublic])
 def get_my_orders(session: SessionDep, current_user: CurrentUser):
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from app.api.deps import StreamUser
+from app.core.config import settings
+from app.services.realtime import realtime_hub
+
+router = APIRouter(prefix="/realtime", tags=["realtime"])
+
+# Events: {"type": "order_status" | "order_created" | "notification" | "chat_message", "data": {...}},
+# plus "ping" heartbeats and "resync" when events were dropped for a slow client.
+
+@router.websocket("/ws")
+async def realtime_websocket(websocket: WebSocket, current_user: StreamUser):
+    """Push channel for the current user. Messages sent by the client are only read as keep-alives."""
+    connection = realtime_hub.registry.connect(current_user.id)
+    if connection is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+
+    async def send_events():
+        while True:
+            event = await connection.next_event(settings.REALTIME_HEARTBEAT_SECONDS)
+            # A peer that stops reading fills the socket buffer; give up on it instead of waiting forever
+            await asyncio.wait_for(websocket.send_json(event), settings.REALTIME_SEND_TIMEOUT_SECONDS)
+
+    async def receive_messages():
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_messages())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if isinstance(task.exception(), asyncio.TimeoutError):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        realtime_hub.registry.disconnect(connection)
+
+@router.get("/events")
+async def realtime_events(request: Request, current_user: StreamUser):
+    """
+    The same events as /realtime/ws as a Server-Sent Events stream (one `event:` per
+    type), for clients that only speak HTTP. Heartbeats are SSE comments.
+    """
+    if realtime_hub.registry.full:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many connections")
+
+    async def stream():
+        # Registered only once the response streams: a client that goes away before
+        # that never holds a slot, and `finally` runs for every registered connection
+        connection = realtime_hub.registry.connect(current_user.id)
+        if connection is None:
+            # Filled up since the check above; the client reconnects after `retry`
+            yield "retry: 3000\n\n"
+            return
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await connection.next_event(settings.REALTIME_HEARTBEAT_SECONDS)
+                if event["type"] == "ping":
+                    yield ": ping\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event.get('data'))}\n\n"
+        finally:
+            realtime_hub.registry.disconnect(connection)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,11 @@
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Query
-from app.api.deps import SessionDep, CurrentVendor, CurrentUser
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, status, Query, Response
+from app.api.deps import SessionDep, CurrentVendor, CurrentUser, CursorDep
 from app import crud
 from app.schemas.store import StorePublic, StoreUpdate, StoreCreate, StoreWithDistance, StoreWithTravelInfo
 from app.services.mapbox import get_travel_info_multi_profile
+from app.services.travel_estimate import estimate_travel_info
 
 router = APIRouter()
 
@@ -46,11 +47,28 @@ def create_store(session: SessionDep, current_vendor: CurrentVendor, store_in: S
 @router.get("/", response_model=List[StorePublic])
 def list_stores(
     session: SessionDep, 
+    page: CursorDep,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100)
 ):
-    """ Get a list of all public stores. """
-    return crud.get_all_stores(session=session, skip=skip, limit=limit)
+    """
+    Get a list of all public stores.
+    The body stays a plain list; the next page cursor is returned in the X-Next-Cursor
+    header and, when include_count=true, the total in X-Total-Count.
+    """
+    try:
+        result = crud.get_all_stores(
+            session=session, skip=skip, limit=limit,
+            cursor=page.cursor, include_count=page.count_requested
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result["next_cursor"]:
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    if result["count"] is not None:
+        response.headers["X-Total-Count"] = str(result["count"])
+    return result["data"]
 
 @router.get("/with-travel-info", response_model=List[StoreWithTravelInfo])
 async def list_stores_with_travel_info(
@@ -61,11 +79,14 @@ async def list_stores_with_travel_info(
     radius: float = Query(50.0, ge=0.1, le=100.0, description="Search radius in kilometers"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    travel_methods: Optional[str] = Query("driving,walking", description="Comma-separated travel methods (driving, walking)")
+    travel_methods: Optional[str] = Query("driving,walking", description="Comma-separated travel methods (driving, walking)"),
+    travel_accuracy: Literal["estimate", "exact"] = Query("estimate", description="'estimate' computes travel info locally, 'exact' asks Mapbox"),
+    city: Optional[str] = Query(None, description="City whose speed profile is used for estimates")
 ):
     """
     Get stores with distance and travel time information for vendors.
     This allows vendors to see how far and how long it takes to reach each store.
+    By default travel info is estimated locally; use travel_accuracy=exact for Mapbox routing.
     """
     # Get nearby stores first
     stores = crud.get_stores_within_radius(
@@ -97,8 +118,13 @@ async def list_stores_with_travel_info(
             for store in stores
         ]
     
-    # Get travel information from Mapbox
-    travel_info = await get_travel_info_multi_profile(vendor_origin, destinations)
+    # Get travel information from the local estimator, or from Mapbox when exact values are requested
+    if travel_accuracy == "exact":
+        travel_info = await get_travel_info_multi_profile(vendor_origin, destinations)
+        travel_info_source = "mapbox"
+    else:
+        travel_info = estimate_travel_info(vendor_origin, destinations, city=city)
+        travel_info_source = "estimate"
     
     # Combine store data with travel information
     result = []
@@ -121,6 +147,7 @@ async def list_stores_with_travel_info(
                     store_dict["travel_time_walking_seconds"] = walking_info.get("duration")
                     store_dict["travel_distance_walking_meters"] = walking_info.get("distance")
             
+            store_dict["travel_info_source"] = travel_info_source
             dest_index += 1
         
         result.append(StoreWithTravelInfo(**store_dict))
@@ -174,6 +201,8 @@ async def get_store_with_travel_info(
             if walking_info:
                 store_dict["travel_time_walking_seconds"] = walking_info.get("duration")
                 store_dict["travel_distance_walking_meters"] = walking_info.get("distance")
+
+        store_dict["travel_info_source"] = "mapbox"
     
     return StoreWithTravelInfo(**store_dict)
 
@@ -197,6 +226,32 @@ def list_nearby_stores(
     )
     return stores
 
+@router.get("/nearest", response_model=List[StoreWithDistance])
+def list_nearest_stores(
+    session: SessionDep,
+    latitude: float = Query(..., description="Latitude of the search location"),
+    longitude: float = Query(..., description="Longitude of the search location"),
+    radius: float = Query(10.0, ge=0.1, le=100.0, description="Search radius in kilometers"),
+    limit: int = Query(20, ge=1, le=100),
+    after_distance_meters: Optional[float] = Query(None, ge=0, description="distance_meters of the last store on the previous page"),
+    after_id: Optional[uuid.UUID] = Query(None, description="id of the last store on the previous page")
+):
+    """ Get the nearest stores using the KNN index, paginated by (distance, id) instead of offset. """
+    if (after_distance_meters is None) != (after_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after_distance_meters and after_id must be provided together"
+        )
+    return crud.get_nearest_stores(
+        session=session,
+        latitude=latitude,
+        longitude=longitude,
+        radius_km=radius,
+        limit=limit,
+        after_distance_meters=after_distance_meters,
+        after_id=after_id
+    )
+
 @router.get("/me", response_model=StorePublic)
 def get_my_store(session: SessionDep, current_vendor: CurrentVendor):
     """ Vendor gets their own store profile. """
@@ -2,9 +2,10 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, status, Query, Depends
 from datetime import datetime
 import uuid
-from app.api.deps import SessionDep, CurrentVendor, CurrentUser
+from app.api.deps import SessionDep, CurrentVendor, CurrentUser, CursorDep, IdempotencyDep
 from app import crud
 from app.models import Order
+from app.services.hot_inventory import HotInventoryShortage, hot_inventory
 from app.schemas.surprise_bag import (
     SurpriseBagCreate, 
     SurpriseBagPublic, 
@@ -60,21 +61,27 @@ def create_surprise_bag(session: SessionDep, current_vendor: CurrentVendor, bag_
 @router.get("/")
 def get_all_active_bags(
     session: SessionDep,
+    page: CursorDep,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     min_price: Optional[float] = Query(None, ge=0),
     max_price: Optional[float] = Query(None, ge=0),
     available_only: Optional[bool] = Query(False)
 ):
-    """ Get a list of all available surprise bags from all stores with optional filtering. """
-    return crud.get_surprise_bags_with_filters(
-        session=session,
-        skip=skip,
-        limit=limit,
-        min_price=min_price,
-        max_price=max_price,
-        available_only=available_only
-    )
+    """ Get a list of all available surprise bags from all stores with optional filtering, newest first. """
+    try:
+        return crud.get_surprise_bags_with_filters(
+            session=session,
+            skip=skip,
+            limit=limit,
+            min_price=min_price,
+            max_price=max_price,
+            available_only=available_only,
+            cursor=page.cursor,
+            include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/my-bookings")
 def get_my_bookings(
@@ -144,7 +151,8 @@ def book_surprise_bag(
     session: SessionDep,
     current_user: CurrentUser,
     bag_id: uuid.UUID,
-    booking_in: SurpriseBagBookingCreate
+    booking_in: SurpriseBagBookingCreate,
+    idempotency: IdempotencyDep
 ):
     """ Customer books a surprise bag. """
     # Get the surprise bag
@@ -170,12 +178,25 @@ def book_surprise_bag(
             detail="Booking window has closed"
         )
     
-    return crud.create_surprise_bag_booking(
-        session=session,
-        booking_create=booking_in,
-        bag_id=bag_id,
-        customer_id=current_user.id
-    )
+    # Flash-sale tier: book against the Redis counter, the order row is written behind
+    try:
+        booking = hot_inventory.reserve_booking(bag, current_user.id, booking_in.quantity, booking_in.pickup_time)
+    except HotInventoryShortage as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if booking is not None:
+        return idempotency.respond(booking, SurpriseBagBookingPublic, status.HTTP_201_CREATED)
+    
+    try:
+        booking = crud.create_surprise_bag_booking(
+            session=session,
+            booking_create=booking_in,
+            bag_id=bag_id,
+            customer_id=current_user.id,
+            before_commit=lambda booking: idempotency.stage(booking, SurpriseBagBookingPublic, status.HTTP_201_CREATED)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return idempotency.respond(booking, SurpriseBagBookingPublic, status.HTTP_201_CREATED)
 
 @router.delete("/{bag_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_surprise_bag(
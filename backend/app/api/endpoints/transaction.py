@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlmodel import Session, select
-from app.api.deps import SessionDep, CurrentUser, CurrentVendor
+from app.api.deps import SessionDep, CurrentUser, CurrentVendor, CursorDep, IdempotencyDep
 from app.models import Transaction, Order, TransactionStatus
 from app.schemas.transaction import (
     TransactionCreate,
@@ -21,7 +21,8 @@ router = APIRouter()
 def create_payment_transaction(
     session: SessionDep,
     current_user: CurrentUser,
-    transaction_in: TransactionCreate
+    transaction_in: TransactionCreate,
+    idempotency: IdempotencyDep
 ):
     """Create a payment transaction for an order."""
     # Get the order
@@ -39,14 +40,6 @@ def create_payment_transaction(
             detail="Not authorized to pay for this order"
         )
     
-    # Check if order is already paid
-    existing_payment = crud.get_payment_transaction_by_order(session=session, order_id=order.id)
-    if existing_payment:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Order is already paid"
-        )
-    
     # Validate amount matches order total
     if abs(transaction_in.amount - order.total_amount) > 0.01:
         raise HTTPException(
@@ -54,14 +47,23 @@ def create_payment_transaction(
             detail="Amount mismatch with order total"
         )
     
-    transaction = crud.create_payment_transaction(
-        session=session,
-        transaction_create=transaction_in,
-        customer_id=current_user.id,
-        order_id=order.id
-    )
-    
-    # Convert to TransactionPublic response
+    # The "already paid" check runs in crud under a lock on the order row
+    try:
+        transaction = crud.create_payment_transaction(
+            session=session,
+            transaction_create=transaction_in,
+            customer_id=current_user.id,
+            order_id=order.id,
+            before_commit=lambda transaction: idempotency.stage(
+                _payment_public(transaction), TransactionPublic, status.HTTP_201_CREATED
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return idempotency.respond(_payment_public(transaction), TransactionPublic, status.HTTP_201_CREATED)
+
+def _payment_public(transaction: Transaction) -> TransactionPublic:
+    """Convert a payment to its TransactionPublic response."""
     return TransactionPublic(
         id=transaction.id,
         order_id=transaction.order_id,
@@ -132,26 +134,32 @@ def create_refund_transaction(
 def get_my_transactions(
     session: SessionDep,
     current_user: CurrentUser,
+    page: CursorDep,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     transaction_type: Optional[str] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None)
 ):
-    """Get current user's transaction history with optional filtering."""
-    transactions = crud.get_user_transactions(
-        session=session,
-        user_id=current_user.id,
-        skip=skip,
-        limit=limit,
-        transaction_type=transaction_type,
-        start_date=start_date,
-        end_date=end_date
-    )
+    """Get current user's transaction history with optional filtering, newest first."""
+    try:
+        result = crud.get_user_transactions(
+            session=session,
+            user_id=current_user.id,
+            skip=skip,
+            limit=limit,
+            transaction_type=transaction_type,
+            start_date=start_date,
+            end_date=end_date,
+            cursor=page.cursor,
+            include_count=page.include_count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
     # Convert transactions to TransactionPublic
     transaction_data = []
-    for transaction in transactions:
+    for transaction in result["data"]:
         transaction_data.append(TransactionPublic(
             id=transaction.id,
             order_id=transaction.order_id,
@@ -160,27 +168,19 @@ def get_my_transactions(
             amount=transaction.amount,
             payment_method=transaction.method.value,
             status="completed" if transaction.status == TransactionStatus.SUCCESSFUL else transaction.status.value,
-            transaction_type="payment",  # For now, assume all are payment transactions
+            transaction_type="payment" if transaction.order_id else "refund",
             created_at=transaction.transaction_date,
             payment_details=None,
             original_transaction_id=None,
             reason=None
         ))
     
-    # Count total transactions for pagination
-    total_count = crud.count_user_transactions(
-        session=session,
-        user_id=current_user.id,
-        transaction_type=transaction_type,
-        start_date=start_date,
-        end_date=end_date
-    )
-    
     return PaginationResponse[TransactionPublic](
         data=transaction_data,
-        count=total_count,
+        count=result["count"],
         skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=result["next_cursor"]
     )
 
 @router.get("/vendor/summary", response_model=VendorTransactionSummary)
@@ -269,7 +269,7 @@ def get_transactions_by_user_legacy(
         user_id=user_id,
         skip=offset,
         limit=limit
-    )
+    )["data"]
 
 @router.get("/order/{order_id}", response_model=List[TransactionPublic])
 def get_transactions_by_order_legacy(
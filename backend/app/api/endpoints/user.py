@@ -3,18 +3,18 @@ import requests
 from typing import Any
 from pydantic import EmailStr
 from sqlmodel import select, func
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends, Body
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends, Body, Query, Response
 
 from app import crud
 from app.models import User
-from app.api.deps import CurrentUser, SessionDep, get_current_admin
+from app.api.deps import CurrentUser, CursorDep, SessionDep, get_current_admin
 from app.services.email import verify_token
 from app.services.upload import upload_avatar
 from app.core.config import settings
 from app.core.security import verify_password, get_password_hash
 from app.schemas.user import UserUpdate, UserUpdateMe, UpdatePassword, UserPublic, UsersPublic
 from app.schemas.auth import Message
-from app.schemas.notification import NotificationPublic, UserNotification
+from app.schemas.notification import NotificationPublic, UnreadNotificationCount, UserNotification
 
 router = APIRouter(prefix="/user", tags=["user"])
 
@@ -117,10 +117,37 @@ def upload_user_avatar(session: SessionDep, current_user: CurrentUser, file: Upl
 @router.get("/me/notifications", response_model=list[UserNotification])
 def get_notifications(
     session: SessionDep,
-    current_user: CurrentUser   
+    current_user: CurrentUser,
+    page: CursorDep,
+    response: Response,
+    limit: int = Query(50, ge=1, le=100, description="Page size")
 ):
-    notifications = crud.get_user_notifications(session, current_user.id)
-    return notifications
+    """
+    The current user's notifications, newest first.
+    The body is one page; the next page cursor is returned in the X-Next-Cursor
+    header and, when include_count=true, the total in X-Total-Count.
+    """
+    try:
+        result = crud.get_user_notifications_page(
+            session, current_user.id, limit=limit, cursor=page.cursor, include_count=page.count_requested
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if result["next_cursor"]:
+        response.headers["X-Next-Cursor"] = result["next_cursor"]
+    if result["count"] is not None:
+        response.headers["X-Total-Count"] = str(result["count"])
+    return result["data"]
+
+@router.get("/me/notifications/unread-count", response_model=UnreadNotificationCount)
+def get_unread_notification_count(session: SessionDep, current_user: CurrentUser):
+    """Number of unread notifications, for the badge. Reads a counter instead of counting rows."""
+    return UnreadNotificationCount(unread_count=crud.get_unread_notification_count(session, current_user.id))
+
+@router.post("/me/notifications/read-all", response_model=Message)
+def mark_all_as_read(session: SessionDep, current_user: CurrentUser):
+    marked = crud.mark_all_notifications_as_read(session, current_user.id)
+    return Message(message=f"{marked} notifications marked as read")
 
 @router.post("/read/{notification_id}")
 def mark_as_read(
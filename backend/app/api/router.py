@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 # Import existing, unchanged routers
-from app.api.endpoints import auth, user, transaction, notification, chat, otp
+from app.api.endpoints import auth, user, transaction, notification, chat, otp, realtime
 
 # Import our NEW routers
 from app.api.endpoints import store, food_item, surprise_bag, order, upload, merchant_food_items, customer
@@ -13,6 +13,7 @@ api_router.include_router(auth.router)
 api_router.include_router(user.router)
 api_router.include_router(notification.router)
 api_router.include_router(chat.router)
+api_router.include_router(realtime.router)
 api_router.include_router(otp.router)
 api_router.include_router(transaction.router, prefix="/transactions", tags=["Transactions"])
 
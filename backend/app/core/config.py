@@ -1,6 +1,6 @@
 from pydantic_settings import SettingsConfigDict, BaseSettings
 from pydantic import EmailStr, PostgresDsn, field_validator
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 
 class Settings(BaseSettings):
     # This tells Pydantic to load settings from a file named '.env'
@@ -58,7 +58,53 @@ class Settings(BaseSettings):
     
     # For displaying maps and store locations
     MAPBOX_ACCESS_TOKEN: str = "your_mapbox_access_token"
-    
+
+    # Mapbox response cache (app/services/cache.py). Coordinates are rounded to
+    # MAPBOX_CACHE_COORD_DECIMALS before keying (3 decimals ~ 110 m).
+    MAPBOX_CACHE_COORD_DECIMALS: int = 3
+    MAPBOX_CACHE_MAX_ENTRIES: int = 20000
+    MAPBOX_CACHE_REDIS_ENABLED: bool = False
+    MAPBOX_MATRIX_CACHE_TTL: int = 600
+    MAPBOX_DIRECTIONS_CACHE_TTL: int = 900
+    MAPBOX_GEOCODE_CACHE_TTL: int = 60 * 60 * 24 * 7
+    MAPBOX_GEOCODE_NEGATIVE_CACHE_TTL: int = 60 * 60
+
+    # Matrix API coordinate limits (origin included) and how many Matrix requests
+    # one travel-info call may have in flight.
+    MAPBOX_MATRIX_MAX_COORDINATES: int = 25
+    MAPBOX_MATRIX_TRAFFIC_MAX_COORDINATES: int = 10
+    MAPBOX_MATRIX_CONCURRENCY: int = 4
+
+    # Offline travel estimates (app/services/travel_estimate.py): great-circle
+    # distance times a detour factor, at average speeds per city (km/h). Keys are
+    # normalised city names (app/services/city.py).
+    TRAVEL_ROUTE_DETOUR_FACTOR: float = 1.3
+    TRAVEL_SPEED_PROFILES: Dict[str, Dict[str, float]] = {
+        "default": {"driving": 25.0, "walking": 4.8},
+        "ho chi minh": {"driving": 20.0, "walking": 4.5},
+        "ha noi": {"driving": 22.0, "walking": 4.5},
+        "da nang": {"driving": 30.0, "walking": 4.8},
+    }
+
+    # In-process store grid index (app/services/spatial_index.py). It always backs
+    # nearby-store search when PostGIS is unavailable; enable the cache flag to also
+    # serve /stores/nearby from memory in front of PostGIS.
+    STORE_SPATIAL_CACHE_ENABLED: bool = False
+    STORE_SPATIAL_INDEX_REFRESH_SECONDS: int = 300
+
+    # Shared outbound HTTP clients (app/services/http_client.py), one pool per
+    # integration. Retries only apply to GET requests.
+    HTTP_CLIENT_HTTP2: bool = True
+    HTTP_CLIENT_TIMEOUT_SECONDS: float = 10.0
+    HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    HTTP_CLIENT_MAX_CONCURRENCY_PER_HOST: int = 20
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_CLIENT_MAX_RETRIES: int = 2
+    HTTP_CLIENT_RETRY_BACKOFF_SECONDS: float = 0.2
+    HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD: int = 5
+    HTTP_CLIENT_BREAKER_RESET_SECONDS: float = 30.0
+
     DEFAULT_AVATAR_URL: str = "https://i.ibb.co/5xt2NvW0/453178253-471506465671661-2781666950760530985-n.png"
     
     # --- 6. Google OAuth Settings (NEW) ---
@@ -71,6 +117,79 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
 
+    # Flash-sale inventory tier (app/services/hot_inventory.py): bag stock is kept in
+    # Redis and bookings are written to PostgreSQL in batches by a background worker.
+    HOT_INVENTORY_ENABLED: bool = False
+    HOT_INVENTORY_FLUSH_INTERVAL_SECONDS: float = 0.2
+    HOT_INVENTORY_BATCH_SIZE: int = 500
+    HOT_INVENTORY_LOCK_SECONDS: float = 30.0
+    HOT_INVENTORY_HOLD_SECONDS: float = 60.0  # Held counters of a crashed checkout expire after this
+    HOT_INVENTORY_KEY_SLACK_SECONDS: int = 60 * 60  # Counters outlive available_until by this much
+
+    # Idempotency-Key support for order, booking and payment POSTs (app/services/idempotency.py)
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 24 * 60 * 60  # How long a stored response can be replayed
+    IDEMPOTENCY_LOCK_SECONDS: float = 60.0  # A running request's claim is taken over after this
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0  # How long a duplicate waits for the first request before 409
+
+    # Notification outbox worker (app/services/notification_outbox.py)
+    NOTIFICATION_OUTBOX_WORKER_ENABLED: bool = True
+    NOTIFICATION_OUTBOX_POLL_SECONDS: float = 1.0
+    NOTIFICATION_OUTBOX_BATCH_SIZE: int = 500
+
+    # /notifications/send_all (app/services/notification_broadcast.py): store broadcasts
+    # as one virtual row merged at read time, or fan them out in chunks of users.
+    NOTIFICATION_BROADCAST_VIRTUAL: bool = False
+    NOTIFICATION_BROADCAST_CHUNK_SIZE: int = 5000
+
+    # Per-store cache of the merchant food-item listing (app/services/food_item_cache.py).
+    # Enable the Redis flag when running more than one API process, so invalidations
+    # reach every process.
+    FOOD_ITEM_CACHE_ENABLED: bool = True
+    FOOD_ITEM_CACHE_REDIS_ENABLED: bool = False
+    FOOD_ITEM_CACHE_TTL_SECONDS: int = 300
+    FOOD_ITEM_CACHE_MAX_ENTRIES: int = 5000
+
+    # Bulk inventory import (app/services/inventory_import.py): lines accepted per
+    # request, and items locked and updated per statement.
+    INVENTORY_IMPORT_MAX_LINES: int = 50000
+    INVENTORY_IMPORT_BATCH_SIZE: int = 5000
+
+    # Product catalogue ingestion (app/services/catalogue_import.py): rows per chunk,
+    # each chunk loaded with two batched INSERTs and committed on its own.
+    CATALOGUE_IMPORT_CHUNK_SIZE: int = 2000
+
+    # Surplus-expiry engine (app/services/surplus_expiry.py): every interval, stock expiring
+    # within the window is marked as surplus and packed into auto-generated surprise bags,
+    # SURPLUS_EXPIRY_STORE_BATCH_SIZE stores per transaction.
+    SURPLUS_EXPIRY_ENABLED: bool = False
+    SURPLUS_EXPIRY_INTERVAL_SECONDS: float = 15 * 60
+    SURPLUS_EXPIRY_WINDOW_HOURS: float = 24.0
+    SURPLUS_EXPIRY_STORE_BATCH_SIZE: int = 200
+    SURPLUS_EXPIRY_DISCOUNT: float = 0.5  # For items the merchant has not given a surplus discount
+    SURPLUS_BAG_DISCOUNT: float = 0.6
+    SURPLUS_BAG_MAX_WEIGHT_GRAMS: float = 3000
+    SURPLUS_BAG_WEIGHT_STEP_GRAMS: float = 50  # Knapsack resolution
+    SURPLUS_BAG_DEFAULT_ITEM_WEIGHT_GRAMS: float = 250  # For items without a weight
+    SURPLUS_BAG_MIN_VALUE: float = 50000  # Smaller leftovers stay as plain surplus
+    SURPLUS_BAG_MAX_PER_STORE: int = 5  # Bags created per store and run
+    SURPLUS_BAG_MIN_LEAD_MINUTES: int = 60  # Items expiring sooner are marked but not bagged
+
+    # How long the merchant endpoints remember a vendor's store id (deps.get_current_vendor_store)
+    VENDOR_STORE_CACHE_TTL_SECONDS: int = 30
+
+    # In-memory category tree (app/services/category_tree.py): how often the category
+    # table is checked for changes.
+    CATEGORY_TREE_REFRESH_SECONDS: float = 5.0
+
+    # Real-time push over WebSocket/SSE (app/services/realtime.py). Enable the Redis
+    # flag when running more than one API process, so events reach every process.
+    REALTIME_ENABLED: bool = True
+    REALTIME_REDIS_ENABLED: bool = False
+    REALTIME_HEARTBEAT_SECONDS: float = 25.0
+    REALTIME_SEND_QUEUE_SIZE: int = 100  # Events queued per connection before it is asked to resync
+    REALTIME_SEND_TIMEOUT_SECONDS: float = 10.0  # A WebSocket send blocked this long closes the connection
+    REALTIME_MAX_CONNECTIONS: int = 20000  # Per process
+
     # --- 7. Email Settings (UNCHANGED, for future use) ---
     # For sending password resets, etc.
     SMTP_HOST: str | None = None
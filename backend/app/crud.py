@@ -1,14 +1,17 @@
 import uuid
 import httpx
 import logging
-from typing import Optional, List
-from datetime import datetime
+from typing import Callable, Optional, List, Tuple
+from datetime import datetime, timedelta
 from sqlmodel import Session, select, delete
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import or_, func, text
+from sqlalchemy import or_, func, text, cast, exists, insert, tuple_, literal, literal_column, type_coerce, union_all, update, Float, Text
+from sqlalchemy.types import NullType
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func as sqla_func
 from geoalchemy2.functions import ST_Distance_Sphere, ST_MakePoint, ST_X, ST_Y
-from geoalchemy2 import WKTElement
+from geoalchemy2 import WKBElement, WKTElement, Geography
+from geoalchemy2.shape import to_shape
 from passlib.context import CryptContext
 from app.schemas.notification import NotificationCreate
 
@@ -16,23 +19,38 @@ logger = logging.getLogger(__name__)
 
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
+from app.services.spatial_index import store_index
+from app.services.search_index import food_search_index, tokenize
+from app.services.city import city_from_address, normalize_city
+from app.services.hot_inventory import hot_inventory
+from app.services.notification_outbox import enqueue_notification
+from app.services.notification_inbox import add_unread, remove_unread, unread_count
+from app.services.realtime import realtime_hub
+from app.services.food_item_cache import food_item_cache
+from app.services.category_tree import CategoryTree, category_tree_cache
+from app.services.cache import LRUCache
+from app.services.reservation import (
+    FOOD_ITEM, SURPRISE_BAG, InsufficientStockError, release_held, release_stock, reserve_stock, settle_held,
+    stock_lines
+)
 
 # --- Import Models ---
 from app.models import (
-    User, UserRole, Store, FoodItem, SurpriseBag, Order, OrderItem,
+    User, UserRole, Store, Category, FoodItem, SurpriseBag, Order, OrderItem,
     OrderStatus, Review, Transaction, TransactionStatus, Notification,
-    Noti_User, Conversation, ConversationMember, Message
+    Noti_User, NotificationInbox, NotificationBroadcastJob, BroadcastJobStatus, Conversation, ConversationMember, Message
 )
 
 # --- Import Schemas ---
 from app.schemas.user import UserCreate, UserUpdate
-from app.schemas.store import StoreCreate, StoreUpdate
+from app.schemas.store import StoreCreate, StoreUpdate, StoreWithDistance
 from app.schemas.food_item import FoodItemCreate, FoodItemUpdate
 from app.schemas.surprise_bag import SurpriseBagCreate, SurpriseBagUpdate
 from app.schemas.order import OrderCreate
 from app.schemas.transaction import OrderConfirmPickupRequest
 from app.schemas.notification import NotificationCreate
 from app.schemas.chat import ConversationCreate, MessageCreate
+from app.schemas.common import encode_cursor, decode_cursor
 # Query stores with distance calculation
         # ST_Distance_Sphere calculates distance in meters, divide by 1000 for km
 from sqlalchemy.orm import Query
@@ -49,17 +67,72 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_food_items_by_store(session: Session, store_id: uuid.UUID, skip: int = 0, limit: int = 100):
+def _column_python_type(column) -> type:
+    """Python type of a column, looking through TypeDecorators such as sqlmodel's UTC datetime."""
+    column_type = column.type
+    python_type = column_type.python_type
+    if python_type is object and hasattr(column_type, "impl"):
+        python_type = column_type.impl.python_type
+    return python_type
+
+def _keyset_page(
+    session: Session,
+    statement,
+    sort_columns: list,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_count: bool = True,
+    descending: bool = False,
+    row_key: Optional[Callable] = None
+) -> dict:
+    """
+    Run `statement` as one page ordered by `sort_columns` (the last one must be unique).
+    With a cursor the page starts right after the cursor row (keyset), otherwise at `skip`.
+    The total count is a separate query, so it only runs when include_count is set.
+    `row_key` returns the sort values of a result row when they are not plain attributes
+    of it (multi-entity selects). Raises ValueError for a malformed cursor.
+    """
+    total_count = None
+    if include_count:
+        count_statement = select(func.count()).select_from(statement.order_by(None).subquery())
+        total_count = session.exec(count_statement).one()
+
+    if cursor:
+        values = decode_cursor(cursor, [_column_python_type(column) for column in sort_columns])
+        key = tuple_(*sort_columns)
+        after = tuple_(*[literal(value, column.type) for value, column in zip(values, sort_columns)])
+        statement = statement.where(key < after if descending else key > after)
+    elif skip:
+        statement = statement.offset(skip)
+
+    statement = statement.order_by(*[column.desc() if descending else column.asc() for column in sort_columns])
+    # Fetch one extra row to know whether there is a next page
+    items = list(session.exec(statement.limit(limit + 1)).all())
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        if row_key is not None:
+            next_cursor = encode_cursor(row_key(items[-1]))
+        else:
+            next_cursor = encode_cursor([getattr(items[-1], column.key) for column in sort_columns])
+
+    return {"data": items, "count": total_count, "next_cursor": next_cursor}
+
+def get_food_items_by_store(
+    session: Session,
+    store_id: uuid.UUID,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_count: bool = True
+):
     statement = select(FoodItem).where(FoodItem.store_id == store_id, FoodItem.is_available == True)
-    
-    # Get total count
-    count_statement = select(func.count(FoodItem.id)).where(FoodItem.store_id == store_id, FoodItem.is_available == True)
-    total_count = session.exec(count_statement).one()
-    
-    statement = statement.offset(skip).limit(limit)
-    items = session.exec(statement).all()
-    
-    return {"data": items, "count": total_count}
+    return _keyset_page(
+        session, statement, [FoodItem.created_at, FoodItem.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count, descending=True
+    )
 
 def get_food_item(session: Session, food_item_id: uuid.UUID) -> Optional[FoodItem]:
     statement = select(FoodItem).where(FoodItem.id == food_item_id)
@@ -72,54 +145,176 @@ def get_food_items_with_filters(
     category: Optional[str] = None,
     latitude: Optional[float] = None,
     longitude: Optional[float] = None,
-    radius: Optional[float] = None
+    radius: Optional[float] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = True
 ):
     statement = select(FoodItem).where(FoodItem.is_available == True)
     
     if category:
-        statement = statement.where(FoodItem.category == category)
-    
-    # Get total count
-    count_statement = select(func.count(FoodItem.id)).where(FoodItem.is_available == True)
-    if category:
-        count_statement = count_statement.where(FoodItem.category == category)
-    total_count = session.exec(count_statement).one()
+        # A category id or name; items in its subcategories are included
+        statement = statement.where(FoodItem.category_id.in_(get_category_tree(session).find(category)))
     
     # For location filtering, we'd need PostGIS functions
     # For now, just return basic pagination
-    statement = statement.offset(skip).limit(limit)
-    items = session.exec(statement).all()
-    
-    return {"data": items, "count": total_count}
+    return _keyset_page(
+        session, statement, [FoodItem.created_at, FoodItem.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count, descending=True
+    )
 
-def search_food_items(session: Session, query: str, skip: int = 0, limit: int = 100):
-    statement = select(FoodItem).where(
-        FoodItem.is_available == True,
-        or_(
-            FoodItem.name.ilike(f"%{query}%"),
-            FoodItem.description.ilike(f"%{query}%")
+def get_category_tree(session: Session) -> CategoryTree:
+    """The cached category tree, reloaded if the category table changed since the last load."""
+    if not category_tree_cache.needs_check():
+        return category_tree_cache.tree
+    fingerprint = tuple(session.exec(
+        select(func.count(Category.id), func.max(Category.updated_at), func.max(Category.created_at))
+    ).one())
+    if category_tree_cache.is_current(fingerprint):
+        category_tree_cache.mark_checked()
+        return category_tree_cache.tree
+    rows = session.exec(
+        select(
+            Category.id, Category.name, Category.parent_category_id, Category.description,
+            Category.is_active, Category.created_at
         )
-    )
-    
-    # Get total count
-    count_statement = select(func.count(FoodItem.id)).where(
+    ).all()
+    return category_tree_cache.load((dict(row._mapping) for row in rows), fingerprint=fingerprint)
+
+# Full-text search columns maintained by the fooditem_search_update trigger (see models.py)
+_food_search_config = literal_column("'wisebite_search'::regconfig")
+_food_search_vector = literal_column("fooditem.search_vector", type_=TSVECTOR)
+_food_search_text = literal_column("fooditem.search_text", type_=Text)
+
+def _supports_full_text_search(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+def _refresh_food_search_index(session: Session) -> None:
+    """Reload the in-memory search index if the fooditem table changed since the last load."""
+    fingerprint = tuple(session.exec(
+        select(func.count(FoodItem.id), func.max(FoodItem.updated_at), func.max(FoodItem.created_at))
+    ).one())
+    if food_search_index.is_current(fingerprint):
+        return
+    rows = session.exec(
+        select(FoodItem.id, FoodItem.name, FoodItem.description, FoodItem.ingredients, FoodItem.is_available)
+    ).all()
+    food_search_index.load((dict(row._mapping) for row in rows), fingerprint=fingerprint)
+
+def _search_result(item: FoodItem, rank: float, snippet: Optional[str]) -> dict:
+    return {**item.model_dump(), "rank": rank, "snippet": snippet}
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards (and the escape character) so user input matches literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_food_items(
+    session: Session,
+    query: str,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_count: bool = True
+):
+    """
+    Ranked search over food item name, description and ingredients, accent-insensitive.
+    On PostgreSQL this matches the query against the weighted search_vector (GIN) or as an
+    unaccented substring of search_text (trigram GIN), ranks by ts_rank_cd plus word
+    similarity and highlights matches with ts_headline. Elsewhere it uses the in-memory index.
+    Each result is the food item plus `rank` and `snippet`.
+    """
+    if not _supports_full_text_search(session):
+        return _search_food_items_in_memory(session, query, skip, limit, cursor, include_count)
+
+    ts_query = func.websearch_to_tsquery(_food_search_config, query)
+    normalized_query = func.lower(func.unaccent(query))
+    rank = cast(
+        func.coalesce(func.ts_rank_cd(_food_search_vector, ts_query), 0)
+        + func.coalesce(func.word_similarity(normalized_query, _food_search_text), 0),
+        Float
+    ).label("rank")
+    snippet = func.ts_headline(
+        _food_search_config,
+        func.concat_ws(" ", FoodItem.name, FoodItem.description),
+        ts_query,
+        "StartSel=<mark>, StopSel=</mark>, MaxWords=25, MinWords=8"
+    ).label("snippet")
+
+    statement = select(FoodItem, rank, snippet).where(
         FoodItem.is_available == True,
         or_(
-            FoodItem.name.ilike(f"%{query}%"),
-            FoodItem.description.ilike(f"%{query}%")
+            _food_search_vector.op("@@")(ts_query),
+            _food_search_text.like(
+                func.concat("%", func.lower(func.unaccent(_escape_like(query))), "%"), escape="\\"
+            )
         )
     )
-    total_count = session.exec(count_statement).one()
-    
-    statement = statement.offset(skip).limit(limit)
-    items = session.exec(statement).all()
-    
-    return {"data": items, "count": total_count}
+    page = _keyset_page(
+        session, statement, [rank, FoodItem.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count, descending=True,
+        row_key=lambda row: [row[1], row[0].id]
+    )
+    page["data"] = [_search_result(item, item_rank, item_snippet) for item, item_rank, item_snippet in page["data"]]
+    return page
+
+def _search_food_items_in_memory(
+    session: Session,
+    query: str,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    include_count: bool
+) -> dict:
+    _refresh_food_search_index(session)
+    results = food_search_index.search(query)
+    total_count = len(results) if include_count else None
+
+    if cursor:
+        after_rank, after_id = decode_cursor(cursor, [float, uuid.UUID])
+        results = [
+            result for result in results
+            if (result[1], str(result[0]["id"])) < (after_rank, str(after_id))
+        ]
+    else:
+        results = results[skip:]
+
+    page = results[:limit]
+    next_cursor = None
+    if len(results) > limit:
+        next_cursor = encode_cursor([page[-1][1], page[-1][0]["id"]])
+
+    items = {
+        item.id: item
+        for item in session.exec(select(FoodItem).where(FoodItem.id.in_([row["id"] for row, _, _ in page]))).all()
+    }
+    data = [_search_result(items[row["id"]], rank, snippet) for row, rank, snippet in page if row["id"] in items]
+    return {"data": data, "count": total_count, "next_cursor": next_cursor}
+
+def autocomplete_food_items(session: Session, prefix: str, limit: int = 10) -> List[str]:
+    """Distinct available food item names whose words start with the typed prefix, best matches first."""
+    tokens = tokenize(prefix)
+    if not tokens:
+        return []
+    if not _supports_full_text_search(session):
+        _refresh_food_search_index(session)
+        return food_search_index.autocomplete(prefix, limit=limit)
+
+    # Tokens are unaccented [a-z0-9]+ words, safe to splice into to_tsquery syntax
+    ts_query = func.to_tsquery(_food_search_config, " & ".join(f"{token}:*" for token in tokens))
+    best_rank = func.max(func.ts_rank(_food_search_vector, ts_query))
+    statement = (
+        select(FoodItem.name)
+        .where(FoodItem.is_available == True, _food_search_vector.op("@@")(ts_query))
+        .group_by(FoodItem.name)
+        .order_by(best_rank.desc(), FoodItem.name)
+        .limit(limit)
+    )
+    return list(session.exec(statement).all())
 
 def update_food_item(session: Session, db_food_item: FoodItem, item_in: FoodItemUpdate) -> FoodItem:
     item_data = item_in.model_dump(exclude_unset=True)
     db_food_item.sqlmodel_update(item_data)
     session.add(db_food_item)
+    food_item_cache.invalidate(session, db_food_item.store_id)
     session.commit()
     session.refresh(db_food_item)
     return db_food_item
@@ -129,6 +324,7 @@ def delete_food_item(session: Session, food_item_id: uuid.UUID) -> None:
     food_item = session.exec(statement).first()
     if food_item:
         session.delete(food_item)
+        food_item_cache.invalidate(session, food_item.store_id)
         session.commit()
 
 # ============================== User CRUD ====================================================
@@ -215,26 +411,41 @@ def get_store_by_owner_id(session: Session, owner_id: uuid.UUID) -> Optional[Sto
     statement = select(Store).where(Store.owner_id == owner_id)
     return session.exec(statement).first()
 
-def _extract_coordinates_from_store(session: Session, store: Store) -> tuple[Optional[float], Optional[float]]:
-    """Extract latitude and longitude from PostGIS location field."""
-    if not store.location:
-        return None, None
-    
-    try:
-        lat_result = session.execute(select(ST_Y(store.location))).scalar()
-        lon_result = session.execute(select(ST_X(store.location))).scalar()
-        return lat_result, lon_result
-    except Exception:
-        return None, None
+# owner_id -> store_id, read by every merchant request (deps.get_current_vendor_store)
+_store_id_by_owner = LRUCache()
+
+def get_store_id_by_owner_id(session: Session, owner_id: uuid.UUID) -> Optional[uuid.UUID]:
+    """The owner's store id, cached for VENDOR_STORE_CACHE_TTL_SECONDS. Owners without a store are not cached."""
+    hit, store_id = _store_id_by_owner.get(str(owner_id))
+    if hit:
+        return store_id
+    store_id = session.exec(select(Store.id).where(Store.owner_id == owner_id)).first()
+    if store_id is not None:
+        _store_id_by_owner.set(str(owner_id), store_id, settings.VENDOR_STORE_CACHE_TTL_SECONDS)
+    return store_id
+
+def _store_location_columns():
+    """Columns for a Store row with its coordinates projected in the same statement."""
+    return (
+        Store.id,
+        Store.name,
+        Store.address,
+        Store.description,
+        Store.logo_url,
+        Store.owner_id,
+        ST_Y(Store.location).label("latitude"),
+        ST_X(Store.location).label("longitude"),
+    )
 
 def get_store_with_location(session: Session, store_id: uuid.UUID) -> Optional[dict]:
     """Get store by ID with location coordinates extracted."""
-    store = session.get(Store, store_id)
-    if not store:
+    statement = select(*_store_location_columns()).where(Store.id == store_id)
+    row = session.execute(statement).first()
+    if not row:
         return None
-    
-    lat, lon = _extract_coordinates_from_store(session, store)
-    
+    return dict(row._mapping)
+
+def _store_index_row(store: Store, latitude: Optional[float], longitude: Optional[float]) -> dict:
     return {
         "id": store.id,
         "name": store.name,
@@ -242,10 +453,70 @@ def get_store_with_location(session: Session, store_id: uuid.UUID) -> Optional[d
         "description": store.description,
         "logo_url": store.logo_url,
         "owner_id": store.owner_id,
-        "latitude": lat,
-        "longitude": lon
+        "latitude": latitude,
+        "longitude": longitude,
     }
 
+def _store_index_coordinates(location) -> Tuple[Optional[float], Optional[float]]:
+    """(latitude, longitude) of a raw store.location value (WKB/EWKB bytes or hex), decoded without PostGIS."""
+    if location is None:
+        return None, None
+    if isinstance(location, memoryview):
+        location = bytes(location)
+    point = to_shape(WKBElement(location))
+    return point.y, point.x
+
+def _load_store_index_rows(session: Session) -> List[dict]:
+    """Store rows for the index, with the coordinates decoded in Python from the raw location column."""
+    raw_location = type_coerce(Store.location, NullType()).label("location")
+    statement = select(
+        Store.id, Store.name, Store.address, Store.description, Store.logo_url, Store.owner_id, raw_location
+    ).where(Store.location.isnot(None))
+    rows = []
+    for row in session.execute(statement):
+        store = dict(row._mapping)
+        try:
+            latitude, longitude = _store_index_coordinates(store.pop("location"))
+        except Exception as e:
+            logger.warning(f"Skipping store {store['id']} in the spatial index: unreadable location ({e})")
+            continue
+        rows.append({**store, "latitude": latitude, "longitude": longitude})
+    return rows
+
+def _refresh_store_index(session: Session) -> None:
+    """Reload the in-process store index from the database once it is older than the refresh interval."""
+    if not store_index.is_stale(settings.STORE_SPATIAL_INDEX_REFRESH_SECONDS):
+        return
+    try:
+        statement = select(*_store_location_columns()).where(Store.location.isnot(None))
+        store_index.load(dict(row._mapping) for row in session.execute(statement))
+        return
+    except Exception as e:
+        # Without PostGIS the coordinates cannot be projected in SQL; decode them here instead
+        logger.warning(f"Could not project store coordinates, decoding them in Python: {e}")
+        session.rollback()
+    try:
+        store_index.load(_load_store_index_rows(session))
+    except Exception as e:
+        # Keep the rows that create_store/update_store have added incrementally until the next refresh
+        logger.warning(f"Could not load store spatial index from database: {e}")
+        session.rollback()
+        store_index.mark_fresh()
+
+def _stores_within_radius_from_index(
+    session: Session,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    skip: int,
+    limit: int
+) -> List[StoreWithDistance]:
+    _refresh_store_index(session)
+    return [
+        StoreWithDistance(**store, distance_km=round(distance_km, 2), distance_meters=distance_km * 1000)
+        for store, distance_km in store_index.nearest(latitude, longitude, radius_km, skip=skip, limit=limit)
+    ]
+
 def create_store(session: Session, store_create: StoreCreate, owner_id: uuid.UUID) -> Store:
     logger.info(f"CRUD: Creating store for owner {owner_id}")
     logger.info(f"CRUD: store_create data: {store_create}")
@@ -269,6 +540,7 @@ def create_store(session: Session, store_create: StoreCreate, owner_id: uuid.UUI
         store_data.pop("latitude", None)
         store_data.pop("longitude", None)
         store_data["owner_id"] = owner_id
+        store_data["city"] = normalize_city(store_create.city) or city_from_address(store_create.address)
         
         logger.info(f"CRUD: Final store_data before Store creation: {store_data}")
         
@@ -294,6 +566,7 @@ def create_store(session: Session, store_create: StoreCreate, owner_id: uuid.UUI
         session.commit()
         logger.info("CRUD: Refreshing store object...")
         session.refresh(db_store)
+        store_index.upsert(_store_index_row(db_store, store_create.latitude, store_create.longitude))
         logger.info(f"CRUD: Store created successfully with ID: {db_store.id}")
         return db_store
         
@@ -317,16 +590,37 @@ def update_store(session: Session, db_store: Store, store_in: StoreUpdate) -> St
     # Remove latitude/longitude from store_data as they're not direct fields
     store_data.pop("latitude", None)
     store_data.pop("longitude", None)
+
+    if "city" in store_data or "address" in store_data:
+        store_data["city"] = (
+            normalize_city(store_data.get("city"))
+            or city_from_address(store_data.get("address", db_store.address))
+        )
     
     db_store.sqlmodel_update(store_data)
     session.add(db_store)
     session.commit()
     session.refresh(db_store)
+
+    if store_in.latitude is not None and store_in.longitude is not None:
+        store_index.upsert(_store_index_row(db_store, store_in.latitude, store_in.longitude))
+    else:
+        indexed = store_index.get(db_store.id)
+        if indexed:
+            store_index.upsert(_store_index_row(db_store, indexed["latitude"], indexed["longitude"]))
     return db_store
 
-def get_all_stores(session: Session, skip: int = 0, limit: int = 100) -> List[Store]:
-    query = select(Store).offset(skip).limit(limit)
-    return list(session.exec(query).all())
+def get_all_stores(
+    session: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_count: bool = False
+) -> dict:
+    return _keyset_page(
+        session, select(Store), [Store.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count
+    )
 
 def get_stores_within_radius(
     session: Session,
@@ -335,90 +629,107 @@ def get_stores_within_radius(
     radius_km: float = 10.0,
     skip: int = 0,
     limit: int = 100
-) -> List[dict]:
+) -> List[StoreWithDistance]:
     """
     Get stores within a specified radius from a given location, sorted by distance.
-    Returns list of dicts with store data and distance_km.
+
+    Coordinates and distance are projected in the same statement as the store
+    columns, so a page of results costs a single round trip. With
+    STORE_SPATIAL_CACHE_ENABLED the in-process grid index answers instead, and it
+    is always the fallback when PostGIS is unavailable.
     """
+    if settings.STORE_SPATIAL_CACHE_ENABLED:
+        return _stores_within_radius_from_index(session, latitude, longitude, radius_km, skip, limit)
+
     try:
         # Try PostGIS spatial query first
-        # Create a point for the search location
         search_point = WKTElement(f"POINT({longitude} {latitude})", srid=4326)
-        
-        
-        query = session.query(
-            Store,
-            (ST_Distance_Sphere(Store.location, search_point) / 1000).label('distance_km')
-        ).filter(
+        # ST_Distance_Sphere calculates distance in meters, divide by 1000 for km
+        distance_km = (ST_Distance_Sphere(Store.location, search_point) / 1000).label("distance_km")
+
+        statement = select(*_store_location_columns(), distance_km).where(
             and_(
                 Store.location.isnot(None),
                 ST_Distance_Sphere(Store.location, search_point) <= radius_km * 1000  # Convert km to meters
             )
-        ).order_by(
-            'distance_km'
-        ).offset(skip).limit(limit)
-        
+        ).order_by(distance_km, Store.id).offset(skip).limit(limit)
+
         results = []
-        for store, distance_km in query.all():
-            store_dict = {
-                "id": store.id,
-                "name": store.name,
-                "address": store.address,
-                "description": store.description,
-                "logo_url": store.logo_url,
-                "owner_id": store.owner_id,
-                "distance_km": round(distance_km, 2) if distance_km else None
-            }
-            
-            # Extract latitude and longitude from PostGIS location if available
-            lat, lon = _extract_coordinates_from_store(session, store)
-            store_dict["latitude"] = lat
-            store_dict["longitude"] = lon
-                
-            results.append(store_dict)
-        
+        for row in session.execute(statement):
+            store_data = dict(row._mapping)
+            if store_data["distance_km"] is not None:
+                store_data["distance_km"] = round(store_data["distance_km"], 2)
+            results.append(StoreWithDistance(**store_data))
         return results
     
     except Exception as e:
-        # Fallback to simple query without spatial functions for testing environments
-        print(f"Warning: PostGIS spatial functions not available ({e}), using fallback query")
+        # Fallback to the in-process grid index when spatial functions are unavailable
+        logger.warning(f"PostGIS spatial functions not available ({e}), using in-memory spatial index")
         
         # Rollback the current transaction to clear the error state
         session.rollback()
         
-        # Simple query without spatial filtering for testing
-        query = select(Store).where(Store.location.isnot(None)).offset(skip).limit(limit)
-        stores = session.exec(query).all()
-        
-        results = []
-        for store in stores:
-            store_dict = {
-                "id": store.id,
-                "name": store.name,
-                "address": store.address,
-                "description": store.description,
-                "logo_url": store.logo_url,
-                "owner_id": store.owner_id,
-                "distance_km": 5.0  # Mock distance for testing
-            }
-            
-            # Extract latitude and longitude from PostGIS location if available
-            lat, lon = _extract_coordinates_from_store(session, store)
-            store_dict["latitude"] = lat
-            store_dict["longitude"] = lon
-                
-            results.append(store_dict)
-        
-        return results
+        return _stores_within_radius_from_index(session, latitude, longitude, radius_km, skip, limit)
+
+def get_nearest_stores(
+    session: Session,
+    latitude: float,
+    longitude: float,
+    radius_km: float = 10.0,
+    limit: int = 20,
+    after_distance_meters: Optional[float] = None,
+    after_id: Optional[uuid.UUID] = None
+) -> List[StoreWithDistance]:
+    """
+    KNN nearest-store search backed by the geography GiST index on store.location.
+
+    ST_DWithin prunes candidates through the index and `<->` lets PostgreSQL walk
+    the index in distance order, so latency stays flat as the store table grows.
+    Pages are keyed on (distance, id): pass the `distance_meters` and `id` of the
+    last store of the previous page instead of an offset.
+    """
+    geography = Geography(geometry_type="POINT", srid=4326)
+    search_point = cast(func.ST_SetSRID(ST_MakePoint(longitude, latitude), 4326), geography)
+    store_location = cast(Store.location, geography)
+    distance_meters = store_location.op("<->", return_type=Float)(search_point).label("distance_meters")
+
+    statement = select(*_store_location_columns(), distance_meters).where(
+        Store.location.isnot(None),
+        func.ST_DWithin(store_location, search_point, radius_km * 1000)
+    )
+    if after_distance_meters is not None and after_id is not None:
+        statement = statement.where(
+            tuple_(distance_meters, Store.id) > tuple_(after_distance_meters, after_id)
+        )
+    statement = statement.order_by(distance_meters, Store.id).limit(limit)
+
+    results = []
+    for row in session.execute(statement):
+        store_data = dict(row._mapping)
+        store_data["distance_km"] = round(store_data["distance_meters"] / 1000, 2)
+        results.append(StoreWithDistance(**store_data))
+    return results
 
 def delete_store(session: Session, store_id: uuid.UUID) -> None:
     db_store = session.get(Store, store_id)
     if db_store:
+        owner_id = db_store.owner_id
         session.delete(db_store)
         session.commit()
+        store_index.remove(store_id)
+        _store_id_by_owner.delete(str(owner_id))
 
 # ============================== FoodItem CRUD (NEW) ==========================================
 
+def get_vendor_food_item(session: Session, item_id: uuid.UUID, owner_id: uuid.UUID) -> Optional[FoodItem]:
+    """The food item if it belongs to a store of `owner_id`, checked in the same query."""
+    statement = (
+        select(FoodItem)
+        .join(Store, Store.id == FoodItem.store_id)
+        .where(FoodItem.id == item_id, Store.owner_id == owner_id)
+    )
+    return session.exec(statement).first()
+
 def create_food_item(session: Session, item_create: FoodItemCreate, store_id: uuid.UUID) -> FoodItem:
     # Convert to dict to allow setting available_quantity if not provided
     item_data = item_create.model_dump()
@@ -430,6 +741,7 @@ def create_food_item(session: Session, item_create: FoodItemCreate, store_id: uu
     
     db_item = FoodItem.model_validate(item_data)
     session.add(db_item)
+    food_item_cache.invalidate(session, store_id)
     session.commit()
     session.refresh(db_item)
     return db_item
@@ -456,6 +768,7 @@ def create_surprise_bag(session: Session, bag_create: SurpriseBagCreate, store_i
         session.commit()
         session.refresh(db_bag)
         logger.info(f"CRUD: Successfully committed surprise bag to database")
+        hot_inventory.reconcile(session, [db_bag.id])
         return db_bag
     except Exception as e:
         logger.error(f"CRUD: Failed to create surprise bag: {e}")
@@ -477,7 +790,9 @@ def get_surprise_bags_with_filters(
     limit: int = 100,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    available_only: Optional[bool] = False
+    available_only: Optional[bool] = False,
+    cursor: Optional[str] = None,
+    include_count: bool = True
 ):
     statement = select(SurpriseBag).options(selectinload(SurpriseBag.store))
     
@@ -490,21 +805,60 @@ def get_surprise_bags_with_filters(
     if max_price is not None:
         statement = statement.where(SurpriseBag.discounted_price <= max_price)
     
-    # Get total count
-    count_statement = select(func.count(SurpriseBag.id))
-    if available_only:
-        count_statement = count_statement.where(SurpriseBag.quantity_available > 0)
-    if min_price is not None:
-        count_statement = count_statement.where(SurpriseBag.discounted_price >= min_price)
+    return _keyset_page(
+        session, statement, [SurpriseBag.created_at, SurpriseBag.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count, descending=True
+    )
+
+def browse_surprise_bags(
+    session: Session,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_count: bool = False,
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    available_from: Optional[datetime] = None,
+    available_until: Optional[datetime] = None,
+    max_price: Optional[float] = None
+):
+    """
+    Bags customers can order right now, soonest pickup first, one keyset page at a time.
+    The stock/active/time predicates match the partial index ix_surprisebag_browse and
+    the city filter is an equality on the normalised Store.city column.
+    """
+    now = datetime.utcnow()
+    statement = (
+        select(SurpriseBag)
+        .where(
+            SurpriseBag.is_active == True,
+            SurpriseBag.quantity_available > 0,
+            SurpriseBag.available_until > now,
+            # DEMO MODE: Allow bags from up to a year ago for demo
+            SurpriseBag.pickup_start_time > now - timedelta(days=365)
+        )
+        .options(selectinload(SurpriseBag.store))
+    )
+
+    if category:
+        statement = statement.where(SurpriseBag.bag_type.ilike(category))
+
+    city_key = normalize_city(city)
+    if city_key:
+        statement = statement.join(Store).where(Store.city == city_key)
+
+    if available_from:
+        statement = statement.where(SurpriseBag.available_from >= available_from)
+
+    if available_until:
+        statement = statement.where(SurpriseBag.available_until <= available_until)
+
     if max_price is not None:
-        count_statement = count_statement.where(SurpriseBag.discounted_price <= max_price)
-    
-    total_count = session.exec(count_statement).one()
-    
-    statement = statement.offset(skip).limit(limit)
-    items = session.exec(statement).all()
-    
-    return {"data": items, "count": total_count}
+        statement = statement.where(SurpriseBag.discounted_price <= max_price)
+
+    return _keyset_page(
+        session, statement, [SurpriseBag.pickup_start_time, SurpriseBag.id],
+        limit=limit, cursor=cursor, include_count=include_count
+    )
 
 def get_surprise_bags_by_store_id(
     session: Session,
@@ -528,6 +882,7 @@ def update_surprise_bag(session: Session, db_bag: SurpriseBag, bag_in: SurpriseB
     session.add(db_bag)
     session.commit()
     session.refresh(db_bag)
+    hot_inventory.reconcile(session, [db_bag.id])
     return db_bag
 
 def delete_surprise_bag(session: Session, bag_id: uuid.UUID) -> bool:
@@ -536,6 +891,7 @@ def delete_surprise_bag(session: Session, bag_id: uuid.UUID) -> bool:
     if bag:
         session.delete(bag)
         session.commit()
+        hot_inventory.reconcile(session, [bag_id])
         return True
     return False
 
@@ -565,48 +921,59 @@ def get_customer_surprise_bag_bookings(session: Session, customer_id: uuid.UUID,
     
     return {"data": paginated_bookings, "count": total_count}
 
-def create_surprise_bag_booking(session: Session, booking_create, bag_id: uuid.UUID, customer_id: uuid.UUID) -> dict:
-    # Get the surprise bag to calculate total amount
-    surprise_bag = session.query(SurpriseBag).filter(SurpriseBag.id == bag_id).first()
-    if not surprise_bag:
-        raise ValueError("Surprise bag not found")
-    
-    if surprise_bag.quantity_available < booking_create.quantity:
-        raise ValueError("Insufficient quantity available")
+def create_surprise_bag_booking(
+    session: Session,
+    booking_create,
+    bag_id: uuid.UUID,
+    customer_id: uuid.UUID,
+    before_commit: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """Book a surprise bag; `before_commit` is called with the booking just before the commit."""
+    # Reserve the bags first: the conditional UPDATE fails instead of overselling
+    try:
+        reserved = reserve_stock(session, {(SURPRISE_BAG, bag_id): booking_create.quantity})
+    except InsufficientStockError as e:
+        if e.available is None:
+            raise ValueError("Surprise bag not found") from e
+        raise ValueError("Insufficient quantity available") from e
+    price = reserved[(SURPRISE_BAG, bag_id)]["price"]
     
     # Create order
     order = Order(
         customer_id=customer_id,
         status=OrderStatus.PENDING_PAYMENT,
-        total_amount=surprise_bag.discounted_price * booking_create.quantity
+        total_amount=price * booking_create.quantity
     )
-    session.add(order)
-    session.flush()  # Get the order ID
-    
-    # Create order item
-    order_item = OrderItem(
-        order_id=order.id,
-        surprise_bag_id=bag_id,
-        quantity=booking_create.quantity,
-        price_per_item=surprise_bag.discounted_price
-    )
-    session.add(order_item)
-    
-    # Update surprise bag quantity
-    surprise_bag.quantity_available -= booking_create.quantity
-    session.add(surprise_bag)
-    
-    session.commit()
+    try:
+        session.add(order)
+        session.flush()  # Get the order ID
+
+        # Create order item
+        order_item = OrderItem(
+            order_id=order.id,
+            surprise_bag_id=bag_id,
+            quantity=booking_create.quantity,
+            price_per_item=price
+        )
+        session.add(order_item)
+        booking = {
+            "id": order.id,
+            "surprise_bag_id": bag_id,
+            "customer_id": customer_id,
+            "quantity": booking_create.quantity,
+            "pickup_time": booking_create.pickup_time,
+            "status": order.status.value,
+            "created_at": order.created_at
+        }
+        if before_commit:
+            before_commit(booking)
+        session.commit()
+    except Exception:
+        release_held(reserved)
+        raise
+    settle_held(reserved)
     
-    return {
-        "id": order.id,
-        "surprise_bag_id": bag_id,
-        "customer_id": customer_id,
-        "quantity": booking_create.quantity,
-        "pickup_time": booking_create.pickup_time,
-        "status": order.status.value,
-        "created_at": order.created_at
-    }
+    return booking
 
 def get_surprise_bag_booking(session: Session, booking_id: uuid.UUID) -> Optional[dict]:
     order = session.query(Order).filter(Order.id == booking_id).first()
@@ -643,22 +1010,15 @@ def cancel_surprise_bag_booking(session: Session, booking_id: uuid.UUID) -> dict
     
     for item in order.items:
         if item.surprise_bag_id and item.surprise_bag:
-            item.surprise_bag.quantity_available += item.quantity
-            session.add(item.surprise_bag)
             surprise_bag_id = item.surprise_bag_id
             quantity = item.quantity
             pickup_time = item.surprise_bag.pickup_start_time
-        elif item.food_item_id and item.food_item:
-            # Restore food item quantities
-            item.food_item.available_quantity += item.quantity
-            item.food_item.reserved_quantity -= item.quantity
-            if item.food_item.reserved_quantity < 0:
-                item.food_item.reserved_quantity = 0
-            session.add(item.food_item)
+    release_stock(session, stock_lines(order.items))
     
     session.add(order)
     session.commit()
     session.refresh(order)
+    publish_order_status(session, order)
     
     # Return all required fields for SurpriseBagBookingPublic
     return {
@@ -673,6 +1033,26 @@ def cancel_surprise_bag_booking(session: Session, booking_id: uuid.UUID) -> dict
 
 # ============================== Order CRUD (ADAPTED) =========================================
 
+def get_order_store_owner_ids(session: Session, order_id: uuid.UUID) -> List[uuid.UUID]:
+    """Owners of the stores an order's items come from, in one query."""
+    bag_owners = select(Store.owner_id).join(SurpriseBag, SurpriseBag.store_id == Store.id).join(
+        OrderItem, OrderItem.surprise_bag_id == SurpriseBag.id
+    ).where(OrderItem.order_id == order_id)
+    food_owners = select(Store.owner_id).join(FoodItem, FoodItem.store_id == Store.id).join(
+        OrderItem, OrderItem.food_item_id == FoodItem.id
+    ).where(OrderItem.order_id == order_id)
+    return list(session.execute(bag_owners.union(food_owners)).scalars())
+
+def publish_order_status(session: Session, order: Order) -> None:
+    """Push a committed status change to the customer and the vendors (app/services/realtime.py)."""
+    if not realtime_hub.enabled:
+        return
+    realtime_hub.publish(
+        [order.customer_id, *get_order_store_owner_ids(session, order.id)],
+        "order_status",
+        {"order_id": order.id, "status": order.status, "updated_at": order.updated_at},
+    )
+
 def get_order_by_id(session: Session, order_id: uuid.UUID) -> Optional[Order]:
     # Use options to pre-load related data to prevent extra queries (N+1 problem)
     statement = select(Order).where(Order.id == order_id).options(
@@ -690,116 +1070,108 @@ def get_orders_by_customer(session: Session, customer_id: uuid.UUID) -> List[Ord
     )
     return session.exec(statement).all()
 
-def create_order(session: Session, order_create: OrderCreate, customer_id: uuid.UUID) -> Order:
+def create_order(
+    session: Session,
+    order_create: OrderCreate,
+    customer_id: uuid.UUID,
+    before_commit: Optional[Callable[[Order], None]] = None
+) -> Order:
+    """
+    Reserve stock for every line and create the order with its items. `before_commit`
+    is called with the loaded order inside the transaction, just before the commit.
+    """
     total_amount = 0
-    db_order_items = []
+    order_item_rows = []
     primary_store_id = None  # Track the primary store for this order
     
     # Start a nested transaction to handle potential errors
     with session.begin_nested():
-        # Step 1: Validate and process each item in the order
-        for item in order_create.items:
-            if item.surprise_bag_id:
-                # Handle surprise bag ordering
-                surprise_bag = session.get(SurpriseBag, item.surprise_bag_id)
-                if not surprise_bag:
-                    raise ValueError(f"SurpriseBag with id {item.surprise_bag_id} not found.")
-                if surprise_bag.quantity_available < item.quantity:
-                    raise ValueError(f"Not enough stock for {surprise_bag.name}. Available: {surprise_bag.quantity_available}, Requested: {item.quantity}")
-
-                # Set primary store from first item
-                if primary_store_id is None:
-                    primary_store_id = surprise_bag.store_id
-
-                # Decrease stock
-                surprise_bag.quantity_available -= item.quantity
-                session.add(surprise_bag)
-
-                # Calculate price for this line item and add to total
-                item_total = surprise_bag.discounted_price * item.quantity
-                total_amount += item_total
-
-                # Create the OrderItem model
-                db_item = OrderItem(
-                    surprise_bag_id=item.surprise_bag_id,
-                    quantity=item.quantity,
-                    price_per_item=surprise_bag.discounted_price
-                )
-                db_order_items.append(db_item)
-                
-            elif item.food_item_id:
-                # Handle food item ordering
-                food_item = session.get(FoodItem, item.food_item_id)
-                if not food_item:
-                    raise ValueError(f"Food item with id {item.food_item_id} not found.")
-                # Use available_quantity instead of quantity
-                if food_item.available_quantity < item.quantity:
-                    raise ValueError(f"Not enough stock for {food_item.name}. Available: {food_item.available_quantity}, Requested: {item.quantity}")
-
-                # Set primary store from first item
-                if primary_store_id is None:
-                    primary_store_id = food_item.store_id
-
-                # Decrease stock - update available_quantity and reserved_quantity
-                food_item.available_quantity -= item.quantity
-                food_item.reserved_quantity += item.quantity
-                session.add(food_item)
-
-                # Calculate price for this line item and add to total - use standard_price instead of original_price
-                item_total = food_item.standard_price * item.quantity
-                total_amount += item_total
-
-                # Create the OrderItem model
-                db_item = OrderItem(
-                    food_item_id=item.food_item_id,
-                    quantity=item.quantity,
-                    price_per_item=food_item.standard_price
-                )
-                db_order_items.append(db_item)
-            else:
-                raise ValueError("Either surprise_bag_id or food_item_id must be provided")
+        # Step 1: Reserve stock for every line at once. One statement resolves all the
+        # referenced bags and food items, locks them in id order and takes the stock;
+        # nothing is reserved if a line is short.
+        reserved = reserve_stock(session, stock_lines(order_create.items))
 
         # Step 2: Create the main Order
         db_order = Order(
             customer_id=customer_id,
-            total_amount=total_amount,
             status=OrderStatus.PENDING, # Default status for new orders
             delivery_address=order_create.delivery_address,
             notes=order_create.notes,
-            preferred_pickup_time=order_create.preferred_pickup_time,
-            items=db_order_items
+            preferred_pickup_time=order_create.preferred_pickup_time
         )
+
+        for item in order_create.items:
+            if item.surprise_bag_id:
+                product = reserved[(SURPRISE_BAG, item.surprise_bag_id)]
+            else:
+                product = reserved[(FOOD_ITEM, item.food_item_id)]
+
+            # Set primary store from first item
+            if primary_store_id is None:
+                primary_store_id = product["store_id"]
+
+            # Calculate price for this line item and add to total
+            total_amount += product["price"] * item.quantity
+
+            order_item_rows.append({
+                "id": uuid.uuid4(),
+                "order_id": db_order.id,
+                "surprise_bag_id": item.surprise_bag_id,
+                "food_item_id": item.food_item_id,
+                "quantity": item.quantity,
+                "price_per_item": product["price"]
+            })
+
+        db_order.total_amount = total_amount
         session.add(db_order)
+        session.flush()
+        # Step 3: All order lines in one multi-row INSERT
+        session.execute(insert(OrderItem), order_item_rows)
 
-    # Commit the transaction if all steps succeeded
-    session.commit()
-    session.refresh(db_order)
-    
-    # Step 3: Send notification to merchant about new order
+    # Step 4: Queue the new-order notification for the merchant; it is committed with
+    # the order and delivered by the outbox worker
+    vendor_id = None
     if primary_store_id:
-        try:
-            # Get store owner to send notification
-            store = session.get(Store, primary_store_id)
-            if store and store.owner_id:
-                customer = session.get(User, customer_id)
-                customer_name = customer.full_name if customer else "Khách hàng"
-                
-                pickup_time_str = ""
-                if order_create.preferred_pickup_time:
-                    pickup_time_str = f" vào lúc {order_create.preferred_pickup_time.strftime('%H:%M ngày %d/%m/%Y')}"
-                
-                notification_data = NotificationCreate(
-                    title="🛒 Đơn hàng mới!",
-                    message=f"{customer_name} đã đặt {len(db_order_items)} món từ cửa hàng của bạn{pickup_time_str}. Tổng tiền: {total_amount:,.0f}đ",
-                    is_important=True
-                )
-                
-                create_notification(session, notification_data, [store.owner_id])
-        except Exception as e:
-            # Don't fail the order if notification fails
-            print(f"Failed to send notification for order {db_order.id}: {e}")
+        # Store owner and customer name in one query
+        customer_name_query = select(User.full_name).where(User.id == customer_id).scalar_subquery()
+        recipient = session.exec(
+            select(Store.owner_id, customer_name_query.label("full_name"))
+            .where(Store.id == primary_store_id)
+        ).first()
+        if recipient and recipient.owner_id:
+            customer_name = recipient.full_name or "Khách hàng"
+            
+            pickup_time_str = ""
+            if order_create.preferred_pickup_time:
+                pickup_time_str = f" vào lúc {order_create.preferred_pickup_time.strftime('%H:%M ngày %d/%m/%Y')}"
+            
+            notification_data = NotificationCreate(
+                title="🛒 Đơn hàng mới!",
+                message=f"{customer_name} đã đặt {len(order_item_rows)} món từ cửa hàng của bạn{pickup_time_str}. Tổng tiền: {total_amount:,.0f}đ",
+                is_important=True
+            )
+            enqueue_notification(session, notification_data, [recipient.owner_id])
+            vendor_id = recipient.owner_id
+
+    order_event = {
+        "order_id": db_order.id, "status": db_order.status,
+        "total_amount": total_amount, "created_at": db_order.created_at
+    }
+    # Commit the transaction if all steps succeeded; the hot inventory holds go back if it fails
+    try:
+        if before_commit:
+            before_commit(get_order_by_id(session, db_order.id))
+        session.commit()
+    except Exception:
+        release_held(reserved)
+        raise
+    settle_held(reserved)
+    # The vendor's order list updates right away; the notification follows through the outbox
+    if vendor_id:
+        realtime_hub.publish([vendor_id], "order_created", order_event)
     
-    return db_order
+    # Reload with items, products and stores eager-loaded for the response
+    return get_order_by_id(session, db_order.id)
 
 def get_orders_by_store(session: Session, store_id: uuid.UUID) -> List[Order]:
     """Get all orders that contain items from a specific store."""
@@ -882,10 +1254,9 @@ def update_order_status(session: Session, order_id: uuid.UUID, new_status: Order
         old_status = order.status
         order.status = new_status
         session.add(order)
-        session.commit()
-        session.refresh(order)
         
-        # Send notification when order is accepted by vendor (status changed to confirmed)
+        # Queue notifications when order is accepted by vendor (status changed to confirmed);
+        # they are committed with the status change and delivered by the outbox worker
         if new_status == OrderStatus.CONFIRMED and old_status != OrderStatus.CONFIRMED:
             try:
                 # Get customer name
@@ -914,7 +1285,7 @@ def update_order_status(session: Session, order_id: uuid.UUID, new_status: Order
                             message=f"Bạn đã chấp nhận đơn hàng #{str(order_id)[:8]} của {customer_name} ({len(order.items)} món). Tổng: {order.total_amount:,.0f}đ",
                             is_important=True
                         )
-                        create_notification(session, merchant_notification, [store.owner_id])
+                        enqueue_notification(session, merchant_notification, [store.owner_id])
                         
                         # Send notification to customer
                         customer_notification = NotificationCreate(
@@ -922,10 +1293,14 @@ def update_order_status(session: Session, order_id: uuid.UUID, new_status: Order
                             message=f"Cửa hàng {store.name} đã chấp nhận đơn hàng #{str(order_id)[:8]} của bạn!",
                             is_important=True
                         )
-                        create_notification(session, customer_notification, [order.customer_id])
+                        enqueue_notification(session, customer_notification, [order.customer_id])
             except Exception as e:
                 # Don't fail the order update if notification fails
-                print(f"Failed to send order accepted notification for order {order_id}: {e}")
+                print(f"Failed to queue order accepted notification for order {order_id}: {e}")
+        
+        session.commit()
+        session.refresh(order)
+        publish_order_status(session, order)
     
     return order
 
@@ -933,29 +1308,16 @@ def cancel_order(session: Session, order_id: uuid.UUID) -> Order:
     """Cancel an order and restore quantities for both surprise bags and food items."""
     order = session.get(Order, order_id)
     if order:
-        # Restore quantities for all items
-        for item in order.items:
-            if item.surprise_bag_id:
-                surprise_bag = session.get(SurpriseBag, item.surprise_bag_id)
-                if surprise_bag:
-                    surprise_bag.quantity_available += item.quantity
-                    session.add(surprise_bag)
-            elif item.food_item_id:
-                food_item = session.get(FoodItem, item.food_item_id)
-                if food_item:
-                    # Restore available_quantity and decrease reserved_quantity
-                    food_item.available_quantity += item.quantity
-                    food_item.reserved_quantity -= item.quantity
-                    # Ensure reserved_quantity doesn't go negative
-                    if food_item.reserved_quantity < 0:
-                        food_item.reserved_quantity = 0
-                    session.add(food_item)
+        # Restore quantities for all items with relative updates, so reservations
+        # made concurrently by other checkouts are not overwritten
+        release_stock(session, stock_lines(order.items))
         
         # Update order status
         order.status = OrderStatus.CANCELLED
         session.add(order)
         session.commit()
         session.refresh(order)
+        publish_order_status(session, order)
     return order
 
 # ============================== Transaction CRUD (ADAPTED) ===================================
@@ -999,6 +1361,7 @@ def confirm_order_pickup_and_pay(
         
         session.commit()
         session.refresh(new_transaction)
+        publish_order_status(session, order)
         
         return new_transaction
         
@@ -1014,12 +1377,26 @@ def get_payment_transaction_by_order(session: Session, order_id: uuid.UUID) -> O
     )
     return session.exec(statement).first()
 
-def create_payment_transaction(session: Session, transaction_create, customer_id: uuid.UUID, order_id: uuid.UUID) -> Transaction:
-    """Create a payment transaction."""
-    # Get the order to determine the payee (vendor)
-    order = get_order_by_id(session=session, order_id=order_id)
+def create_payment_transaction(
+    session: Session,
+    transaction_create,
+    customer_id: uuid.UUID,
+    order_id: uuid.UUID,
+    before_commit: Optional[Callable[[Transaction], None]] = None
+) -> Transaction:
+    """
+    Create a payment transaction. The order row is locked first, so two concurrent
+    payments for the same order are serialised and the second one sees the first.
+    `before_commit` is called with the flushed transaction just before the commit.
+    """
+    order = session.exec(
+        select(Order).where(Order.id == order_id).with_for_update()
+    ).first()
     if not order:
         raise ValueError("Order not found")
+    if get_payment_transaction_by_order(session=session, order_id=order_id):
+        session.rollback()
+        raise ValueError("Order is already paid")
     
     # Determine the payee from the order items
     payee_id = None
@@ -1047,6 +1424,10 @@ def create_payment_transaction(session: Session, transaction_create, customer_id
         status=TransactionStatus.SUCCESSFUL
     )
     session.add(transaction)
+    if before_commit:
+        session.flush()
+        session.refresh(transaction)
+        before_commit(transaction)
     session.commit()
     session.refresh(transaction)
     return transaction
@@ -1076,28 +1457,33 @@ def get_user_transactions(
     skip: int = 0,
     limit: int = 100,
     transaction_type: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None
-) -> List[Transaction]:
-    """Get user's transactions with optional filtering."""
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = False
+) -> dict:
+    """
+    Get user's transactions with optional filtering, newest first. Payments are the
+    transactions linked to an order, refunds the ones that are not. Raises ValueError
+    for an unknown transaction_type or a malformed cursor.
+    """
     statement = select(Transaction).where(
         or_(Transaction.payer_id == user_id, Transaction.payee_id == user_id)
-    ).order_by(Transaction.transaction_date.desc()).offset(skip).limit(limit)
-    return session.exec(statement).all()
-
-def count_user_transactions(
-    session: Session,
-    user_id: uuid.UUID,
-    transaction_type: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None
-) -> int:
-    """Count user's transactions with optional filtering."""
-    from sqlalchemy import func
-    statement = select(func.count(Transaction.id)).where(
-        or_(Transaction.payer_id == user_id, Transaction.payee_id == user_id)
     )
-    return session.exec(statement).one()
+    if transaction_type == "payment":
+        statement = statement.where(Transaction.order_id.isnot(None))
+    elif transaction_type == "refund":
+        statement = statement.where(Transaction.order_id.is_(None))
+    elif transaction_type is not None:
+        raise ValueError("transaction_type must be 'payment' or 'refund'")
+    if start_date is not None:
+        statement = statement.where(Transaction.transaction_date >= start_date)
+    if end_date is not None:
+        statement = statement.where(Transaction.transaction_date <= end_date)
+    return _keyset_page(
+        session, statement, [Transaction.transaction_date, Transaction.id],
+        skip=skip, limit=limit, cursor=cursor, include_count=include_count, descending=True
+    )
 
 def get_transactions_by_order(session: Session, order_id: uuid.UUID) -> List[Transaction]:
     """Get all transactions for an order."""
@@ -1150,44 +1536,198 @@ def get_store(session: Session, store_id: uuid.UUID) -> Optional[Store]:
 # ============================== Notification CRUD (KEPT) =====================================
 
 def create_notification(session: Session, notification_create: NotificationCreate, user_ids: list[uuid.UUID]) -> Notification:
+    """Write a notification and its recipients right away (order paths use enqueue_notification)."""
     db_notification = Notification.model_validate(notification_create)
     session.add(db_notification)
+    session.flush()
+    recipient_rows = [
+        {"notification_id": db_notification.id, "user_id": user_id}
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    if recipient_rows:
+        session.execute(insert(Noti_User), recipient_rows)
+        add_unread(session, [row["user_id"] for row in recipient_rows])
     session.commit()
     session.refresh(db_notification)
-    for user_id in user_ids:
-        noti_user = Noti_User(notification_id=db_notification.id, user_id=user_id)
-        session.add(noti_user)
-    session.commit()
+    realtime_hub.publish([row["user_id"] for row in recipient_rows], "notification", {
+        "id": db_notification.id, "title": db_notification.title, "message": db_notification.message,
+        "is_read": False, "created_at": db_notification.created_at
+    })
     return db_notification
 
-def get_user_notifications(session: Session, user_id: uuid.UUID) -> List[dict]:
-    stmt = select(
+def create_notification_to_all(
+    session: Session, notification_create: NotificationCreate, virtual: Optional[bool] = None
+) -> Tuple[Notification, Optional[NotificationBroadcastJob]]:
+    """
+    Broadcast a notification to every user. A virtual broadcast is a single row merged
+    into inboxes at read time; otherwise a NotificationBroadcastJob is created for
+    app/services/notification_broadcast.py to fan it out, and returned with it.
+    """
+    if virtual is None:
+        virtual = settings.NOTIFICATION_BROADCAST_VIRTUAL
+    db_notification = Notification.model_validate(notification_create, update={"is_broadcast": virtual})
+    session.add(db_notification)
+    job = None
+    if not virtual:
+        job = NotificationBroadcastJob(
+            notification_id=db_notification.id,
+            total_recipients=session.exec(select(func.count()).select_from(User)).one(),
+        )
+        session.add(job)
+    session.commit()
+    session.refresh(db_notification)
+    if job is not None:
+        session.refresh(job)
+    else:
+        # Everyone connected sees a virtual broadcast at once; a job publishes when it completes
+        realtime_hub.publish(None, "notification", {
+            "id": db_notification.id, "title": db_notification.title, "message": db_notification.message,
+            "is_read": False, "created_at": db_notification.created_at
+        })
+    return db_notification, job
+
+def get_all_notifications(session: Session) -> List[Notification]:
+    return session.exec(select(Notification).order_by(Notification.created_at.desc())).all()
+
+def get_broadcast_job(session: Session, job_id: uuid.UUID) -> Optional[NotificationBroadcastJob]:
+    return session.get(NotificationBroadcastJob, job_id)
+
+def reset_broadcast_job(session: Session, job: NotificationBroadcastJob) -> NotificationBroadcastJob:
+    """Mark a failed job pending again; it resumes after its last delivered chunk."""
+    job.status = BroadcastJobStatus.PENDING
+    job.error = None
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def _virtual_broadcasts_for(user_id: uuid.UUID):
+    """
+    Virtual broadcasts in a user's inbox that have no Noti_User row for them yet (the
+    row appears once it is read). Like materialised ones, only important broadcasts
+    reach users who signed up after they were sent.
+    """
+    user_created_at = select(User.created_at).where(User.id == user_id).scalar_subquery()
+    materialised = exists().where(
+        Noti_User.notification_id == Notification.id,
+        Noti_User.user_id == user_id,
+    )
+    return (
+        Notification.is_broadcast == True,
+        or_(Notification.is_important == True, Notification.created_at >= user_created_at),
+        ~materialised,
+    )
+
+def _user_inbox(user_id: uuid.UUID):
+    """A user's Noti_User rows plus the virtual broadcasts they see, as one subquery."""
+    personal = select(
         Notification.id, Notification.title, Notification.message,
         Noti_User.is_read, Noti_User.created_at
-    ).join(Noti_User).where(Noti_User.user_id == user_id).order_by(Noti_User.created_at.desc())
-    results = session.exec(stmt).all()
+    ).join(Noti_User).where(Noti_User.user_id == user_id)
+    broadcast = select(
+        Notification.id, Notification.title, Notification.message,
+        literal(False).label("is_read"), Notification.created_at
+    ).where(*_virtual_broadcasts_for(user_id))
+    return union_all(personal, broadcast).subquery()
+
+def get_user_notifications(session: Session, user_id: uuid.UUID) -> List[dict]:
+    inbox = _user_inbox(user_id)
+    rows = session.execute(select(inbox).order_by(inbox.c.created_at.desc())).all()
     # Convert Row objects to dictionaries for proper schema validation
-    return [r._asdict() for r in results]
+    return [r._asdict() for r in rows]
+
+def get_user_notifications_page(
+    session: Session,
+    user_id: uuid.UUID,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_count: bool = False
+) -> dict:
+    """One page of a user's inbox, newest first, keyed by (created_at, id)."""
+    inbox = _user_inbox(user_id)
+    result = _keyset_page(
+        session, select(*inbox.c), [inbox.c.created_at, inbox.c.id],
+        limit=limit, cursor=cursor, include_count=include_count, descending=True
+    )
+    result["data"] = [r._asdict() for r in result["data"]]
+    return result
+
+def get_unread_notification_count(session: Session, user_id: uuid.UUID) -> int:
+    """Counter from the inbox read model plus unread virtual broadcasts."""
+    count = unread_count(session, user_id)
+    virtual = session.exec(
+        select(func.count()).select_from(Notification).where(*_virtual_broadcasts_for(user_id))
+    ).one()
+    return count + virtual
 
 def mark_notification_as_read(session: Session, notification_id: uuid.UUID, user_id: uuid.UUID) -> bool:
-    stmt = select(Noti_User).where(
-        Noti_User.notification_id == notification_id,
-        Noti_User.user_id == user_id
+    result = session.execute(
+        update(Noti_User)
+        .where(
+            Noti_User.notification_id == notification_id,
+            Noti_User.user_id == user_id,
+            Noti_User.is_read == False
+        )
+        .values(is_read=True)
     )
-    noti_user = session.exec(stmt).first()
-    if not noti_user:
+    if result.rowcount:
+        remove_unread(session, user_id)
+        session.commit()
+        return True
+
+    already_read = session.exec(
+        select(Noti_User.notification_id).where(
+            Noti_User.notification_id == notification_id,
+            Noti_User.user_id == user_id
+        )
+    ).first()
+    if already_read:
+        return True
+    # A virtual broadcast gets its row for this user when it is first read
+    broadcast = session.exec(
+        select(Notification).where(Notification.id == notification_id, *_virtual_broadcasts_for(user_id))
+    ).first()
+    if not broadcast:
         return False
-    noti_user.is_read = True
-    session.add(noti_user)
+    session.add(Noti_User(notification_id=notification_id, user_id=user_id, is_read=True, created_at=broadcast.created_at))
     session.commit()
     return True
 
+def mark_all_notifications_as_read(session: Session, user_id: uuid.UUID) -> int:
+    """Mark a user's whole inbox read: one UPDATE for their rows, one INSERT ... SELECT for virtual broadcasts."""
+    # Lock the counter row first so notifications delivered meanwhile are either
+    # marked read here or counted after the reset
+    unread_count(session, user_id, for_update=True)
+    marked = session.execute(
+        update(Noti_User)
+        .where(Noti_User.user_id == user_id, Noti_User.is_read == False)
+        .values(is_read=True)
+    ).rowcount
+    marked += session.execute(
+        insert(Noti_User).from_select(
+            ["notification_id", "user_id", "is_read", "created_at"],
+            select(Notification.id, literal(user_id), literal(True), Notification.created_at)
+            .where(*_virtual_broadcasts_for(user_id)),
+        )
+    ).rowcount
+    session.execute(
+        update(NotificationInbox).where(NotificationInbox.user_id == user_id).values(unread_count=0)
+    )
+    session.commit()
+    return marked
+
 def add_noti_to_new_user(session: Session, user_id: uuid.UUID):
-    stmt = select(Notification).where(Notification.is_important == True)
-    important_notifications = session.exec(stmt).all()
-    for notification in important_notifications:
-        noti_user = Noti_User(notification_id=notification.id, user_id=user_id)
-        session.add(noti_user)
+    """Give a new user every important notification, in one INSERT ... SELECT (virtual broadcasts need no row)."""
+    result = session.execute(
+        insert(Noti_User).from_select(
+            ["notification_id", "user_id", "is_read", "created_at"],
+            select(Notification.id, literal(user_id), literal(False), Notification.created_at).where(
+                Notification.is_important == True,
+                Notification.is_broadcast == False,
+            ),
+        )
+    )
+    session.add(NotificationInbox(user_id=user_id, unread_count=max(result.rowcount, 0)))
 
 # ============================== Review & Rating CRUD (KEPT & ADAPTED) ===========================
 
@@ -1231,18 +1771,115 @@ def create_message(session: Session, message_create: MessageCreate, sender_id: u
     db_conversation = session.get(Conversation, message_create.conversation_id)
     if db_conversation:
         db_conversation.last_message_id = db_message.id
+        db_conversation.updated_at = db_message.created_at
         session.add(db_conversation)
+    # One relative UPDATE bumps every other member's unread count and names them for the push
+    member_ids = session.execute(
+        update(ConversationMember)
+        .where(
+            ConversationMember.conversation_id == message_create.conversation_id,
+            ConversationMember.user_id != sender_id
+        )
+        .values(unread_count=ConversationMember.unread_count + 1)
+        .returning(ConversationMember.user_id)
+    ).scalars().all()
     session.commit()
     session.refresh(db_message)
+    realtime_hub.publish(member_ids, "chat_message", {
+        "id": db_message.id, "conversation_id": db_message.conversation_id, "sender_id": db_message.sender_id,
+        "content": db_message.content, "created_at": db_message.created_at
+    })
     return db_message
 
+def get_conversation_members(session: Session, conversation_id: uuid.UUID) -> List[ConversationMember]:
+    return session.exec(select(ConversationMember).where(ConversationMember.conversation_id == conversation_id)).all()
+
+def is_conversation_member(session: Session, conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    return session.exec(
+        select(ConversationMember.user_id).where(
+            ConversationMember.conversation_id == conversation_id,
+            ConversationMember.user_id == user_id
+        )
+    ).first() is not None
+
 def get_user_conversations(session: Session, user_id: uuid.UUID) -> list[Conversation]:
     statement = select(Conversation).join(ConversationMember).where(ConversationMember.user_id == user_id).order_by(Conversation.updated_at.desc())
     return session.exec(statement).all()
 
-def get_messages_by_conversation(session: Session, conversation_id: uuid.UUID) -> list[Message]:
-    statement = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at.asc())
-    return session.exec(statement).all()
+def get_user_conversations_and_last_message(
+    session: Session,
+    user_id: uuid.UUID,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> dict:
+    """
+    A user's conversations, most recently active first, each with its last message and
+    the user's unread count from one joined query (members are loaded in one more).
+    """
+    statement = (
+        select(Conversation, Message, ConversationMember.unread_count)
+        .join(ConversationMember, and_(
+            ConversationMember.conversation_id == Conversation.id,
+            ConversationMember.user_id == user_id
+        ))
+        .outerjoin(Message, Message.id == Conversation.last_message_id)
+        .options(selectinload(Conversation.members))
+    )
+    result = _keyset_page(
+        session, statement, [Conversation.updated_at, Conversation.id],
+        limit=limit, cursor=cursor, include_count=False, descending=True,
+        row_key=lambda row: [row[0].updated_at, row[0].id]
+    )
+    result["data"] = [
+        {**conversation.model_dump(), "members": conversation.members, "last_message": last_message, "unread_count": unread_count}
+        for conversation, last_message, unread_count in result["data"]
+    ]
+    return result
+
+def get_messages_by_conversation(
+    session: Session,
+    conversation_id: uuid.UUID,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> dict:
+    """
+    One page of a conversation's history in ascending order, keyed by (created_at, id):
+    the latest messages by default, older ones with `before`, newer ones with `after`.
+    `before_cursor` / `after_cursor` fetch the neighbouring pages; `before_cursor` is
+    None once the start of the conversation is reached. Raises ValueError for a bad cursor.
+    """
+    if before and after:
+        raise ValueError("Use either before or after, not both")
+    statement = select(Message).where(Message.conversation_id == conversation_id)
+    sort_columns = [Message.created_at, Message.id]
+    if after:
+        page = _keyset_page(session, statement, sort_columns, limit=limit, cursor=after, include_count=False)
+        messages = page["data"]
+        has_older = True
+    else:
+        page = _keyset_page(session, statement, sort_columns, limit=limit, cursor=before, include_count=False, descending=True)
+        messages = page["data"][::-1]
+        has_older = page["next_cursor"] is not None
+
+    def cursor_of(message: Message) -> str:
+        return encode_cursor([message.created_at, message.id])
+
+    return {
+        "data": messages,
+        "before_cursor": cursor_of(messages[0]) if messages and has_older else None,
+        # Polling with after_cursor returns nothing until a newer message arrives
+        "after_cursor": cursor_of(messages[-1]) if messages else after,
+    }
+
+def mark_conversation_read(session: Session, conversation_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    result = session.execute(
+        update(ConversationMember)
+        .where(ConversationMember.conversation_id == conversation_id, ConversationMember.user_id == user_id)
+        .values(unread_count=0)
+    )
+    session.commit()
+    return result.rowcount > 0
 
 
 # --- Password Reset CRUD Functions ---
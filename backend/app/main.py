@@ -3,6 +3,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.api.router import api_router
+from app.services.http_client import http_clients
+from app.services.hot_inventory import hot_inventory
+from app.services.idempotency import IdempotentReplay, replay_handler
+from app.services.notification_outbox import notification_outbox
+from app.services.notification_broadcast import notification_broadcaster
+from app.services.realtime import realtime_hub
+from app.services.surplus_expiry import surplus_expiry
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,10 +44,41 @@ async def lifespan(app: FastAPI):
             print("API will run without database connection")
     else:
         print("Test mode: Skipping database initialization")
+
+    # Open the shared connection pools for outbound integrations (Mapbox, Google, ...)
+    http_clients.start()
+
+    # Flash-sale tier: correct counter drift, then start the write-behind worker
+    if hot_inventory.enabled:
+        hot_inventory.reconcile()
+        hot_inventory.start()
+
+    # Deliver queued notifications in the background (tests drain the outbox themselves)
+    if settings.NOTIFICATION_OUTBOX_WORKER_ENABLED and not os.getenv("TEST_DATABASE_URL"):
+        notification_outbox.start()
+
+    # Mark near-expiry stock as surplus and bag it on a schedule
+    if settings.SURPLUS_EXPIRY_ENABLED and not os.getenv("TEST_DATABASE_URL"):
+        surplus_expiry.start()
+
+    # Receive push events published by the other API processes
+    realtime_hub.start()
+
+    # Broadcast fan-outs interrupted by the last shutdown continue where they stopped
+    if not os.getenv("TEST_DATABASE_URL"):
+        try:
+            notification_broadcaster.resume_unfinished()
+        except Exception as e:
+            print(f"Warning: Could not resume notification broadcasts: {e}")
     
     yield
     # Shutdown
     print("Shutting down WiseBite API...")
+    realtime_hub.stop()
+    notification_outbox.stop()
+    surplus_expiry.stop()
+    hot_inventory.stop()
+    await http_clients.aclose()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -57,6 +95,7 @@ app = FastAPI(
     - **Surprise Bags**: Discounted mystery food packages
     - **Orders**: Complete order management system
     - **Notifications**: Real-time notifications
+    - **Real-time push**: WebSocket (`/realtime/ws`) and SSE (`/realtime/events`) for order status, notifications and chat
     - **Chat**: Messaging between customers and vendors
     - **Transactions**: Payment processing and history
     
@@ -90,5 +129,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Retries sent with an Idempotency-Key get the stored response of the first request
+app.add_exception_handler(IdempotentReplay, replay_handler)
+
 app.include_router(api_router, prefix=settings.API_STR)
 
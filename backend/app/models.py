@@ -4,8 +4,8 @@ from datetime import datetime
 from enum import Enum
 from sqlmodel import SQLModel, Field, Relationship
 from sqlalchemy.sql import func
-from geoalchemy2 import Geometry
-from sqlalchemy import Column
+from geoalchemy2 import Geometry, Geography
+from sqlalchemy import Column, DDL, Index, JSON, cast, event
 
 # --- 1. User and Role Management (ADAPTED) ---
 
@@ -55,6 +55,7 @@ class Store(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str = Field(index=True, max_length=150)
     address: str = Field(max_length=255)
+    city: Optional[str] = Field(default=None, max_length=100, index=True)  # Normalised, see app/services/city.py
     description: Optional[str] = Field(default=None, max_length=500)
     logo_url: Optional[str] = Field(default=None)
     location: Optional[Any] = Field(sa_column=Column(Geometry(geometry_type="POINT", srid=4326), nullable=True), default=None)
@@ -65,6 +66,14 @@ class Store(SQLModel, table=True):
     food_items: List["FoodItem"] = Relationship(back_populates="store")
     surprise_bags: List["SurpriseBag"] = Relationship(back_populates="store")
 
+# GiST index on the geography cast of store.location. Backs the ST_DWithin
+# prefilter and the KNN `<->` ordering used by crud.get_nearest_stores.
+Index(
+    "ix_store_location_geography",
+    cast(Store.__table__.c.location, Geography(geometry_type="POINT", srid=4326)),
+    postgresql_using="gist",
+)
+
 
 # --- 3. Product Category System (NEW) ---
 
@@ -76,6 +85,7 @@ class Category(SQLModel, table=True):
     description: Optional[str] = Field(default=None, max_length=500)
     is_active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()})
     
     # Self-referential relationship for hierarchy
     parent_category: Optional["Category"] = Relationship(
@@ -142,6 +152,54 @@ class FoodItem(SQLModel, table=True):
     surprise_bag_items: List["SurpriseBagItem"] = Relationship(back_populates="food_item")
     inventory_logs: List["InventoryLog"] = Relationship(back_populates="food_item")
 
+# Keyset pagination indexes: food item lists are ordered by (created_at, id) newest first
+Index("ix_fooditem_created_at_id", FoodItem.created_at, FoodItem.id)
+Index("ix_fooditem_store_id_created_at_id", FoodItem.store_id, FoodItem.created_at, FoodItem.id)
+# Expiry window scan of the surplus-expiry engine (app/services/surplus_expiry.py)
+Index("ix_fooditem_expires_at", FoodItem.expires_at, FoodItem.store_id, postgresql_where=FoodItem.is_active)
+
+# Full-text search on food items (PostgreSQL only). fooditem.search_vector (weighted
+# tsvector over name/description/ingredients) and fooditem.search_text (unaccented,
+# lower-cased text for trigram matching) are kept up to date by a trigger and are not
+# mapped on the model. Same DDL as the add_food_item_search migration, so that
+# create_all() builds an equivalent schema.
+FOOD_ITEM_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'wisebite_search') THEN
+            CREATE TEXT SEARCH CONFIGURATION wisebite_search (COPY = simple);
+            ALTER TEXT SEARCH CONFIGURATION wisebite_search
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE fooditem ADD COLUMN IF NOT EXISTS search_text text, ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION fooditem_search_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_text := lower(unaccent(concat_ws(' ', NEW.name, NEW.description, NEW.ingredients)));
+        NEW.search_vector :=
+            setweight(to_tsvector('wisebite_search', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('wisebite_search', coalesce(NEW.description, '')), 'B') ||
+            setweight(to_tsvector('wisebite_search', coalesce(NEW.ingredients, '')), 'C');
+        RETURN NEW;
+    END $$
+    """,
+    "DROP TRIGGER IF EXISTS fooditem_search_update ON fooditem",
+    """
+    CREATE TRIGGER fooditem_search_update
+        BEFORE INSERT OR UPDATE OF name, description, ingredients ON fooditem
+        FOR EACH ROW EXECUTE FUNCTION fooditem_search_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_fooditem_search_vector ON fooditem USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_fooditem_search_text_trgm ON fooditem USING gin (search_text gin_trgm_ops)",
+]
+
+for _statement in FOOD_ITEM_SEARCH_DDL:
+    event.listen(FoodItem.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+
 # --- 5. Inventory Management (NEW) ---
 
 class InventoryLog(SQLModel, table=True):
@@ -206,6 +264,17 @@ class SurpriseBag(SQLModel, table=True):
     bag_items: List["SurpriseBagItem"] = Relationship(back_populates="surprise_bag")
     order_items: List["OrderItem"] = Relationship(back_populates="surprise_bag")
 
+Index("ix_surprisebag_created_at_id", SurpriseBag.created_at, SurpriseBag.id)
+# Partial index for the customer browse query (crud.browse_surprise_bags): only
+# bags that still have stock are indexed, which is a small slice of the table.
+Index(
+    "ix_surprisebag_browse",
+    SurpriseBag.is_active,
+    SurpriseBag.available_until,
+    SurpriseBag.pickup_start_time,
+    postgresql_where=SurpriseBag.quantity_available > 0,
+)
+
 class SurpriseBagItem(SQLModel, table=True):
     """Items that can be included in surprise bags"""
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -310,17 +379,41 @@ class Transaction(SQLModel, table=True):
     payer: "User" = Relationship(sa_relationship_kwargs={"foreign_keys": "Transaction.payer_id"})
     payee: "User" = Relationship(sa_relationship_kwargs={"foreign_keys": "Transaction.payee_id"})
 
+# Transaction history is paged by (transaction_date, id) for either side of the payment
+Index("ix_transaction_payer_id_date_id", Transaction.payer_id, Transaction.transaction_date, Transaction.id)
+Index("ix_transaction_payee_id_date_id", Transaction.payee_id, Transaction.transaction_date, Transaction.id)
+
+class IdempotencyKey(SQLModel, table=True):
+    """Outcome of a POST sent with an Idempotency-Key header (see app/services/idempotency.py)."""
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    key: str = Field(primary_key=True, max_length=255)
+    request_hash: str = Field(max_length=64)  # sha256 of method, path and body
+    status_code: Optional[int] = Field(default=None)  # None while the first request is still running
+    response_body: Optional[str] = Field(default=None)  # JSON
+    created_at: datetime = Field(default_factory=datetime.now)
+    expires_at: datetime = Field(index=True)
+
 class Notification(SQLModel, table=True):
     """KEPT: No changes needed."""
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True, index=True)
     title: str
     message: str
     is_important: bool = Field(default=False)
+    # Virtual broadcast: one row for every user, merged into inboxes at read time
+    # instead of a Noti_User row per user (see crud.get_user_notifications)
+    is_broadcast: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()})
 
     recipients: List["Noti_User"] = Relationship(back_populates="notification", cascade_delete=True)
 
+# Inbox reads look up virtual broadcasts by creation time
+Index(
+    "ix_notification_broadcast_created_at",
+    Notification.created_at,
+    postgresql_where=Notification.is_broadcast,
+)
+
 class Noti_User(SQLModel, table=True):
     """KEPT: No changes needed."""
     notification_id: uuid.UUID = Field(foreign_key="notification.id", ondelete="CASCADE", primary_key=True)
@@ -331,6 +424,54 @@ class Noti_User(SQLModel, table=True):
     notification: "Notification" = Relationship(back_populates="recipients")
     recipient: "User" = Relationship(back_populates="notifications")
 
+# A user's inbox is paged by (created_at, notification_id) newest first
+Index("ix_noti_user_user_id_created_at", Noti_User.user_id, Noti_User.created_at.desc(), Noti_User.notification_id)
+
+class NotificationInbox(SQLModel, table=True):
+    """
+    Read model: unread Noti_User rows per user, updated in the same transaction as
+    the rows (app/services/notification_inbox.py). Virtual broadcasts are counted
+    at read time. A missing row is rebuilt from Noti_User on first read.
+    """
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    unread_count: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()})
+
+class BroadcastJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class NotificationBroadcastJob(SQLModel, table=True):
+    """
+    Fan-out of a notification to every user, in chunks of users ordered by id.
+    last_user_id is the resume point (app/services/notification_broadcast.py).
+    """
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    notification_id: uuid.UUID = Field(foreign_key="notification.id", index=True, ondelete="CASCADE")
+    status: BroadcastJobStatus = Field(default=BroadcastJobStatus.PENDING, index=True)
+    last_user_id: Optional[uuid.UUID] = Field(default=None)
+    total_recipients: int = Field(default=0)
+    processed_recipients: int = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()})
+    finished_at: Optional[datetime] = Field(default=None)
+
+class NotificationOutbox(SQLModel, table=True):
+    """
+    A notification written in the same transaction as the change that caused it.
+    app/services/notification_outbox.py turns batches of these into Notification /
+    Noti_User rows; the outbox id becomes the Notification id.
+    """
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    title: str
+    message: str
+    is_important: bool = Field(default=False)
+    recipient_ids: List[str] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.now, index=True)
+
 class ConversationType(str, Enum):
     PRIVATE = "private"
     GROUP = "group"
@@ -368,4 +509,9 @@ class Message(SQLModel, table=True):
     deleted_at: datetime | None = Field(default=None)
 
     conversation: "Conversation" = Relationship(back_populates="messages", sa_relationship_kwargs={"foreign_keys": "Message.conversation_id"})
-    sender: "User" = Relationship(sa_relationship_kwargs={"foreign_keys": "Message.sender_id"})
\ No newline at end of file
+    sender: "User" = Relationship(sa_relationship_kwargs={"foreign_keys": "Message.sender_id"})
+
+# Chat history pages by (created_at, id) within a conversation
+Index("ix_message_conversation_id_created_at_id", Message.conversation_id, Message.created_at, Message.id)
+# The conversation list looks members up by user; the primary key leads with conversation_id
+Index("ix_conversationmember_user_id", ConversationMember.user_id)
\ No newline at end of file
@@ -28,6 +28,7 @@ class ConversationPublic(ConversationBase):
     last_message_id: uuid.UUID | None
     members: list[ConversationMember] = []
     last_message: MessagePublic | None = None
+    unread_count: int = 0
     created_at: datetime
     updated_at: datetime
 
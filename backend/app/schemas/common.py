@@ -1,11 +1,46 @@
-from typing import List, TypeVar, Generic
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, TypeVar, Generic
 from sqlmodel import SQLModel
 
 T = TypeVar('T')
 
 class PaginationResponse(SQLModel, Generic[T]):
-    """Generic pagination response schema"""
+    """
+    Generic pagination response schema.
+    Pass `next_cursor` back as `cursor` to fetch the next page; it is None on the last page.
+    `count` is the total number of matching rows and is only filled in when requested.
+    """
     data: List[T]
-    count: int
+    count: Optional[int] = None
     skip: int = 0
     limit: int = 100
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort-key values of the last row of a page as an opaque cursor."""
+    raw = json.dumps([str(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: List[type]) -> List[Any]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return [_parse_cursor_value(value, type_) for value, type_ in zip(values, types)]
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _parse_cursor_value(value: str, type_: type) -> Any:
+    if type_ is datetime:
+        return datetime.fromisoformat(value)
+    return type_(value)
@@ -147,6 +147,30 @@ class InventoryLogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class InventoryImportLine(BaseModel):
+    """One line of a bulk inventory import (a CSV row or an NDJSON object)"""
+    sku: str = Field(..., min_length=1, max_length=100)
+    new_total: int = Field(..., ge=0, description="New total quantity")
+    change_type: str = Field("restock", min_length=1, max_length=50)
+    reason: Optional[str] = Field(None, max_length=255)
+
+class InventoryImportRowResult(BaseModel):
+    """Outcome of one import line"""
+    line: int
+    sku: Optional[str] = None
+    status: str  # updated, unchanged, not_found, ambiguous, superseded or invalid
+    previous_quantity: Optional[int] = None
+    new_quantity: Optional[int] = None
+    error: Optional[str] = None
+
+class InventoryImportReport(BaseModel):
+    """Result of a bulk inventory import, one entry per line in line order"""
+    total: int
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[InventoryImportRowResult]
+
 # Legacy schemas for backward compatibility
 class FoodItemBase(SQLModel):
     name: str = Field(min_length=1, max_length=100)
@@ -3,6 +3,8 @@ from typing import Optional, List
 from uuid import UUID
 from pydantic import BaseModel
 
+from app.models import BroadcastJobStatus
+
 class NotificationBase(BaseModel):
     title: str
     message: str
@@ -12,6 +14,7 @@ class NotificationCreate(NotificationBase):
 
 class NotificationPublic(NotificationBase):
     id: UUID
+    is_broadcast: bool = False
     created_at: datetime
     updated_at: datetime
 
@@ -20,6 +23,9 @@ class UserNotification(NotificationBase):
     is_read: bool
     created_at: datetime
 
+class UnreadNotificationCount(BaseModel):
+    unread_count: int
+
 class NotiUserBase(BaseModel):
     notification_id: UUID
     user_id: UUID
@@ -31,3 +37,13 @@ class NotiUserPublic(NotiUserBase):
 
 class NotificationWithUsers(NotificationPublic):
     recipients: List[NotiUserPublic] = []
+
+class BroadcastJobPublic(BaseModel):
+    id: UUID
+    notification_id: UUID
+    status: BroadcastJobStatus
+    total_recipients: int
+    processed_recipients: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
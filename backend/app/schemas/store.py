@@ -5,6 +5,7 @@ from sqlmodel import SQLModel
 class StoreBase(SQLModel):
     name: str
     address: str
+    city: Optional[str] = None  # Derived from the address when not given
     description: Optional[str] = None
     logo_url: Optional[str] = None
 
@@ -15,6 +16,7 @@ class StoreCreate(StoreBase):
 class StoreUpdate(SQLModel):
     name: Optional[str] = None
     address: Optional[str] = None
+    city: Optional[str] = None
     description: Optional[str] = None
     logo_url: Optional[str] = None
     latitude: Optional[float] = None
@@ -28,10 +30,12 @@ class StorePublic(StoreBase):
 
 class StoreWithDistance(StorePublic):
     distance_km: Optional[float] = None
+    distance_meters: Optional[float] = None  # Unrounded, used as the keyset cursor for KNN pages
 
 class StoreWithTravelInfo(StorePublic):
     distance_km: Optional[float] = None
     travel_time_driving_seconds: Optional[float] = None
     travel_time_walking_seconds: Optional[float] = None
     travel_distance_driving_meters: Optional[float] = None
-    travel_distance_walking_meters: Optional[float] = None
\ No newline at end of file
+    travel_distance_walking_meters: Optional[float] = None
+    travel_info_source: Optional[str] = None  # "estimate" or "mapbox"
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Two-tier response cache for outbound integrations.
+
+An in-process LRU with per-entry TTL sits in front of an optional Redis tier
+(configured by the REDIS_* settings). Values must be JSON-serialisable. Misses
+can be cached on purpose ("negative caching") by storing None: `get` tells a
+cached None apart from a miss through its `hit` flag.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries expire after their own TTL."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheTier:
+    """Shared cache tier on Redis. Connection errors degrade to a miss instead of failing the call."""
+
+    def __init__(self, prefix: str = "cache"):
+        self.prefix = prefix
+        self._client: Optional[aioredis.Redis] = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._client is None:
+            self._client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2,
+            )
+        return self._client
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        try:
+            raw = await self.client.get(f"{self.prefix}:{key}")
+        except Exception as e:
+            logger.warning(f"Redis cache get failed for {key}: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        try:
+            await self.client.set(f"{self.prefix}:{key}", json.dumps(value), ex=max(1, int(ttl_seconds)))
+        except Exception as e:
+            logger.warning(f"Redis cache set failed for {key}: {e}")
+
+
+class TieredCache:
+    """LRU in front of an optional Redis tier, with hit/miss counters per namespace."""
+
+    def __init__(self, local: LRUCache, remote: Optional[RedisCacheTier] = None, promote_ttl_seconds: float = 60):
+        self.local = local
+        self.remote = remote
+        self.promote_ttl_seconds = promote_ttl_seconds
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, namespace: str, outcome: str) -> None:
+        with self._stats_lock:
+            counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "remote_hits": 0})
+            counters[outcome] += 1
+
+    async def get(self, namespace: str, key: str) -> Tuple[bool, Any]:
+        full_key = f"{namespace}:{key}"
+        hit, value = self.local.get(full_key)
+        if hit:
+            self._count(namespace, "hits")
+            return True, value
+
+        if self.remote is not None:
+            hit, value = await self.remote.get(full_key)
+            if hit:
+                # Promote to the local tier for a short while so hot keys skip Redis
+                self.local.set(full_key, value, self.promote_ttl_seconds)
+                self._count(namespace, "hits")
+                self._count(namespace, "remote_hits")
+                return True, value
+
+        self._count(namespace, "misses")
+        return False, None
+
+    async def set(self, namespace: str, key: str, value: Any, ttl_seconds: float) -> None:
+        full_key = f"{namespace}:{key}"
+        self.local.set(full_key, value, ttl_seconds)
+        if self.remote is not None:
+            await self.remote.set(full_key, value, ttl_seconds)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._stats_lock:
+            return {namespace: dict(counters) for namespace, counters in self._stats.items()}
+
+    def clear(self) -> None:
+        self.local.clear()
+        with self._stats_lock:
+            self._stats.clear()
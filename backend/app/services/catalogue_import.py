@@ -0,0 +1,209 @@
+"""
+Bulk product catalogue ingestion (scripts/import_catalogue.py).
+
+Onboarding a store means loading thousands of products. This streams a product
+file and loads it in chunks of CATALOGUE_IMPORT_CHUNK_SIZE rows:
+
+- each row is validated against FoodItemCreate, after its `category` (a name,
+  case and accent insensitive, or an id) is resolved through the cached
+  category tree;
+- a chunk's FoodItem rows and their initial_stock InventoryLog rows go out as
+  two batched INSERTs (SQLAlchemy sends executemany inserts as multi-row
+  VALUES), and each chunk commits on its own.
+
+Runs are resumable. `on_chunk` receives the last line of every committed
+chunk, so a caller can checkpoint it and pass it back as `resume_after`. Rows
+whose SKU already exists in their store are skipped as well, so a rerun
+without a checkpoint does not duplicate products either (rows without a SKU
+cannot be matched that way).
+
+Rows may name their store in a `store_id` column; otherwise `store_id` is used.
+"""
+import csv
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import FoodItem, InventoryLog, Store
+from app.schemas.food_item import FoodItemCreate
+from app.services.category_tree import CategoryTree
+from app.services.food_item_cache import food_item_cache
+
+# (line number, raw row)
+ProductRecord = Tuple[int, dict]
+
+
+@dataclass
+class CatalogueImportStats:
+    read: int = 0  # Rows looked at in this run
+    loaded: int = 0
+    skipped: int = 0  # SKU already in the store
+    rejected: int = 0
+    last_line: int = 0  # Last line of the last committed chunk
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def read_product_file(path: str) -> Iterator[ProductRecord]:
+    """Stream rows from a .csv (header row) or .ndjson/.jsonl file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, {"_error": f"Invalid JSON: {e.msg}"}
+
+
+def _chunks(records: Iterable[ProductRecord], size: int) -> Iterator[List[ProductRecord]]:
+    chunk: List[ProductRecord] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _prepare(
+    data: dict, tree: CategoryTree, default_store_id: Optional[uuid.UUID]
+) -> Tuple[uuid.UUID, FoodItemCreate]:
+    """Resolve the row's store and category and validate it. Raises ValueError with the reason."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    if "_error" in data:
+        raise ValueError(data["_error"])
+    # Empty CSV cells mean "not given"
+    data = {key: value.strip() if isinstance(value, str) else value for key, value in data.items() if key}
+    data = {key: value for key, value in data.items() if value not in ("", None)}
+
+    store_id = data.pop("store_id", None) or default_store_id
+    if store_id is None:
+        raise ValueError("No store_id in the row and no default store given")
+    store_id = uuid.UUID(str(store_id))
+
+    category = data.pop("category", None)
+    if category is not None:
+        matches = tree.lookup(str(category))
+        if len(matches) != 1:
+            raise ValueError(f"{'Ambiguous' if matches else 'Unknown'} category: {category}")
+        data["category_id"] = matches[0]
+
+    try:
+        return store_id, FoodItemCreate.model_validate(data)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )) from e
+
+
+def import_catalogue(
+    session: Session,
+    records: Iterable[ProductRecord],
+    tree: CategoryTree,
+    store_id: Optional[uuid.UUID] = None,
+    resume_after: int = 0,
+    chunk_size: Optional[int] = None,
+    on_chunk: Optional[Callable[[CatalogueImportStats], None]] = None,
+    on_reject: Optional[Callable[[int, dict, str], None]] = None,
+) -> CatalogueImportStats:
+    """
+    Load product records ((line, row) pairs, see read_product_file) into FoodItem.
+    Lines up to `resume_after` are skipped without being validated. Returns the run's counts.
+    """
+    stats = CatalogueImportStats(last_line=resume_after)
+    seen: Set[Tuple[uuid.UUID, str]] = set()
+    stores: Dict[uuid.UUID, bool] = {}  # Store id -> exists
+    pending = (record for record in records if record[0] > resume_after)
+
+    for chunk in _chunks(pending, chunk_size or settings.CATALOGUE_IMPORT_CHUNK_SIZE):
+        prepared: List[Tuple[int, uuid.UUID, FoodItemCreate]] = []
+        for line_number, data in chunk:
+            stats.read += 1
+            try:
+                target_store_id, item = _prepare(data, tree, store_id)
+            except ValueError as e:
+                stats.rejected += 1
+                if on_reject:
+                    on_reject(line_number, data, str(e))
+                continue
+            prepared.append((line_number, target_store_id, item))
+
+        unknown = {target_store_id for _, target_store_id, _ in prepared} - stores.keys()
+        if unknown:
+            found = set(session.execute(select(Store.id).where(Store.id.in_(unknown))).scalars())
+            stores.update({candidate: candidate in found for candidate in unknown})
+        for line_number, target_store_id, item in [row for row in prepared if not stores[row[1]]]:
+            stats.rejected += 1
+            if on_reject:
+                on_reject(line_number, item.model_dump(mode="json"), f"Store {target_store_id} not found")
+        prepared = [row for row in prepared if stores[row[1]]]
+
+        keys = {(target_store_id, item.sku) for _, target_store_id, item in prepared if item.sku}
+        existing = set(session.execute(
+            select(FoodItem.store_id, FoodItem.sku).where(tuple_(FoodItem.store_id, FoodItem.sku).in_(keys))
+        ).all()) if keys else set()
+
+        now = datetime.now()
+        items: List[dict] = []
+        logs: List[dict] = []
+        for line_number, target_store_id, item in prepared:
+            key = (target_store_id, item.sku)
+            if item.sku and (key in existing or key in seen):
+                stats.skipped += 1
+                continue
+            if item.sku:
+                seen.add(key)
+            item_id = uuid.uuid4()
+            items.append({
+                **item.model_dump(),
+                "id": item_id,
+                "store_id": target_store_id,
+                "available_quantity": item.total_quantity,
+                "created_at": now,
+                "updated_at": now,
+                "last_inventory_update": now,
+            })
+            logs.append({
+                "id": uuid.uuid4(),
+                "food_item_id": item_id,
+                "change_type": "initial_stock",
+                "quantity_change": item.total_quantity,
+                "previous_quantity": 0,
+                "new_quantity": item.total_quantity,
+                "reason": "Initial catalogue import",
+                "created_at": now,
+            })
+
+        if items:
+            session.execute(insert(FoodItem), items)
+            session.execute(insert(InventoryLog), logs)
+            food_item_cache.invalidate(session, *{row["store_id"] for row in items})
+        session.commit()
+
+        stats.loaded += len(items)
+        stats.last_line = chunk[-1][0]
+        if on_chunk:
+            on_chunk(stats)
+    return stats
@@ -0,0 +1,141 @@
+"""
+In-memory product category tree.
+
+The category table is small and every app launch fetches the tree, so it is
+loaded with one flat select, assembled in Python and kept per process
+(crud.get_category_tree). A snapshot holds:
+
+- the serialised tree of active categories, every level deep, and its ETag, so
+  GET /merchant/food-items/categories/hierarchy answers If-None-Match with a 304;
+- the closure of the hierarchy, each category's id together with the ids of all
+  its active descendants, so "items under Rau Củ" is one `category_id IN (...)`.
+
+Snapshots are immutable and replaced whole on reload. The table is checked for
+changes (row count, latest created/updated time) at most every
+CATEGORY_TREE_REFRESH_SECONDS.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional
+
+from app.core.config import settings
+from app.schemas.category import CategoryResponse
+from app.services.search_index import normalize_text
+
+
+class CategoryTree:
+    """Immutable snapshot of the category hierarchy."""
+
+    def __init__(self, categories: Iterable[dict]):
+        rows = sorted(categories, key=lambda category: (category["created_at"], str(category["id"])))
+        self.categories: Dict[uuid.UUID, dict] = {category["id"]: category for category in rows}
+        self._names = [(category["id"], normalize_text(category["name"])) for category in rows]
+
+        children: Dict[Optional[uuid.UUID], List[dict]] = {}
+        for category in rows:
+            if category["is_active"]:
+                parent_id = category["parent_category_id"]
+                # Children of a missing parent are shown at the top level
+                children.setdefault(parent_id if parent_id in self.categories else None, []).append(category)
+
+        # Depth-first from the roots. Categories below an inactive one, or in a parent
+        # cycle, are not reachable and are left out.
+        self._descendants: Dict[uuid.UUID, FrozenSet[uuid.UUID]] = {}
+        self._nodes: Dict[uuid.UUID, CategoryResponse] = {}
+
+        def build(category: dict) -> CategoryResponse:
+            subcategories = [build(child) for child in children.get(category["id"], [])]
+            node = CategoryResponse(
+                **{field: category[field] for field in CategoryResponse.model_fields if field != "subcategories"},
+                subcategories=subcategories,
+            )
+            self._nodes[category["id"]] = node
+            self._descendants[category["id"]] = frozenset(
+                [category["id"], *(sub_id for sub in subcategories for sub_id in self._descendants[sub.id])]
+            )
+            return node
+
+        self.roots: List[CategoryResponse] = [build(category) for category in children.get(None, [])]
+        self.hierarchy_json: bytes = json.dumps(
+            [root.model_dump(mode="json") for root in self.roots], ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        self.etag = f'"{hashlib.sha256(self.hierarchy_json).hexdigest()[:32]}"'
+
+    def active_categories(self) -> List[CategoryResponse]:
+        """Every active category with its subtree, in creation order."""
+        return [self._nodes[category_id] for category_id in self.categories if category_id in self._nodes]
+
+    def descendant_ids(self, category_id: uuid.UUID) -> FrozenSet[uuid.UUID]:
+        """The category and all its active descendants (just the category if it is not in the active tree)."""
+        return self._descendants.get(category_id, frozenset([category_id]))
+
+    def lookup(self, category: str) -> List[uuid.UUID]:
+        """Ids of the categories matching an id or a name (case and accent insensitive)."""
+        try:
+            category_id = uuid.UUID(category)
+        except ValueError:
+            wanted = normalize_text(category).strip()
+            return [category_id for category_id, name in self._names if name == wanted]
+        return [category_id] if category_id in self.categories else []
+
+    def find(self, category: str) -> FrozenSet[uuid.UUID]:
+        """Ids of the categories matching an id or a name, with their descendants."""
+        try:
+            return self.descendant_ids(uuid.UUID(category))
+        except ValueError:
+            pass
+        return frozenset(sub_id for category_id in self.lookup(category) for sub_id in self.descendant_ids(category_id))
+
+    def etag_matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header value names this snapshot."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+
+class CategoryTreeCache:
+    """The current snapshot and the table fingerprint it was built from."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree: Optional[CategoryTree] = None
+        self._fingerprint: Optional[Hashable] = None
+        self._checked_at: Optional[float] = None
+
+    @property
+    def tree(self) -> Optional[CategoryTree]:
+        return self._tree
+
+    def needs_check(self) -> bool:
+        """True if the table should be checked for changes before serving the snapshot."""
+        checked_at = self._checked_at
+        return (
+            self._tree is None
+            or checked_at is None
+            or time.monotonic() - checked_at >= settings.CATEGORY_TREE_REFRESH_SECONDS
+        )
+
+    def is_current(self, fingerprint: Hashable) -> bool:
+        """True if the snapshot was built from a table in the state described by `fingerprint`."""
+        return self._tree is not None and self._fingerprint == fingerprint
+
+    def mark_checked(self) -> None:
+        self._checked_at = time.monotonic()
+
+    def load(self, categories: Iterable[dict], fingerprint: Hashable = None) -> CategoryTree:
+        tree = CategoryTree(categories)
+        with self._lock:
+            self._tree, self._fingerprint = tree, fingerprint
+            self._checked_at = time.monotonic()
+        return tree
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tree = self._fingerprint = self._checked_at = None
+
+
+category_tree_cache = CategoryTreeCache()
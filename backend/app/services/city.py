@@ -0,0 +1,70 @@
+"""
+City names as stored in Store.city.
+
+Addresses are free text ("12 Lê Lợi, Quận 1, TP. Hồ Chí Minh"), so the city is
+kept in its own normalised column: unaccented, lower-case, administrative
+prefixes dropped and common aliases folded ("TP.HCM", "Sài Gòn" -> "ho chi minh").
+Filters compare against the same normalised form, which lets the browse query use
+a plain equality on an indexed column instead of ILIKE '%city%' on the address.
+"""
+import re
+from typing import Optional
+
+from app.services.search_index import normalize_text
+
+CITY_ALIASES = {
+    "hcm": "ho chi minh",
+    "hcmc": "ho chi minh",
+    "tphcm": "ho chi minh",
+    "sai gon": "ho chi minh",
+    "saigon": "ho chi minh",
+    "ho chi minh city": "ho chi minh",
+    "hanoi": "ha noi",
+    "hn": "ha noi",
+    "danang": "da nang",
+}
+
+# Provinces and centrally-run cities, in normalize_city() form. An address of a
+# single part is only trusted when it is one of these.
+KNOWN_CITIES = frozenset({
+    "ha noi", "ho chi minh", "hai phong", "da nang", "can tho",
+    "an giang", "ba ria vung tau", "bac giang", "bac kan", "bac lieu", "bac ninh", "ben tre",
+    "binh dinh", "binh duong", "binh phuoc", "binh thuan", "ca mau", "cao bang", "dak lak",
+    "dak nong", "dien bien", "dong nai", "dong thap", "gia lai", "ha giang", "ha nam", "ha tinh",
+    "hai duong", "hau giang", "hoa binh", "hung yen", "khanh hoa", "kien giang", "kon tum",
+    "lai chau", "lam dong", "lang son", "lao cai", "long an", "nam dinh", "nghe an", "ninh binh",
+    "ninh thuan", "phu tho", "phu yen", "quang binh", "quang nam", "quang ngai", "quang ninh",
+    "quang tri", "soc trang", "son la", "tay ninh", "thai binh", "thai nguyen", "thanh hoa",
+    "thua thien hue", "tien giang", "tra vinh", "tuyen quang", "vinh long", "vinh phuc", "yen bai",
+})
+
+# "TP.", "Thành phố", "Tỉnh", "City of" ... after normalize_text()
+_PREFIX_RE = re.compile(r"^(?:thanh pho|tp|tinh|city of)\b\.?\s*")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_city(city: Optional[str]) -> Optional[str]:
+    """Canonical form of a city name ("TP. Hồ Chí Minh" -> "ho chi minh"), or None if blank."""
+    text = normalize_text(city).strip()
+    text = _PREFIX_RE.sub("", text)
+    text = _NON_WORD_RE.sub(" ", text).strip()
+    if not text:
+        return None
+    return CITY_ALIASES.get(text, text)
+
+
+def city_from_address(address: Optional[str]) -> Optional[str]:
+    """
+    Normalised city of a comma-separated address: its last part that is not a
+    country name. Without a comma the street and city cannot be told apart, so a
+    single part is only taken when it is a known city, otherwise None.
+    """
+    parts = [part for part in (address or "").split(",") if part.strip()]
+    while parts and normalize_text(parts[-1]).strip() in ("viet nam", "vietnam", "vn"):
+        parts.pop()
+    if not parts:
+        return None
+    city = normalize_city(parts[-1])
+    if len(parts) < 2 and city not in KNOWN_CITIES:
+        return None
+    return city
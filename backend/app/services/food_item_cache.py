@@ -0,0 +1,123 @@
+"""
+Per-store response cache for the merchant food-item listing (GET /merchant/food-items/).
+
+Entries are keyed by store, the store's catalogue version and the filters. Writes
+to a store's items do not delete entries; they bump the store's version, so the
+old entries are never read again and age out of the LRU:
+
+- `invalidate(session, store_id)` records the store on the session, and the bump
+  happens once the transaction commits. A reader that runs between the bump and
+  the commit would otherwise cache pre-commit rows under the new version.
+  Rolled back transactions bump nothing.
+- With FOOD_ITEM_CACHE_REDIS_ENABLED the versions are Redis counters, so a write
+  in one API process invalidates every process. Entries stay in process memory
+  either way. If Redis is unreachable the cache is bypassed.
+
+FOOD_ITEM_CACHE_TTL_SECONDS bounds staleness from writes that bypass `invalidate`.
+"""
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SASession
+
+from app.core.config import settings
+from app.services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = "fooditemcache:version"
+_PENDING_KEY = "food_item_cache_stores"
+
+
+class FoodItemListingCache:
+    """Versioned per-store cache of serialised food-item listings."""
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self.entries = LRUCache(max_entries=settings.FOOD_ITEM_CACHE_MAX_ENTRIES)
+        self._client = client
+        self._versions: Dict[uuid.UUID, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.FOOD_ITEM_CACHE_ENABLED
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2,
+            )
+        return self._client
+
+    def version(self, store_id: uuid.UUID) -> int:
+        if settings.FOOD_ITEM_CACHE_REDIS_ENABLED:
+            return int(self.client.get(f"{VERSION_KEY_PREFIX}:{store_id}") or 0)
+        with self._lock:
+            return self._versions.get(store_id, 0)
+
+    def bump(self, store_ids: Iterable[uuid.UUID]) -> None:
+        """Invalidate the stores' listings right away (callers normally use `invalidate`)."""
+        store_ids = set(store_ids)
+        if not store_ids:
+            return
+        if settings.FOOD_ITEM_CACHE_REDIS_ENABLED:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for store_id in store_ids:
+                    pipe.incr(f"{VERSION_KEY_PREFIX}:{store_id}")
+                pipe.execute()
+            except redis.RedisError as e:
+                # Readers cannot reach Redis either and bypass the cache meanwhile
+                logger.error(f"Food item cache invalidation failed for stores {store_ids}: {e}")
+            return
+        with self._lock:
+            for store_id in store_ids:
+                self._versions[store_id] = self._versions.get(store_id, 0) + 1
+
+    def get_or_load(self, store_id: uuid.UUID, filters: tuple, load: Callable[[], Any]) -> Any:
+        """The cached listing for these filters, loading and storing it on a miss."""
+        if not self.enabled:
+            return load()
+        try:
+            version = self.version(store_id)
+        except redis.RedisError as e:
+            logger.warning(f"Food item cache version lookup failed, loading from the database: {e}")
+            return load()
+        key = f"{store_id}:{version}:{filters}"
+        hit, value = self.entries.get(key)
+        if hit:
+            return value
+        value = load()
+        self.entries.set(key, value, settings.FOOD_ITEM_CACHE_TTL_SECONDS)
+        return value
+
+    def invalidate(self, session: SASession, *store_ids: Optional[uuid.UUID]) -> None:
+        """Bump the stores' versions when the session's transaction commits."""
+        session.info.setdefault(_PENDING_KEY, set()).update(store_id for store_id in store_ids if store_id)
+
+
+food_item_cache = FoodItemListingCache()
+
+
+@event.listens_for(SASession, "after_commit")
+def _bump_after_commit(session: SASession) -> None:
+    store_ids: Set[uuid.UUID] = session.info.pop(_PENDING_KEY, None)
+    if store_ids:
+        food_item_cache.bump(store_ids)
+
+
+@event.listens_for(SASession, "after_soft_rollback")
+def _discard_after_rollback(session: SASession, previous_transaction) -> None:
+    # Savepoint rollbacks keep what the enclosing transaction recorded
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,554 @@
+"""
+Hot inventory tier for flash sales (HOT_INVENTORY_ENABLED).
+
+`quantity_available` of active surprise bags is mirrored in Redis and Redis is
+the authority for them while the tier is on:
+
+- A booking runs one Lua script that checks and decrements the counter and
+  queues the reservation, so the hot path never touches the bag row.
+- A write-behind worker drains the queue in batches and writes the Order /
+  OrderItem rows plus one stock decrement per bag in a single transaction.
+  Booking ids are minted up front, so a batch replayed after a crash skips the
+  orders that were already written.
+- Reservations that still go through PostgreSQL (multi-line orders, bags that
+  are not loaded) hold their quantity in Redis first, see reservation.reserve_stock.
+  A hold is also counted in a per-bag held counter until its transaction commits
+  (`settle`) or rolls back (`release(..., from_hold=True)`).
+- `reconcile` resets counters to the database quantity minus reservations still
+  in flight and holds not yet committed, so a reconcile that reads the bag row
+  before a checkout commits does not give that checkout's stock away again. It
+  runs on startup and whenever a vendor changes a bag; it shares a Redis lock with
+  the worker so it never sees a half-written batch.
+
+Redis errors degrade to the database path. The bags involved are marked dirty
+and the worker reconciles them once Redis is reachable again; so are bags whose
+queued bookings no longer fit the row, which the worker writes as cancelled
+orders instead of overselling; their customers are notified.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import Order, OrderItem, OrderStatus, SurpriseBag
+from app.schemas.notification import NotificationCreate
+from app.services.notification_outbox import enqueue_notification
+from app.services.realtime import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "hotinv"
+PENDING_KEY = f"{KEY_PREFIX}:pending"
+PROCESSING_KEY = f"{KEY_PREFIX}:processing"
+LOCK_KEY = f"{KEY_PREFIX}:lock"
+
+# Returns the remaining quantity, -1 if there is not enough stock, -2 if the bag is not loaded
+RESERVE_SCRIPT = """
+local qty = redis.call('GET', KEYS[1])
+if not qty then return -2 end
+qty = tonumber(qty)
+local n = tonumber(ARGV[1])
+if qty < n then return -1 end
+redis.call('DECRBY', KEYS[1], n)
+redis.call('INCRBY', KEYS[2], n)
+redis.call('RPUSH', KEYS[3], ARGV[2])
+return qty - n
+"""
+
+# All-or-nothing decrement of the loaded counters in the first half of KEYS, adding the
+# quantities to the held counters in the second half (expiring after ARGV[n + 1] ms).
+# Returns {0, i, qty} if the i-th (1-based) line is short, otherwise {1, loaded_1, ...}
+HOLD_SCRIPT = """
+local n = #KEYS / 2
+for i = 1, n do
+    local qty = redis.call('GET', KEYS[i])
+    if qty and tonumber(qty) < tonumber(ARGV[i]) then return {0, i, tonumber(qty)} end
+end
+local result = {1}
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        redis.call('DECRBY', KEYS[i], ARGV[i])
+        redis.call('INCRBY', KEYS[n + i], ARGV[i])
+        redis.call('PEXPIRE', KEYS[n + i], ARGV[n + 1])
+        result[i + 1] = 1
+    else
+        result[i + 1] = 0
+    end
+end
+return result
+"""
+
+# Give quantities back to the loaded counters in the first half of KEYS; when ARGV[n + 1]
+# is '1' they come from a hold that did not commit and leave the held counters too
+RELEASE_SCRIPT = """
+local n = #KEYS / 2
+local from_hold = ARGV[n + 1] == '1'
+for i = 1, n do
+    if redis.call('EXISTS', KEYS[i]) == 1 then redis.call('INCRBY', KEYS[i], ARGV[i]) end
+    if from_hold and redis.call('DECRBY', KEYS[n + i], ARGV[i]) <= 0 then redis.call('DEL', KEYS[n + i]) end
+end
+return 1
+"""
+
+# Committed holds: the bag rows now carry the decrement, so the held counters let go
+SETTLE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('DECRBY', key, ARGV[i]) <= 0 then redis.call('DEL', key) end
+end
+return 1
+"""
+
+# Resume an unfinished batch first, otherwise move up to ARGV[1] entries to processing
+CLAIM_SCRIPT = """
+if redis.call('LLEN', KEYS[2]) > 0 then return redis.call('LRANGE', KEYS[2], 0, -1) end
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+RECONCILE_SCRIPT = """
+local inflight = tonumber(redis.call('GET', KEYS[2]) or '0')
+local held = math.max(tonumber(redis.call('GET', KEYS[3]) or '0'), 0)
+local qty = math.max(tonumber(ARGV[1]) - inflight - held, 0)
+redis.call('SET', KEYS[1], qty, 'PX', ARGV[2])
+return qty
+"""
+
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class HotInventoryShortage(ValueError):
+    """Not enough stock left in the hot tier."""
+
+    def __init__(self, message: str, bag_id: Optional[uuid.UUID] = None, available: Optional[int] = None):
+        super().__init__(message)
+        self.bag_id = bag_id
+        self.available = available
+
+
+def quantity_key(bag_id: uuid.UUID) -> str:
+    return f"{KEY_PREFIX}:bag:{bag_id}:qty"
+
+
+def inflight_key(bag_id: uuid.UUID) -> str:
+    return f"{KEY_PREFIX}:bag:{bag_id}:inflight"
+
+
+def held_key(bag_id: uuid.UUID) -> str:
+    return f"{KEY_PREFIX}:bag:{bag_id}:held"
+
+
+def persist_reservations(session: Session, entries: List[dict]) -> Tuple[Dict[uuid.UUID, int], Set[uuid.UUID]]:
+    """
+    Write queued reservations as Order/OrderItem rows and take their quantity off the
+    bag rows, skipping orders that already exist. The bag rows are locked in id order
+    and an entry that no longer fits their stock (the counter drifted) is written as a
+    cancelled order instead, and its customer is notified in the same transaction.
+    Returns the quantity per bag of the whole batch (including skipped and failed
+    entries), which is what left the in-flight counters, and the ids of bags that came
+    up short.
+    """
+    in_flight: Dict[uuid.UUID, int] = {}
+    for entry in entries:
+        bag_id = uuid.UUID(entry["bag_id"])
+        in_flight[bag_id] = in_flight.get(bag_id, 0) + entry["quantity"]
+
+    order_ids = [uuid.UUID(entry["order_id"]) for entry in entries]
+    existing = set(session.exec(select(Order.id).where(Order.id.in_(order_ids))).all())
+
+    bags = SurpriseBag.__table__
+    rows = session.execute(
+        select(bags.c.id, bags.c.quantity_available, bags.c.name)
+        .where(bags.c.id.in_(sorted(in_flight)))
+        .order_by(bags.c.id)
+        .with_for_update()
+    ).all()
+    stock = {row.id: row.quantity_available for row in rows}
+    names = {row.id: row.name for row in rows}
+
+    written: Dict[uuid.UUID, int] = {}
+    short: Set[uuid.UUID] = set()
+    cancelled: List[dict] = []
+    for entry in entries:
+        order_id = uuid.UUID(entry["order_id"])
+        if order_id in existing:
+            continue
+        existing.add(order_id)
+        bag_id = uuid.UUID(entry["bag_id"])
+        quantity = entry["quantity"]
+        items = []
+        if bag_id in stock:
+            items.append(OrderItem(surprise_bag_id=bag_id, quantity=quantity, price_per_item=entry["price"]))
+        if stock.get(bag_id, 0) >= quantity:
+            status = OrderStatus.PENDING_PAYMENT
+            stock[bag_id] -= quantity
+            written[bag_id] = written.get(bag_id, 0) + quantity
+        else:
+            logger.warning(f"Hot inventory booking {order_id} exceeds the stock of bag {bag_id}, cancelled")
+            status = OrderStatus.CANCELLED
+            short.add(bag_id)
+        order = Order(
+            id=order_id,
+            customer_id=uuid.UUID(entry["customer_id"]),
+            status=status,
+            total_amount=entry["price"] * quantity,
+            created_at=datetime.fromisoformat(entry["created_at"]),
+            items=items,
+        )
+        session.add(order)
+        if status == OrderStatus.CANCELLED:
+            # The booking was confirmed to the customer: tell them it fell through
+            enqueue_notification(session, NotificationCreate(
+                title="❌ Đơn hàng đã bị hủy",
+                message=f"Rất tiếc, {names.get(bag_id) or 'túi bất ngờ'} đã hết hàng nên đơn hàng #{str(order_id)[:8]} của bạn đã bị hủy.",
+                is_important=True
+            ), [order.customer_id])
+            cancelled.append({"order_id": order_id, "customer_id": order.customer_id, "updated_at": order.updated_at})
+
+    for bag_id, quantity in written.items():
+        session.execute(
+            update(bags).where(bags.c.id == bag_id)
+            .values(quantity_available=bags.c.quantity_available - quantity)
+        )
+    session.commit()
+    for event in cancelled:
+        realtime_hub.publish([event["customer_id"]], "order_status", {
+            "order_id": event["order_id"], "status": OrderStatus.CANCELLED, "updated_at": event["updated_at"]
+        })
+    return in_flight, short
+
+
+class HotInventory:
+    """Redis counters, booking queue and write-behind worker for hot surprise bags."""
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self._client = client
+        self._scripts: dict = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Bags whose counters may have drifted, reconciled by the worker
+        self._dirty: Set[uuid.UUID] = set()
+        self._dirty_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.HOT_INVENTORY_ENABLED
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                socket_timeout=0.5,
+                socket_connect_timeout=0.5,
+            )
+        return self._client
+
+    def _script(self, source: str):
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.client.register_script(source)
+        return script
+
+    # --- Hot path ---------------------------------------------------------------------
+
+    def reserve_booking(
+        self,
+        bag: SurpriseBag,
+        customer_id: uuid.UUID,
+        quantity: int,
+        pickup_time: datetime
+    ) -> Optional[dict]:
+        """
+        Book `quantity` of a loaded bag in Redis and queue it for the worker. Returns the
+        booking (SurpriseBagBookingPublic fields), None if the bag is not in the hot tier
+        or Redis is unavailable, and raises HotInventoryShortage if it is sold out.
+        """
+        if not self.enabled:
+            return None
+        now = datetime.now()
+        entry = {
+            "order_id": str(uuid.uuid4()),
+            "bag_id": str(bag.id),
+            "customer_id": str(customer_id),
+            "quantity": quantity,
+            "price": bag.discounted_price,
+            "created_at": now.isoformat(),
+        }
+        try:
+            remaining = self._script(RESERVE_SCRIPT)(
+                keys=[quantity_key(bag.id), inflight_key(bag.id), PENDING_KEY],
+                args=[quantity, json.dumps(entry)],
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Hot inventory unavailable, booking {bag.id} through the database: {e}")
+            self.mark_dirty([bag.id])
+            return None
+        if remaining == -2:
+            return None
+        if remaining == -1:
+            raise HotInventoryShortage("Insufficient quantity available")
+        return {
+            "id": uuid.UUID(entry["order_id"]),
+            "surprise_bag_id": bag.id,
+            "customer_id": customer_id,
+            "quantity": quantity,
+            "pickup_time": pickup_time,
+            "status": OrderStatus.PENDING_PAYMENT.value,
+            "created_at": now,
+        }
+
+    def hold(self, quantities: Dict[uuid.UUID, int]) -> Dict[uuid.UUID, int]:
+        """
+        Take quantities of loaded bags off their counters before a database reservation.
+        Returns what was held: `settle` it once the reservation commits, give it back with
+        `release(..., from_hold=True)` if it does not. Bags that are not loaded are left
+        to the database. Raises HotInventoryShortage.
+        """
+        if not self.enabled or not quantities:
+            return {}
+        bag_ids = list(quantities)
+        try:
+            result = self._script(HOLD_SCRIPT)(
+                keys=[quantity_key(bag_id) for bag_id in bag_ids] + [held_key(bag_id) for bag_id in bag_ids],
+                args=[quantities[bag_id] for bag_id in bag_ids] + [int(settings.HOT_INVENTORY_HOLD_SECONDS * 1000)],
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Hot inventory unavailable, reserving through the database only: {e}")
+            self.mark_dirty(bag_ids)
+            return {}
+        if result[0] == 0:
+            bag_id = bag_ids[result[1] - 1]
+            raise HotInventoryShortage(f"Not enough stock for surprise bag {bag_id}", bag_id, result[2])
+        return {bag_id: quantities[bag_id] for bag_id, loaded in zip(bag_ids, result[1:]) if loaded}
+
+    def release(self, quantities: Dict[uuid.UUID, int], from_hold: bool = False) -> None:
+        """
+        Give quantities back to the counters of loaded bags: cancellations, or with
+        from_hold=True a hold whose reservation did not commit.
+        """
+        if not self.enabled or not quantities:
+            return
+        bag_ids = list(quantities)
+        try:
+            self._script(RELEASE_SCRIPT)(
+                keys=[quantity_key(bag_id) for bag_id in bag_ids] + [held_key(bag_id) for bag_id in bag_ids],
+                args=[quantities[bag_id] for bag_id in bag_ids] + ["1" if from_hold else "0"],
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Hot inventory release failed, counters corrected on reconcile: {e}")
+            self.mark_dirty(bag_ids)
+
+    def settle(self, quantities: Dict[uuid.UUID, int]) -> None:
+        """
+        Forget holds whose reservation committed. A reconcile between the commit and this
+        call counts the quantity twice, which undersells until the next reconcile.
+        """
+        if not self.enabled or not quantities:
+            return
+        bag_ids = list(quantities)
+        try:
+            self._script(SETTLE_SCRIPT)(
+                keys=[held_key(bag_id) for bag_id in bag_ids],
+                args=[quantities[bag_id] for bag_id in bag_ids],
+            )
+        except redis.RedisError as e:
+            # The held counters expire on their own; until then reconciles undersell
+            logger.warning(f"Hot inventory settle failed, counters corrected on reconcile: {e}")
+            self.mark_dirty(bag_ids)
+
+    def mark_dirty(self, bag_ids: Iterable[uuid.UUID]) -> None:
+        """Queue bags for reconciliation after their stock changed without the counters."""
+        with self._dirty_lock:
+            self._dirty.update(bag_ids)
+
+    # --- Write-behind -----------------------------------------------------------------
+
+    def _acquire_lock(self, wait_seconds: float = 0) -> Optional[str]:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait_seconds
+        lock_ms = int(settings.HOT_INVENTORY_LOCK_SECONDS * 1000)
+        while True:
+            if self.client.set(LOCK_KEY, token, nx=True, px=lock_ms):
+                return token
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+    def _release_lock(self, token: str) -> None:
+        self._script(UNLOCK_SCRIPT)(keys=[LOCK_KEY], args=[token])
+
+    def _flush_batch(self, session_factory) -> int:
+        """Persist one claimed batch. The caller holds the lock."""
+        raw = self._script(CLAIM_SCRIPT)(
+            keys=[PENDING_KEY, PROCESSING_KEY], args=[settings.HOT_INVENTORY_BATCH_SIZE]
+        )
+        if not raw:
+            return 0
+        entries = [json.loads(item) for item in raw]
+        with session_factory() as session:
+            in_flight, short = persist_reservations(session, entries)
+        if short:
+            self.mark_dirty(short)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(PROCESSING_KEY)
+        for bag_id, quantity in in_flight.items():
+            pipe.decrby(inflight_key(bag_id), quantity)
+        pipe.execute()
+        return len(entries)
+
+    def flush(self, session_factory=None, drain: bool = False, wait_seconds: float = 0) -> int:
+        """Write queued bookings to the database; with drain=True until the queue is empty."""
+        session_factory = session_factory or _default_session
+        token = self._acquire_lock(wait_seconds)
+        if token is None:
+            return 0
+        written = 0
+        try:
+            while True:
+                count = self._flush_batch(session_factory)
+                written += count
+                if not count or not drain:
+                    break
+        finally:
+            self._release_lock(token)
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.HOT_INVENTORY_FLUSH_INTERVAL_SECONDS):
+            try:
+                self.flush(drain=True)
+            except Exception as e:
+                # The batch stays in the processing list and is retried on the next tick
+                logger.error(f"Hot inventory flush failed: {e}")
+            self.reconcile_dirty()
+
+    def start(self) -> None:
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hot-inventory-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.flush(drain=True, wait_seconds=settings.HOT_INVENTORY_LOCK_SECONDS)
+        except Exception as e:
+            logger.error(f"Hot inventory final flush failed: {e}")
+
+    # --- Reconciliation ---------------------------------------------------------------
+
+    def reconcile(self, session: Optional[Session] = None, bag_ids: Optional[Iterable[uuid.UUID]] = None) -> int:
+        """
+        Reset counters from the database: quantity_available minus what is still queued
+        and what is held by reservations that have not committed yet.
+        Without `bag_ids` every active bag is (re)loaded and counters of bags that are no
+        longer active are dropped. Returns the number of counters loaded.
+        """
+        if not self.enabled:
+            return 0
+        if session is None:
+            with _default_session() as own_session:
+                return self._reconcile(own_session, bag_ids) or 0
+        return self._reconcile(session, bag_ids) or 0
+
+    def reconcile_dirty(self, session: Optional[Session] = None) -> int:
+        """Reconcile the bags marked dirty; they stay marked if Redis is still unavailable."""
+        with self._dirty_lock:
+            bag_ids, self._dirty = self._dirty, set()
+        if not bag_ids:
+            return 0
+        if session is None:
+            with _default_session() as own_session:
+                loaded = self._reconcile(own_session, bag_ids)
+        else:
+            loaded = self._reconcile(session, bag_ids)
+        if loaded is None:
+            self.mark_dirty(bag_ids)
+        return loaded or 0
+
+    def _reconcile(self, session: Session, bag_ids: Optional[Iterable[uuid.UUID]]) -> Optional[int]:
+        """reconcile; returns None if it was skipped or failed."""
+        try:
+            token = self._acquire_lock(wait_seconds=settings.HOT_INVENTORY_LOCK_SECONDS)
+            if token is None:
+                logger.warning("Hot inventory reconcile skipped: lock is busy")
+                return None
+        except redis.RedisError as e:
+            logger.warning(f"Hot inventory reconcile skipped: {e}")
+            return None
+
+        loaded = 0
+        try:
+            # Write what is already queued so the database is as close to Redis as it gets
+            while self._flush_batch(lambda: Session(session.get_bind())):
+                pass
+
+            now = datetime.now()
+            statement = select(SurpriseBag.id, SurpriseBag.quantity_available, SurpriseBag.available_until).where(
+                SurpriseBag.is_active == True,
+                SurpriseBag.available_until > now
+            )
+            if bag_ids is not None:
+                bag_ids = list(bag_ids)
+                statement = statement.where(SurpriseBag.id.in_(bag_ids))
+            active = {row[0]: row for row in session.exec(statement).all()}
+
+            reconcile = self._script(RECONCILE_SCRIPT)
+            slack = timedelta(seconds=settings.HOT_INVENTORY_KEY_SLACK_SECONDS)
+            for bag_id, quantity, available_until in active.values():
+                ttl_ms = max(1, int((available_until - now + slack).total_seconds() * 1000))
+                reconcile(keys=[quantity_key(bag_id), inflight_key(bag_id), held_key(bag_id)], args=[quantity, ttl_ms])
+                loaded += 1
+
+            # Bags that ended, were deactivated or deleted go back to the database path
+            if bag_ids is not None:
+                stale_keys = [quantity_key(bag_id) for bag_id in bag_ids if bag_id not in active]
+            else:
+                stale_keys = [
+                    key for key in self.client.scan_iter(match=f"{KEY_PREFIX}:bag:*:qty", count=500)
+                    if uuid.UUID(key.split(":")[2]) not in active
+                ]
+            if stale_keys:
+                self.client.delete(*stale_keys)
+        except Exception as e:
+            logger.error(f"Hot inventory reconcile failed: {e}")
+            return None
+        finally:
+            try:
+                self._release_lock(token)
+            except redis.RedisError:
+                pass
+        return loaded
+
+
+def _default_session() -> Session:
+    # Imported here: app.core.db imports crud, which uses this module
+    from app.core.db import engine
+    return Session(engine)
+
+
+hot_inventory = HotInventory()
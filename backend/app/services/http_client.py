@@ -0,0 +1,202 @@
+"""
+Application-scoped HTTP clients for outbound integrations.
+
+Each integration (Mapbox, Google, ...) registers itself once with a base URL and
+gets its own keep-alive pool (HTTP/2 when `h2` is installed), a concurrency
+limit, retries with jittered exponential backoff for GET requests and a circuit
+breaker. The clients are opened in `main.lifespan` and closed on shutdown; if a
+client is used outside the app lifespan (scripts, tests) it is opened lazily.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the integration's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and refuses calls for
+    `reset_seconds`. After that a single trial call is let through (half-open):
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class ServiceClient:
+    """Pooled client for one integration host."""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        max_concurrency: int,
+        max_retries: int,
+        breaker: CircuitBreaker
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.breaker = breaker
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=settings.HTTP_CLIENT_HTTP2 and _h2_available(),
+            timeout=httpx.Timeout(
+                settings.HTTP_CLIENT_TIMEOUT_SECONDS,
+                connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request through the pool. 5xx/429 responses and transport errors
+        count against the circuit breaker; GET requests are retried on them.
+        The last response is returned as-is, so callers keep using raise_for_status().
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+
+        attempts = 1 + (self.max_retries if method.upper() == "GET" else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                async with self._semaphore:
+                    response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise
+                logger.warning(f"{self.name} request failed ({e!r}), retrying")
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    self.breaker.record_success()
+                    return response
+                if last_attempt:
+                    self.breaker.record_failure()
+                    return response
+                logger.warning(f"{self.name} returned {response.status_code}, retrying")
+
+            # Full jitter: sleep a random amount up to the exponential backoff
+            await asyncio.sleep(random.uniform(0, settings.HTTP_CLIENT_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+class HTTPClientRegistry:
+    """Named ServiceClients shared by the whole application."""
+
+    def __init__(self):
+        self._clients: Dict[str, ServiceClient] = {}
+
+    def register(
+        self,
+        name: str,
+        base_url: str,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ) -> ServiceClient:
+        """Register an integration. Registering the same name again returns the existing client."""
+        if name not in self._clients:
+            self._clients[name] = ServiceClient(
+                name=name,
+                base_url=base_url,
+                max_concurrency=max_concurrency or settings.HTTP_CLIENT_MAX_CONCURRENCY_PER_HOST,
+                max_retries=settings.HTTP_CLIENT_MAX_RETRIES if max_retries is None else max_retries,
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.HTTP_CLIENT_BREAKER_FAILURE_THRESHOLD,
+                    reset_seconds=settings.HTTP_CLIENT_BREAKER_RESET_SECONDS,
+                ),
+            )
+        return self._clients[name]
+
+    def get(self, name: str) -> ServiceClient:
+        return self._clients[name]
+
+    def start(self) -> None:
+        """Open the connection pools of every registered integration."""
+        for service in self._clients.values():
+            service.client
+
+    async def aclose(self) -> None:
+        for service in self._clients.values():
+            await service.aclose()
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+http_clients = HTTPClientRegistry()
@@ -0,0 +1,252 @@
+"""
+Idempotency keys for POSTs that create orders, bookings and payments.
+
+A client that may retry (mobile networks time out after the server has already
+committed) sends an `Idempotency-Key` header. The first request with a key claims
+it by inserting an IdempotencyKey row; when the endpoint finishes, its status code
+and JSON body are stored on the row for IDEMPOTENCY_KEY_TTL_SECONDS. Endpoints that
+write stage the response from crud's `before_commit` hook, so it is committed in the
+same transaction as the order, booking or payment itself. A retry with
+the same key gets the stored response back (with `Idempotent-Replayed: true`)
+before the endpoint runs, so no stock is reserved and no row is written twice.
+
+- Keys are scoped to the authenticated user.
+- The row also stores a hash of method, path and body; reusing a key for a
+  different request is rejected with 422.
+- A duplicate that arrives while the first request is still running waits for
+  its outcome (up to IDEMPOTENCY_WAIT_SECONDS, then 409). A claim whose request
+  died without finishing is taken over after IDEMPOTENCY_LOCK_SECONDS.
+- 4xx outcomes are stored like successes (retrying a rejected payment returns the
+  same rejection); 5xx and unexpected errors drop the claim so the client can retry.
+
+Requests without the header are not affected and cost no extra query.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Outcomes that say nothing about the request itself and must not be replayed
+_RETRYABLE_STATUS_CODES = {status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+
+class IdempotentReplay(Exception):
+    """Raised before the endpoint runs when a stored response exists; see replay_handler."""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.body = body
+
+
+async def replay_handler(request: Request, exc: IdempotentReplay) -> Response:
+    return Response(
+        content=exc.body,
+        status_code=exc.status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{method.upper()} {path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _record_filter(user_id: uuid.UUID, key: str):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+
+
+def claim_key(session: Session, user_id: uuid.UUID, key: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """
+    Claim `key` for a new request. Returns None when the claim succeeded, otherwise
+    the record that holds the key (finished, or still in progress when status_code is None).
+    The user's expired records are deleted first, which also frees an abandoned claim.
+    """
+    now = datetime.now()
+    session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.expires_at < now)
+    )
+    try:
+        with session.begin_nested():
+            session.add(IdempotencyKey(
+                user_id=user_id,
+                key=key,
+                request_hash=request_hash,
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            ))
+    except IntegrityError:
+        session.commit()
+        record = session.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if record is None:
+            # Released by its request in the meantime
+            return claim_key(session, user_id, key, request_hash)
+        return record
+    session.commit()
+    return None
+
+
+def complete_key(
+    session: Session, user_id: uuid.UUID, key: str, request_hash: str, status_code: int, body: str,
+    commit: bool = True
+) -> None:
+    """Store the outcome of a claimed request so retries replay it (commit=False leaves it to the caller)."""
+    session.execute(
+        update(IdempotencyKey)
+        .where(*_record_filter(user_id, key), IdempotencyKey.request_hash == request_hash)
+        .values(
+            status_code=status_code,
+            response_body=body,
+            expires_at=datetime.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
+    )
+    if commit:
+        session.commit()
+
+
+def release_key(session: Session, user_id: uuid.UUID, key: str, request_hash: str) -> None:
+    """Drop an unfinished claim so the key can be used again."""
+    session.execute(
+        delete(IdempotencyKey).where(
+            *_record_filter(user_id, key),
+            IdempotencyKey.request_hash == request_hash,
+            IdempotencyKey.status_code.is_(None),
+        )
+    )
+    session.commit()
+
+
+def prune_expired_keys(session: Session) -> int:
+    """Delete every expired record (claims also prune the caller's own records)."""
+    result = session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.now()))
+    session.commit()
+    return result.rowcount
+
+
+class IdempotencyContext:
+    """Handed to endpoints by IdempotencyDep; inactive when the request has no Idempotency-Key."""
+
+    def __init__(
+        self,
+        session: Session,
+        user_id: Optional[uuid.UUID] = None,
+        key: Optional[str] = None,
+        request_hash: Optional[str] = None,
+    ):
+        self.session = session
+        self.user_id = user_id
+        self.key = key
+        self.request_hash = request_hash
+        self.pending = key is not None
+        self._staged: Optional[tuple] = None
+
+    def stage(self, result: Any, response_model: Any, status_code: int) -> None:
+        """
+        Write the response onto the claim in the session's open transaction, without
+        committing; pass it as crud's `before_commit` hook so the outcome is committed
+        together with the write. `respond` then returns the staged response.
+        """
+        if not self.pending:
+            return
+        body = jsonable_encoder(response_model.model_validate(result, from_attributes=True))
+        complete_key(
+            self.session, self.user_id, self.key, self.request_hash, status_code, json.dumps(body), commit=False
+        )
+        self._staged = (status_code, body)
+
+    def respond(self, result: Any, response_model: Any, status_code: int) -> Any:
+        """
+        Return value for the endpoint. With an active key the result is serialised the
+        way FastAPI would for `response_model`, stored, and returned as a JSONResponse.
+        A response already committed through `stage` is returned as it was stored.
+        """
+        if not self.pending:
+            return result
+        if self._staged is not None:
+            self.pending = False
+            status_code, body = self._staged
+            return JSONResponse(content=body, status_code=status_code)
+        body = jsonable_encoder(response_model.model_validate(result, from_attributes=True))
+        self._finish(status_code, body)
+        return JSONResponse(content=body, status_code=status_code)
+
+    def fail(self, exc: HTTPException) -> None:
+        """Store a client error as the key's outcome; drop the claim for anything else."""
+        if not self.pending:
+            return
+        self.session.rollback()
+        if 400 <= exc.status_code < 500 and exc.status_code not in _RETRYABLE_STATUS_CODES:
+            self._finish(exc.status_code, {"detail": exc.detail})
+        else:
+            self.release()
+
+    def release(self) -> None:
+        """Drop the claim, unless a staged response was committed (it is then replayed)."""
+        if not self.pending:
+            return
+        self.pending = False
+        try:
+            self.session.rollback()
+            release_key(self.session, self.user_id, self.key, self.request_hash)
+        except Exception as e:
+            # The claim expires after IDEMPOTENCY_LOCK_SECONDS anyway
+            logger.warning("Could not release idempotency key %s: %s", self.key, e)
+
+    def _finish(self, status_code: int, body: Any) -> None:
+        self.pending = False
+        complete_key(self.session, self.user_id, self.key, self.request_hash, status_code, json.dumps(body))
+
+
+async def begin(
+    session: Session, user_id: uuid.UUID, key: str, request_hash: str, wait_seconds: Optional[float] = None
+) -> IdempotencyContext:
+    """
+    Claim `key` for this request, or raise: IdempotentReplay when it already has an
+    outcome, 422 when it was used for a different request, 409 when the first request
+    is still running after `wait_seconds`.
+    """
+    if wait_seconds is None:
+        wait_seconds = settings.IDEMPOTENCY_WAIT_SECONDS
+    deadline = time.monotonic() + wait_seconds
+    delay = 0.05
+    while True:
+        record = await run_in_threadpool(claim_key, session, user_id, key, request_hash)
+        if record is None:
+            return IdempotencyContext(session, user_id, key, request_hash)
+        if record.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"{IDEMPOTENCY_HEADER} was already used for a different request",
+            )
+        if record.status_code is not None:
+            raise IdempotentReplay(record.status_code, record.response_body)
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed",
+            )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
@@ -0,0 +1,300 @@
+"""
+Bulk inventory sync for merchants (POST /merchant/food-items/inventory/import).
+
+The body is CSV (a header row with sku, new_total and optionally change_type,
+reason) or NDJSON objects with the same fields. Each line sets the total
+quantity of the store's item with that SKU. Valid lines are applied in one
+transaction:
+
+- the SKUs are resolved to item ids first, INVENTORY_IMPORT_BATCH_SIZE SKUs per
+  `SELECT ... WHERE store_id = :store AND sku IN (...)`, without locking;
+- the matched items are then locked in ascending id order,
+  INVENTORY_IMPORT_BATCH_SIZE ids per `SELECT ... WHERE id IN (...) ORDER BY id
+  FOR UPDATE`, which also reads their previous totals. Reservations lock items
+  in id order too, so an import and a checkout cannot deadlock each other;
+- per locked batch, on PostgreSQL one `UPDATE fooditem ... FROM (VALUES (id, new_total), ...)`
+  sets them all; other databases run the same UPDATE as an executemany;
+- the InventoryLog rows go out as one multi-row INSERT.
+
+The UPDATE recomputes available quantity from the row's current reserved and
+surplus quantities, as update-inventory does, so concurrent reservations are
+kept. Lines that leave the total as it is are reported as unchanged and not
+logged. When a SKU appears more than once the last line wins.
+"""
+import codecs
+import csv
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import Integer, Uuid, bindparam, case, column, insert, select, update, values
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import FoodItem, InventoryLog
+from app.schemas.food_item import InventoryImportLine, InventoryImportReport, InventoryImportRowResult
+from app.services.food_item_cache import food_item_cache
+
+CSV = "csv"
+NDJSON = "ndjson"
+_MEDIA_TYPES = {
+    "text/csv": CSV,
+    "application/csv": CSV,
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+    "application/x-jsonlines": NDJSON,
+}
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
+AMBIGUOUS = "ambiguous"
+SUPERSEDED = "superseded"
+INVALID = "invalid"
+
+# (line number, parsed line or None, error or None)
+ParsedLine = Tuple[int, Optional[InventoryImportLine], Optional[str]]
+
+
+class InventoryImportError(ValueError):
+    """The body cannot be imported at all (e.g. a CSV without the required columns)."""
+
+
+class InventoryImportTooLarge(InventoryImportError):
+    """The body has more than INVENTORY_IMPORT_MAX_LINES lines."""
+
+
+def import_format(content_type: Optional[str]) -> Optional[str]:
+    """CSV or NDJSON for a Content-Type header, None if it is neither."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return _MEDIA_TYPES.get(media_type)
+
+
+def _check_line_count(lines: List[str], max_lines: int) -> None:
+    if len(lines) > max_lines:
+        raise InventoryImportTooLarge(
+            f"Imports are limited to {settings.INVENTORY_IMPORT_MAX_LINES} lines; split the file"
+        )
+
+
+async def read_lines(chunks: AsyncIterable[bytes]) -> List[str]:
+    """
+    Decode a streamed body into lines (line endings kept, for the CSV reader),
+    stopping as soon as it goes past INVENTORY_IMPORT_MAX_LINES data lines.
+    """
+    max_lines = settings.INVENTORY_IMPORT_MAX_LINES + 1  # CSV header
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    lines: List[str] = []
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            parts = pending.splitlines(keepends=True)
+            pending = parts.pop() if parts and not parts[-1].endswith(("\n", "\r")) else ""
+            lines.extend(parts)
+            _check_line_count(lines, max_lines)
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise InventoryImportError(f"The body is not valid UTF-8: {e}") from e
+    if pending:
+        lines.append(pending)
+        _check_line_count(lines, max_lines)
+    return lines
+
+
+def _validate(line_number: int, data) -> ParsedLine:
+    if not isinstance(data, dict):
+        return line_number, None, "Expected a JSON object"
+    # Empty CSV cells mean "use the default"
+    data = {key: value.strip() if isinstance(value, str) else value for key, value in data.items()}
+    if any(isinstance(value, str) and "\x00" in value for value in data.values()):
+        return line_number, None, "NUL characters are not allowed"
+    data = {key: value for key, value in data.items() if value not in ("", None)}
+    try:
+        return line_number, InventoryImportLine.model_validate(data), None
+    except ValidationError as e:
+        return line_number, None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+
+
+def parse_lines(fmt: str, lines: List[str]) -> List[ParsedLine]:
+    """Validate every line. Blank lines are skipped; line numbers count from 1 as in the file."""
+    parsed: List[ParsedLine] = []
+    if fmt == CSV:
+        for line_number, line in enumerate(lines, start=1):
+            # The csv module accepts NUL bytes since Python 3.11; PostgreSQL text does not
+            if "\x00" in line:
+                raise InventoryImportError(f"Invalid CSV on line {line_number}: NUL byte")
+        reader = csv.DictReader(lines)
+        try:
+            if reader.fieldnames is None:
+                return parsed
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            missing = {"sku", "new_total"} - set(reader.fieldnames)
+            if missing:
+                raise InventoryImportError(f"The CSV header is missing the column(s): {', '.join(sorted(missing))}")
+            wanted = set(InventoryImportLine.model_fields)
+            for row in reader:
+                parsed.append(_validate(reader.line_num, {key: row[key] for key in wanted if key in row}))
+        except csv.Error as e:
+            # NUL bytes, fields over the csv module's size limit, ...
+            raise InventoryImportError(f"Invalid CSV on line {reader.line_num}: {e}") from e
+        return parsed
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            parsed.append((line_number, None, f"Invalid JSON: {e.msg}"))
+            continue
+        parsed.append(_validate(line_number, data))
+    return parsed
+
+
+def _available(new_total):
+    table = FoodItem.__table__
+    remaining = new_total - table.c.reserved_quantity - table.c.surplus_quantity
+    return case((remaining > 0, remaining), else_=0)
+
+
+def _set_totals(session: Session, changes: List[dict], now: datetime) -> None:
+    """Set total_quantity (and available_quantity) for [{"item_id", "new_total"}] in one statement."""
+    table = FoodItem.__table__
+    if session.get_bind().dialect.name == "postgresql":
+        requested = values(
+            column("id", Uuid), column("new_total", Integer), name="inventory_import"
+        ).data([(change["item_id"], change["new_total"]) for change in changes])
+        session.execute(
+            update(table)
+            .where(table.c.id == requested.c.id)
+            .values(
+                total_quantity=requested.c.new_total,
+                available_quantity=_available(requested.c.new_total),
+                last_inventory_update=now,
+                updated_at=now,
+            )
+        )
+        return
+    new_total = bindparam("new_total", type_=Integer)
+    session.execute(
+        update(table)
+        .where(table.c.id == bindparam("item_id", type_=Uuid))
+        .values(
+            total_quantity=new_total,
+            available_quantity=_available(new_total),
+            last_inventory_update=now,
+            updated_at=now,
+        ),
+        changes,
+    )
+
+
+def apply_inventory_import(session: Session, store_id: uuid.UUID, lines: List[ParsedLine]) -> InventoryImportReport:
+    """Apply parsed lines to the store's items in the session's transaction (the caller commits)."""
+    results: Dict[int, InventoryImportRowResult] = {}
+    latest: Dict[str, Tuple[int, InventoryImportLine]] = {}
+    for line_number, line, error in lines:
+        if line is None:
+            results[line_number] = InventoryImportRowResult(line=line_number, status=INVALID, error=error)
+            continue
+        if line.sku in latest:
+            earlier = latest[line.sku][0]
+            results[earlier] = InventoryImportRowResult(
+                line=earlier, sku=line.sku, status=SUPERSEDED, error=f"Superseded by line {line_number}"
+            )
+        latest[line.sku] = (line_number, line)
+
+    table = FoodItem.__table__
+    now = datetime.now()
+    batch_size = settings.INVENTORY_IMPORT_BATCH_SIZE
+
+    # Resolve every SKU before locking anything
+    matched: Dict[str, List[uuid.UUID]] = {}
+    skus = sorted(latest)
+    for start in range(0, len(skus), batch_size):
+        for item_id, sku in session.execute(
+            select(table.c.id, table.c.sku)
+            .where(table.c.store_id == store_id, table.c.sku.in_(skus[start:start + batch_size]))
+        ):
+            matched.setdefault(sku, []).append(item_id)
+
+    sku_of: Dict[uuid.UUID, str] = {}
+    for sku in skus:
+        line_number, line = latest[sku]
+        items = matched.get(sku, [])
+        if not items:
+            results[line_number] = InventoryImportRowResult(
+                line=line_number, sku=sku, status=NOT_FOUND, error="No food item with this SKU in your store"
+            )
+        elif len(items) > 1:
+            results[line_number] = InventoryImportRowResult(
+                line=line_number, sku=sku, status=AMBIGUOUS, error=f"The SKU matches {len(items)} food items"
+            )
+        else:
+            sku_of[items[0]] = sku
+
+    # Lock in one ascending id order across batches, as reservations do
+    item_ids = sorted(sku_of)
+    for start in range(0, len(item_ids), batch_size):
+        batch = item_ids[start:start + batch_size]
+        previous_totals = {
+            item_id: total
+            for item_id, sku, total in session.execute(
+                select(table.c.id, table.c.sku, table.c.total_quantity)
+                .where(table.c.id.in_(batch), table.c.store_id == store_id)
+                .order_by(table.c.id)
+                .with_for_update()
+            )
+            # Deleted or given another SKU since it was resolved
+            if sku == sku_of[item_id]
+        }
+
+        changes: List[dict] = []
+        logs: List[dict] = []
+        for item_id in batch:
+            sku = sku_of[item_id]
+            line_number, line = latest[sku]
+            result = InventoryImportRowResult(line=line_number, sku=sku, status=UPDATED)
+            if item_id not in previous_totals:
+                result.status, result.error = NOT_FOUND, "No food item with this SKU in your store"
+            else:
+                previous = previous_totals[item_id]
+                result.previous_quantity, result.new_quantity = previous, line.new_total
+                if previous == line.new_total:
+                    result.status = UNCHANGED
+                else:
+                    changes.append({"item_id": item_id, "new_total": line.new_total})
+                    logs.append({
+                        "id": uuid.uuid4(),
+                        "food_item_id": item_id,
+                        "change_type": line.change_type,
+                        "quantity_change": line.new_total - previous,
+                        "previous_quantity": previous,
+                        "new_quantity": line.new_total,
+                        "reason": line.reason,
+                        "created_at": now,
+                    })
+            results[line_number] = result
+
+        if changes:
+            _set_totals(session, changes, now)
+            session.execute(insert(InventoryLog), logs)
+
+    ordered = [results[line_number] for line_number in sorted(results)]
+    updated = sum(1 for result in ordered if result.status == UPDATED)
+    if updated:
+        food_item_cache.invalidate(session, store_id)
+    unchanged = sum(1 for result in ordered if result.status == UNCHANGED)
+    return InventoryImportReport(
+        total=len(ordered),
+        updated=updated,
+        unchanged=unchanged,
+        failed=len(ordered) - updated - unchanged,
+        results=ordered,
+    )
@@ -1,22 +1,52 @@
+import asyncio
+import re
 import httpx
 from app.core.config import settings
+from app.services.cache import LRUCache, RedisCacheTier, TieredCache
+from app.services.http_client import http_clients
 from typing import List, Tuple, Dict, Optional
 
-async def get_travel_info_from_mapbox(
-    origin: Tuple[float, float], # (lng, lat)
-    destinations: List[Tuple[float, float]], # Danh sách (lng, lat)
-    profile: str = "mapbox/driving-traffic" # driving, walking, cycling
-) -> List[Dict[str, float]] | None:
-    """
-   USE MAPBOX MATRIX API to get travel duration and distance from origin to multiple destinations.
-    """
-    if not destinations:
-        return []
+# Cache dùng chung cho Matrix, Directions và Geocoding.
+# Tọa độ được làm tròn trước khi tạo key để người dùng đứng gần nhau dùng chung kết quả.
+mapbox_cache = TieredCache(
+    LRUCache(max_entries=settings.MAPBOX_CACHE_MAX_ENTRIES),
+    RedisCacheTier(prefix="mapbox") if settings.MAPBOX_CACHE_REDIS_ENABLED else None,
+)
+
+# Pool kết nối dùng chung cho mọi request tới Mapbox (mở trong main.lifespan)
+mapbox_client = http_clients.register("mapbox", "https://api.mapbox.com")
+
+
+def _quantise(coordinate: Tuple[float, float]) -> str:
+    """Round a (lng, lat) pair to the cache precision and format it as a key part."""
+    decimals = settings.MAPBOX_CACHE_COORD_DECIMALS
+    lon, lat = coordinate
+    return f"{lon:.{decimals}f},{lat:.{decimals}f}"
+
+
+def get_mapbox_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss counters per Mapbox endpoint."""
+    return mapbox_cache.stats()
+
 
+def _matrix_chunk_size(profile: str) -> int:
+    """Destinations per Matrix request: the coordinate limit minus the origin."""
+    if profile.endswith("driving-traffic"):
+        return settings.MAPBOX_MATRIX_TRAFFIC_MAX_COORDINATES - 1
+    return settings.MAPBOX_MATRIX_MAX_COORDINATES - 1
+
+
+async def _fetch_matrix_chunk(
+    origin: Tuple[float, float],
+    destinations: List[Tuple[float, float]],
+    profile: str,
+    semaphore: asyncio.Semaphore
+) -> List[Dict[str, float]] | None:
+    """One Matrix API request for at most one chunk of destinations. Returns None on failure."""
     # Định dạng tọa độ: lon,lat;lon,lat;...
     coords_str = f"{origin[0]},{origin[1]};" + ";".join([f"{lon},{lat}" for lon, lat in destinations])
 
-    request_url = f"https://api.mapbox.com/directions-matrix/v1/{profile}/{coords_str}"
+    request_url = f"/directions-matrix/v1/{profile}/{coords_str}"
     params = {
         "sources": "0", # Điểm xuất phát là index 0
         "destinations": ";".join([str(i+1) for i in range(len(destinations))]), # Các điểm đến
@@ -24,63 +54,132 @@ async def get_travel_info_from_mapbox(
         "access_token": settings.MAPBOX_ACCESS_TOKEN
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(request_url, params=params, timeout=10.0)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("code") == "Ok":
-                # Trả về một danh sách các dict {'duration': seconds, 'distance': meters}
-                results = []
-                for i in range(len(destinations)):
-                    results.append({
-                        "duration": data["durations"][0][i],
-                        "distance": data["distances"][0][i]
-                    })
-                return results
-            return None
-        except Exception as e:
-            print(f"Error calling Mapbox Matrix API: {e}")
-            return None
+    try:
+        async with semaphore:
+            response = await mapbox_client.get(request_url, params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get("code") == "Ok":
+            # Trả về một danh sách các dict {'duration': seconds, 'distance': meters}
+            return [
+                {
+                    "duration": data["durations"][0][i],
+                    "distance": data["distances"][0][i]
+                }
+                for i in range(len(destinations))
+            ]
+        return None
+    except Exception as e:
+        print(f"Error calling Mapbox Matrix API: {e}")
+        return None
+
+
+async def get_travel_info_from_mapbox(
+    origin: Tuple[float, float], # (lng, lat)
+    destinations: List[Tuple[float, float]], # Danh sách (lng, lat)
+    profile: str = "mapbox/driving-traffic", # driving, walking, cycling
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> List[Optional[Dict[str, float]]] | None:
+    """
+   USE MAPBOX MATRIX API to get travel duration and distance from origin to multiple destinations.
+   Each (origin, destination, profile) pair is cached, so only the uncached destinations are requested.
+   Uncached destinations are split into chunks within the Matrix coordinate limit and requested
+   concurrently (bounded by `semaphore`). Results keep the input order; entries of a failed chunk
+   are None, and None is returned only when nothing could be resolved.
+    """
+    if not destinations:
+        return []
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.MAPBOX_MATRIX_CONCURRENCY)
+
+    origin_key = _quantise(origin)
+    results: List[Optional[Dict[str, float]]] = [None] * len(destinations)
+    missing: Dict[str, List[int]] = {}  # cache key -> vị trí trong danh sách destinations
+
+    for i, destination in enumerate(destinations):
+        key = f"{profile}:{origin_key}:{_quantise(destination)}"
+        if key in missing:
+            missing[key].append(i)
+            continue
+        hit, value = await mapbox_cache.get("matrix", key)
+        if hit:
+            results[i] = value
+        else:
+            missing[key] = [i]
+
+    if not missing:
+        return results
+
+    fetch_keys = list(missing.keys())
+    chunk_size = _matrix_chunk_size(profile)
+    key_chunks = [fetch_keys[i:i + chunk_size] for i in range(0, len(fetch_keys), chunk_size)]
+
+    chunk_results = await asyncio.gather(*[
+        _fetch_matrix_chunk(origin, [destinations[missing[key][0]] for key in chunk], profile, semaphore)
+        for chunk in key_chunks
+    ])
+
+    for chunk, chunk_info in zip(key_chunks, chunk_results):
+        if chunk_info is None:
+            continue
+        for key, info in zip(chunk, chunk_info):
+            await mapbox_cache.set("matrix", key, info, settings.MAPBOX_MATRIX_CACHE_TTL)
+            for position in missing[key]:
+                results[position] = info
+
+    if all(info is None for info in results):
+        return None
+    return results
 
 
 async def get_travel_info_multi_profile(
     origin: Tuple[float, float], # (lng, lat)
     destinations: List[Tuple[float, float]] # Danh sách (lng, lat)
-) -> Dict[str, List[Dict[str, float]]] | None:
+) -> Dict[str, List[Optional[Dict[str, float]]]] | None:
     """
     Get travel information for multiple profiles (driving and walking).
     Returns a dict with profile names as keys and travel info lists as values.
+    Both profiles share one semaphore, so all their chunks run concurrently under a single bound.
     """
     if not destinations:
         return {"driving": [], "walking": []}
 
-    results = {}
     profiles = ["mapbox/driving-traffic", "mapbox/walking"]
     profile_names = ["driving", "walking"]
+    semaphore = asyncio.Semaphore(settings.MAPBOX_MATRIX_CONCURRENCY)
 
-    for profile, profile_name in zip(profiles, profile_names):
-        travel_info = await get_travel_info_from_mapbox(origin, destinations, profile)
-        results[profile_name] = travel_info if travel_info is not None else []
+    travel_infos = await asyncio.gather(*[
+        get_travel_info_from_mapbox(origin, destinations, profile, semaphore)
+        for profile in profiles
+    ])
+
+    return {
+        profile_name: travel_info if travel_info is not None else []
+        for profile_name, travel_info in zip(profile_names, travel_infos)
+    }
 
-    return results
-        
 
 async def get_route_from_mapbox(start_lon: float, start_lat: float, end_lon: float, end_lat: float):
     """
     USE MAPBOX DIRECTIONS API to get route info from start to end point.
     """
-    
+
     # Định dạng tọa độ theo yêu cầu của Mapbox: {lon},{lat}
     coordinates = f"{start_lon},{start_lat};{end_lon},{end_lat}"
-    
+
     # Profile tìm đường: driving-traffic, driving, walking, cycling
     profile = "driving-traffic" # <-- driving-traffic để có dữ liệu giao thông thời gian thực
 
+    cache_key = f"{profile}:{_quantise((start_lon, start_lat))}:{_quantise((end_lon, end_lat))}"
+    hit, cached_route = await mapbox_cache.get("directions", cache_key)
+    if hit:
+        return cached_route
+
     # Xây dựng URL request
     request_url = (
-        f"https://api.mapbox.com/directions/v5/mapbox/{profile}/{coordinates}"
+        f"/directions/v5/mapbox/{profile}/{coordinates}"
     )
 
     params = {
@@ -90,66 +189,75 @@ async def get_route_from_mapbox(start_lon: float, start_lat: float, end_lon: flo
         "access_token": settings.MAPBOX_ACCESS_TOKEN
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(request_url, params=params, timeout=10.0)
-            response.raise_for_status() # Ném lỗi nếu status code là 4xx hoặc 5xx
-            
-            data = response.json()
-            if data.get("code") == "Ok" and data.get("routes"):
-                route = data["routes"][0]
-                return {
-                    "distance_meters": route.get("distance"),
-                    "duration_seconds": route.get("duration"),
-                    "polyline": route.get("geometry") # polyline đã được mã hóa
-                }
-            else:
-                print(f"Fail from Mapbox API: {data.get('message')}")
-                return None
-        except httpx.HTTPStatusError as e:
-            print(f"Fail HTTP khi gọi Mapbox: {e.response.text}")
-            return None
-        except Exception as e:
-            print(f"Undefined error when calling Mapbox: {e}")
+    try:
+        response = await mapbox_client.get(request_url, params=params)
+        response.raise_for_status() # Ném lỗi nếu status code là 4xx hoặc 5xx
+
+        data = response.json()
+        if data.get("code") == "Ok" and data.get("routes"):
+            route = data["routes"][0]
+            route_info = {
+                "distance_meters": route.get("distance"),
+                "duration_seconds": route.get("duration"),
+                "polyline": route.get("geometry") # polyline đã được mã hóa
+            }
+            await mapbox_cache.set("directions", cache_key, route_info, settings.MAPBOX_DIRECTIONS_CACHE_TTL)
+            return route_info
+        else:
+            print(f"Fail from Mapbox API: {data.get('message')}")
             return None
+    except httpx.HTTPStatusError as e:
+        print(f"Fail HTTP khi gọi Mapbox: {e.response.text}")
+        return None
+    except Exception as e:
+        print(f"Undefined error when calling Mapbox: {e}")
+        return None
 
 
 async def geocode_address(address: str) -> Optional[Dict[str, float]]:
     """
     USE MAPBOX GEOCODING API to convert address string to (lng, lat).
+    Addresses that return no result are cached too (with a shorter TTL).
     """
+    cache_key = re.sub(r"\s+", " ", address.strip().lower())
+    hit, cached_location = await mapbox_cache.get("geocode", cache_key)
+    if hit:
+        return cached_location
+
     # Xây dựng URL. Mapbox yêu cầu địa chỉ phải được URL-encoded.
     # httpx sẽ tự động làm việc này khi truyền qua `params`.
-    request_url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{address}.json"
-    
+    request_url = f"/geocoding/v5/mapbox.places/{address}.json"
+
     params = {
         "access_token": settings.MAPBOX_ACCESS_TOKEN,
         "limit": 1 # Chỉ lấy kết quả phù hợp nhất
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(request_url, params=params, timeout=10.0)
-            response.raise_for_status() # Ném lỗi nếu status code là 4xx hoặc 5xx
-            
-            data = response.json()
-            
-            # Kiểm tra xem có kết quả không
-            if data.get("features"):
-                first_result = data["features"][0]
-                coordinates = first_result.get("geometry", {}).get("coordinates")
-                
-                if coordinates and len(coordinates) == 2:
-                    # Mapbox trả về [longitude, latitude]
-                    lng, lat = coordinates
-                    return {"lng": lng, "lat": lat}
-            
-            # Trả về None nếu không tìm thấy
-            return None
-            
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error from request Mapbox Geocoding: {e.response.text}")
-            return None
-        except Exception as e:
-            print(f"undefined error: {e}")
-            return None
\ No newline at end of file
+    try:
+        response = await mapbox_client.get(request_url, params=params)
+        response.raise_for_status() # Ném lỗi nếu status code là 4xx hoặc 5xx
+
+        data = response.json()
+
+        # Kiểm tra xem có kết quả không
+        if data.get("features"):
+            first_result = data["features"][0]
+            coordinates = first_result.get("geometry", {}).get("coordinates")
+
+            if coordinates and len(coordinates) == 2:
+                # Mapbox trả về [longitude, latitude]
+                lng, lat = coordinates
+                location = {"lng": lng, "lat": lat}
+                await mapbox_cache.set("geocode", cache_key, location, settings.MAPBOX_GEOCODE_CACHE_TTL)
+                return location
+
+        # Trả về None nếu không tìm thấy (negative cache để không gọi lại liên tục)
+        await mapbox_cache.set("geocode", cache_key, None, settings.MAPBOX_GEOCODE_NEGATIVE_CACHE_TTL)
+        return None
+
+    except httpx.HTTPStatusError as e:
+        print(f"HTTP error from request Mapbox Geocoding: {e.response.text}")
+        return None
+    except Exception as e:
+        print(f"undefined error: {e}")
+        return None
@@ -0,0 +1,165 @@
+"""
+Broadcast notifications to every user.
+
+A broadcast is either:
+
+- virtual (NOTIFICATION_BROADCAST_VIRTUAL): a single Notification row with
+  is_broadcast set and no Noti_User rows. crud.get_user_notifications merges it
+  into each inbox at read time; reading it materialises one Noti_User row for
+  that user only. Sending costs one INSERT whatever the number of users.
+- materialised: a NotificationBroadcastJob that fans the notification out with
+  `INSERT INTO noti_user ... SELECT ... FROM "user"` over chunks of user ids, so
+  the rows never leave the database. Every chunk commits its inserts together
+  with the job's progress (last_user_id, processed_recipients), which makes the
+  job resumable after a crash or a failure, and the job row is locked per chunk,
+  so two runners of the same job share the work instead of duplicating it.
+
+Jobs run on background threads; unfinished jobs are picked up again on startup.
+"""
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import exists, insert, literal, update
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import BroadcastJobStatus, Noti_User, Notification, NotificationBroadcastJob, NotificationInbox, User
+from app.services.realtime import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATUSES = (BroadcastJobStatus.PENDING, BroadcastJobStatus.RUNNING)
+
+
+def deliver_broadcast_chunk(session: Session, job: NotificationBroadcastJob, chunk_size: int) -> bool:
+    """
+    Insert Noti_User rows for the next `chunk_size` users after job.last_user_id and
+    advance the job. The caller commits. Returns True once the last chunk is done.
+    """
+    notification = session.get(Notification, job.notification_id)
+    filters = []
+    if job.last_user_id is not None:
+        filters.append(User.id > job.last_user_id)
+
+    # Upper bound of this chunk; None when fewer than chunk_size users are left
+    boundary = session.exec(
+        select(User.id).where(*filters).order_by(User.id).offset(chunk_size - 1).limit(1)
+    ).first()
+    if boundary is not None:
+        filters.append(User.id <= boundary)
+
+    # Users who already have the row (e.g. signed up meanwhile, see crud.add_noti_to_new_user)
+    def delivered_to(user_id):
+        return exists().where(
+            Noti_User.notification_id == notification.id,
+            Noti_User.user_id == user_id,
+        )
+
+    # Bump the unread counters of the same users before inserting their rows
+    counter_filters = [NotificationInbox.user_id > job.last_user_id] if job.last_user_id is not None else []
+    if boundary is not None:
+        counter_filters.append(NotificationInbox.user_id <= boundary)
+    session.execute(
+        update(NotificationInbox)
+        .where(*counter_filters, ~delivered_to(NotificationInbox.user_id))
+        .values(unread_count=NotificationInbox.unread_count + 1)
+    )
+    result = session.execute(
+        insert(Noti_User).from_select(
+            ["notification_id", "user_id", "is_read", "created_at"],
+            select(
+                literal(notification.id),
+                User.id,
+                literal(False),
+                literal(notification.created_at),
+            ).where(*filters, ~delivered_to(User.id)),
+        )
+    )
+
+    job.processed_recipients += max(result.rowcount, 0)
+    job.last_user_id = boundary if boundary is not None else job.last_user_id
+    if boundary is None:
+        job.status = BroadcastJobStatus.COMPLETED
+        job.finished_at = datetime.now()
+    else:
+        job.status = BroadcastJobStatus.RUNNING
+    session.add(job)
+    return boundary is None
+
+
+def run_broadcast_job(session: Session, job_id: uuid.UUID, chunk_size: Optional[int] = None) -> Optional[NotificationBroadcastJob]:
+    """Deliver the remaining chunks of a job, committing after each one."""
+    chunk_size = chunk_size or settings.NOTIFICATION_BROADCAST_CHUNK_SIZE
+    while True:
+        job = session.exec(
+            select(NotificationBroadcastJob)
+            .where(NotificationBroadcastJob.id == job_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ).first()
+        if job is None or job.status not in UNFINISHED_STATUSES:
+            session.commit()
+            return job
+        try:
+            done = deliver_broadcast_chunk(session, job, chunk_size)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Broadcast job {job_id} failed: {e}")
+            job = session.get(NotificationBroadcastJob, job_id)
+            job.status = BroadcastJobStatus.FAILED
+            job.error = str(e)[:500]
+            session.add(job)
+            session.commit()
+            return job
+        if done:
+            logger.info(f"Broadcast job {job_id} delivered {job.processed_recipients} notifications")
+            notification = session.get(Notification, job.notification_id)
+            realtime_hub.publish(None, "notification", {
+                "id": notification.id, "title": notification.title, "message": notification.message,
+                "is_read": False, "created_at": notification.created_at
+            })
+            return job
+
+
+class NotificationBroadcaster:
+    """Runs broadcast jobs on background threads."""
+
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, job_id: uuid.UUID, session_factory=None) -> threading.Thread:
+        session_factory = session_factory or _default_session
+
+        def run():
+            with session_factory() as session:
+                run_broadcast_job(session, job_id)
+
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        thread = threading.Thread(target=run, name=f"broadcast-{job_id}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def resume_unfinished(self, session_factory=None) -> int:
+        """Restart jobs that were pending or running when the process stopped."""
+        session_factory = session_factory or _default_session
+        with session_factory() as session:
+            job_ids = session.exec(
+                select(NotificationBroadcastJob.id).where(NotificationBroadcastJob.status.in_(UNFINISHED_STATUSES))
+            ).all()
+        for job_id in job_ids:
+            self.submit(job_id, session_factory)
+        return len(job_ids)
+
+
+def _default_session() -> Session:
+    # Imported here, as in hot_inventory: app.core.db imports crud and the models at import time
+    from app.core.db import engine
+    return Session(engine)
+
+
+notification_broadcaster = NotificationBroadcaster()
@@ -0,0 +1,55 @@
+"""
+Unread counters for notification inboxes (NotificationInbox).
+
+Every path that writes Noti_User rows adjusts the counters in the same
+transaction with relative updates, so the badge count is a primary-key read:
+
+- crud.create_notification, the outbox worker and add_noti_to_new_user call
+  `add_unread` for the recipients they inserted;
+- broadcast jobs bump the counters of a whole chunk of users with one UPDATE;
+- marking read decrements (clamped at zero), marking everything read locks the
+  counter row first and resets it.
+
+Every user has a counter row: crud.create_user creates it together with the user
+(add_noti_to_new_user) and the add_notification_inbox migration backfilled the
+users that existed before. The counter is never rebuilt from a count of Noti_User,
+which would race with notifications delivered between the count and the insert.
+"""
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, List
+
+from sqlalchemy import case, update
+from sqlmodel import Session, select
+
+from app.models import NotificationInbox
+
+
+def add_unread(session: Session, user_ids: Iterable[uuid.UUID]) -> None:
+    """Count one new unread notification per occurrence of a user id."""
+    by_amount: Dict[int, List[uuid.UUID]] = {}
+    for user_id, amount in Counter(user_ids).items():
+        by_amount.setdefault(amount, []).append(user_id)
+    for amount, ids in by_amount.items():
+        session.execute(
+            update(NotificationInbox)
+            .where(NotificationInbox.user_id.in_(ids))
+            .values(unread_count=NotificationInbox.unread_count + amount)
+        )
+
+
+def remove_unread(session: Session, user_id: uuid.UUID, amount: int = 1) -> None:
+    unread = NotificationInbox.unread_count
+    session.execute(
+        update(NotificationInbox)
+        .where(NotificationInbox.user_id == user_id)
+        .values(unread_count=case((unread >= amount, unread - amount), else_=0))
+    )
+
+
+def unread_count(session: Session, user_id: uuid.UUID, for_update: bool = False) -> int:
+    """Unread Noti_User rows of a user; for_update also locks the counter row."""
+    statement = select(NotificationInbox.unread_count).where(NotificationInbox.user_id == user_id)
+    if for_update:
+        statement = statement.with_for_update()
+    return session.exec(statement).first() or 0
@@ -0,0 +1,168 @@
+"""
+Notification outbox.
+
+Order paths do not write notifications themselves. They add a NotificationOutbox
+row with `enqueue_notification`, which is committed (or rolled back) together with
+the order change, so checkout does one extra INSERT in its existing transaction.
+
+A background worker claims outbox rows in batches (`FOR UPDATE SKIP LOCKED`, so
+several API processes can run it side by side) and turns each batch into one
+multi-row Notification insert and one multi-row Noti_User insert, deleting the
+outbox rows in the same transaction. The outbox id is reused as the Notification
+id, so a batch is delivered exactly once. Connected recipients are pushed the
+notification (app/services/realtime.py) once its batch is committed.
+"""
+import logging
+import threading
+import uuid
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import Noti_User, Notification, NotificationOutbox
+from app.schemas.notification import NotificationCreate
+from app.services.notification_inbox import add_unread
+from app.services.realtime import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_notification(
+    session: Session, notification_create: NotificationCreate, user_ids: Iterable[uuid.UUID]
+) -> NotificationOutbox:
+    """Queue a notification in the caller's transaction; nothing is committed here."""
+    entry = NotificationOutbox(
+        title=notification_create.title,
+        message=notification_create.message,
+        is_important=notification_create.is_important,
+        recipient_ids=[str(user_id) for user_id in dict.fromkeys(user_ids)],
+    )
+    session.add(entry)
+    return entry
+
+
+def _write_notifications(session: Session, entries: List[NotificationOutbox]) -> None:
+    session.execute(insert(Notification), [
+        {
+            "id": entry.id,
+            "title": entry.title,
+            "message": entry.message,
+            "is_important": entry.is_important,
+            "created_at": entry.created_at,
+            "updated_at": entry.created_at,
+        }
+        for entry in entries
+    ])
+    recipients = [
+        {"notification_id": entry.id, "user_id": uuid.UUID(user_id), "created_at": entry.created_at}
+        for entry in entries
+        for user_id in entry.recipient_ids
+    ]
+    if recipients:
+        session.execute(insert(Noti_User), recipients)
+        add_unread(session, [row["user_id"] for row in recipients])
+
+
+def deliver_outbox_batch(session: Session, limit: Optional[int] = None) -> int:
+    """
+    Deliver up to `limit` of the oldest outbox entries and commit. Returns how many
+    entries were taken off the outbox (0 when it is empty).
+    """
+    limit = limit or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    entries = session.exec(
+        select(NotificationOutbox)
+        .order_by(NotificationOutbox.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not entries:
+        session.commit()
+        return 0
+
+    entry_ids = [entry.id for entry in entries]
+    dropped = set()
+    try:
+        with session.begin_nested():
+            _write_notifications(session, entries)
+    except IntegrityError as e:
+        # One bad entry (e.g. a recipient deleted meanwhile) must not block the rest
+        logger.warning(f"Notification batch failed, delivering entries one by one: {e}")
+        for entry in entries:
+            try:
+                with session.begin_nested():
+                    _write_notifications(session, [entry])
+            except IntegrityError as entry_error:
+                logger.error(f"Dropping notification outbox entry {entry.id}: {entry_error}")
+                dropped.add(entry.id)
+
+    events = [
+        (entry.recipient_ids, {
+            "id": entry.id, "title": entry.title, "message": entry.message,
+            "is_read": False, "created_at": entry.created_at
+        })
+        for entry in entries
+        if entry.id not in dropped
+    ]
+    session.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(entry_ids)))
+    session.commit()
+    for recipient_ids, event in events:
+        realtime_hub.publish(recipient_ids, "notification", event)
+    return len(entries)
+
+
+class NotificationOutboxWorker:
+    """Background thread that drains the notification outbox."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush(self, session_factory=None) -> int:
+        """Deliver everything currently in the outbox."""
+        session_factory = session_factory or _default_session
+        delivered = 0
+        with session_factory() as session:
+            while True:
+                count = deliver_outbox_batch(session)
+                delivered += count
+                if count < settings.NOTIFICATION_OUTBOX_BATCH_SIZE:
+                    break
+        return delivered
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.NOTIFICATION_OUTBOX_POLL_SECONDS):
+            try:
+                self.flush()
+            except Exception as e:
+                # Entries stay in the outbox and are retried on the next tick
+                logger.error(f"Notification outbox flush failed: {e}")
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Notification outbox final flush failed: {e}")
+
+
+def _default_session() -> Session:
+    # Imported here: app.core.db imports crud, which uses this module
+    from app.core.db import engine
+    return Session(engine)
+
+
+notification_outbox = NotificationOutboxWorker()
@@ -0,0 +1,230 @@
+"""
+Real-time push to connected clients (WebSocket and SSE, see endpoints/realtime.py).
+
+crud publishes an event after it commits: order status changes, new notifications
+and chat messages. `RealtimeHub.publish` takes the event to every API process:
+
+- with REALTIME_REDIS_ENABLED it goes to one Redis pub/sub channel, and a listener
+  thread in each process hands it to that process's connections;
+- otherwise (a single process) it is handed to the local connections directly.
+  Redis errors on publish degrade to local delivery.
+
+Connections live in a per-process `ConnectionRegistry` keyed by user id. Each one
+has a bounded send queue, so a client that stops reading holds neither memory nor
+the publisher: when its queue is full, the unsent events are dropped and replaced
+by a single `resync` event, and the client refetches over REST. Connections that
+have nothing to send get a heartbeat every REALTIME_HEARTBEAT_SECONDS, which keeps
+proxies from closing them and detects dead peers.
+
+Events are at-most-once; REST stays the source of truth.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import redis
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "realtime:events"
+HEARTBEAT_EVENT = {"type": "ping"}
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Connection:
+    """One WebSocket or SSE client. Only touched from the event loop it was opened on."""
+
+    def __init__(self, user_id: uuid.UUID, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: dict) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop what it has not read yet and ask it to resync
+            while not self._queue.empty():
+                self._queue.get_nowait()
+                self.dropped += 1
+            self._queue.put_nowait(RESYNC_EVENT)
+
+    async def next_event(self, timeout: float) -> dict:
+        """The next queued event, or a heartbeat when nothing arrives within `timeout`."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return HEARTBEAT_EVENT
+
+
+def _offer_all(connections: List[Connection], event: dict) -> None:
+    for connection in connections:
+        connection.offer(event)
+
+
+class ConnectionRegistry:
+    """Connections of this process by user id. `dispatch` is safe to call from any thread."""
+
+    def __init__(self):
+        self._connections: Dict[uuid.UUID, Set[Connection]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count >= settings.REALTIME_MAX_CONNECTIONS
+
+    def connect(self, user_id: uuid.UUID) -> Optional[Connection]:
+        """Register a connection on the running loop; None when the process is full."""
+        connection = Connection(user_id, asyncio.get_running_loop(), settings.REALTIME_SEND_QUEUE_SIZE)
+        with self._lock:
+            if self.full:
+                return None
+            self._connections.setdefault(user_id, set()).add(connection)
+            self._count += 1
+        return connection
+
+    def disconnect(self, connection: Connection) -> None:
+        with self._lock:
+            connections = self._connections.get(connection.user_id)
+            if not connections or connection not in connections:
+                return
+            connections.discard(connection)
+            self._count -= 1
+            if not connections:
+                del self._connections[connection.user_id]
+
+    def dispatch(self, user_ids: Optional[Iterable[uuid.UUID]], event: dict) -> int:
+        """Queue an event for the connections of `user_ids` (everyone when None). Returns how many."""
+        with self._lock:
+            if user_ids is None:
+                targets = [c for connections in self._connections.values() for c in connections]
+            else:
+                targets = [c for user_id in user_ids for c in self._connections.get(user_id, ())]
+        # One callback per event loop rather than one per connection
+        by_loop: Dict[asyncio.AbstractEventLoop, List[Connection]] = {}
+        for connection in targets:
+            by_loop.setdefault(connection.loop, []).append(connection)
+        for loop, connections in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_offer_all, connections, event)
+            except RuntimeError:
+                # The loop is closed; its connections are going away with it
+                pass
+        return len(targets)
+
+
+class RealtimeHub:
+    """Publishes events to the connection registries of all API processes."""
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self.registry = ConnectionRegistry()
+        self._client = client
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.REALTIME_ENABLED
+
+    @property
+    def redis_enabled(self) -> bool:
+        return settings.REALTIME_REDIS_ENABLED
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                # Longer than the listener's poll timeout
+                socket_timeout=5.0,
+                socket_connect_timeout=0.5,
+            )
+        return self._client
+
+    def publish(self, user_ids: Optional[Iterable[uuid.UUID]], event_type: str, data: Any) -> None:
+        """
+        Push an event to the users' connections on every process (to everyone connected
+        when `user_ids` is None). Call it after the commit; it never raises.
+        """
+        if not self.enabled:
+            return
+        try:
+            event = {"type": event_type, "data": jsonable_encoder(data)}
+            if user_ids is not None:
+                user_ids = list(dict.fromkeys(uuid.UUID(str(user_id)) for user_id in user_ids))
+                if not user_ids:
+                    return
+            if self.redis_enabled:
+                try:
+                    self.client.publish(CHANNEL, json.dumps({
+                        "user_ids": None if user_ids is None else [str(user_id) for user_id in user_ids],
+                        "event": event,
+                    }))
+                    return
+                except redis.RedisError as e:
+                    logger.warning(f"Realtime publish through Redis failed, delivering locally only: {e}")
+            self.registry.dispatch(user_ids, event)
+        except Exception as e:
+            logger.error(f"Realtime publish of {event_type} failed: {e}")
+
+    def _deliver(self, payload: str) -> None:
+        envelope = json.loads(payload)
+        user_ids = envelope["user_ids"]
+        self.registry.dispatch(
+            None if user_ids is None else [uuid.UUID(user_id) for user_id in user_ids],
+            envelope["event"],
+        )
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        self._deliver(message["data"])
+            except redis.RedisError as e:
+                # Events published meanwhile are lost; clients resync over REST
+                logger.error(f"Realtime subscription failed, reconnecting: {e}")
+                self._stop.wait(1.0)
+            except Exception as e:
+                logger.error(f"Realtime event could not be delivered: {e}")
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+    def start(self) -> None:
+        if not (self.enabled and self.redis_enabled) or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="realtime-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+realtime_hub = RealtimeHub()
@@ -0,0 +1,225 @@
+"""
+Atomic stock reservation for orders and bookings.
+
+Stock is taken with a conditional `UPDATE ... SET qty = qty - :n WHERE id = :id
+AND qty >= :n RETURNING ...`, so the check and the decrement happen in one row
+operation and concurrent checkouts of the same bag cannot oversell. On PostgreSQL
+all lines of an order go out as a single statement: per table, one
+`IN (...) ORDER BY id FOR UPDATE` select locks the referenced rows in a fixed
+order and a data-modifying CTE joined against a VALUES list decrements them.
+Other databases run one conditional UPDATE per line, in the same order. If any
+line comes up short the whole reservation is rolled back.
+"""
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, Uuid, case, column, literal, select, update, values
+from sqlmodel import Session
+
+from app.models import FoodItem, SurpriseBag
+from app.services.food_item_cache import food_item_cache
+from app.services.hot_inventory import HotInventoryShortage, hot_inventory
+
+SURPRISE_BAG = "surprise_bag"
+FOOD_ITEM = "food_item"
+
+# kind -> (table, stock column, price column)
+_STOCK_TABLES = {
+    SURPRISE_BAG: (SurpriseBag.__table__, "quantity_available", "discounted_price"),
+    FOOD_ITEM: (FoodItem.__table__, "available_quantity", "standard_price"),
+}
+_LABELS = {SURPRISE_BAG: "SurpriseBag", FOOD_ITEM: "Food item"}
+
+StockKey = Tuple[str, uuid.UUID]
+
+
+class InsufficientStockError(ValueError):
+    """A line of a reservation could not be filled; nothing was reserved."""
+
+    def __init__(self, message: str, key: StockKey, available: Optional[int]):
+        super().__init__(message)
+        self.key = key
+        self.available = available  # None when the product does not exist
+
+
+def stock_lines(items: Iterable) -> Dict[StockKey, int]:
+    """
+    Quantities per (kind, id) for order lines with surprise_bag_id / food_item_id / quantity.
+    Repeated lines for the same product are summed so they are reserved together.
+    """
+    lines: Dict[StockKey, int] = {}
+    for item in items:
+        if getattr(item, "surprise_bag_id", None):
+            key = (SURPRISE_BAG, item.surprise_bag_id)
+        elif getattr(item, "food_item_id", None):
+            key = (FOOD_ITEM, item.food_item_id)
+        else:
+            raise ValueError("Either surprise_bag_id or food_item_id must be provided")
+        if item.quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        lines[key] = lines.get(key, 0) + item.quantity
+    return lines
+
+
+def _reserve_statement(kind: str, item_id, qty):
+    """Conditional decrement for one product, or for every row of a VALUES list when given its columns."""
+    table, stock_column, price_column = _STOCK_TABLES[kind]
+    stock = table.c[stock_column]
+    new_values = {stock_column: stock - qty}
+    if kind == FOOD_ITEM:
+        new_values["reserved_quantity"] = table.c.reserved_quantity + qty
+    return (
+        update(table)
+        .where(table.c.id == item_id, stock >= qty)
+        .values(new_values)
+        .returning(
+            literal(kind).label("kind"),
+            table.c.id,
+            table.c.name,
+            table.c[price_column].label("price"),
+            table.c.store_id,
+        )
+    )
+
+
+def _reserve_batch(kind: str, quantities: Dict[uuid.UUID, int]):
+    """
+    Data-modifying CTE for all lines of one table. The rows are first locked with one
+    `IN (...) ORDER BY id FOR UPDATE` select, so concurrent carts that share products
+    always lock them in the same order and cannot deadlock each other.
+    """
+    table = _STOCK_TABLES[kind][0]
+    locked = (
+        select(table.c.id)
+        .where(table.c.id.in_(sorted(quantities)))
+        .order_by(table.c.id)
+        .with_for_update()
+        .cte(f"{kind}_locked")
+    )
+    requested = values(
+        column("id", Uuid), column("qty", Integer), name=f"{kind}_request"
+    ).data(sorted(quantities.items()))
+    statement = _reserve_statement(kind, requested.c.id, requested.c.qty).where(table.c.id == locked.c.id)
+    return statement.cte(f"{kind}_reserved")
+
+
+def _shortage_error(
+    session: Session, key: StockKey, requested: int, available: Optional[int] = None
+) -> InsufficientStockError:
+    """Explain why a line could not be reserved (only runs on the failure path)."""
+    kind, item_id = key
+    table, stock_column, _ = _STOCK_TABLES[kind]
+    row = session.execute(
+        select(table.c.name, table.c[stock_column]).where(table.c.id == item_id)
+    ).first()
+    if row is None:
+        return InsufficientStockError(f"{_LABELS[kind]} with id {item_id} not found.", key, None)
+    if available is None:
+        available = row[1]
+    return InsufficientStockError(
+        f"Not enough stock for {row[0]}. Available: {available}, Requested: {requested}", key, available
+    )
+
+
+def reserve_stock(session: Session, lines: Dict[StockKey, int]) -> Dict[StockKey, dict]:
+    """
+    Take `lines` ({(kind, id): quantity}, see stock_lines) out of stock in the session's
+    transaction. Returns {(kind, id): {"name", "price", "store_id", "held"}} for every
+    line, or raises InsufficientStockError (a ValueError) after rolling the reservation
+    back. Bags loaded in the hot inventory tier are held there first, since Redis is
+    ahead of the bag rows while booked quantities wait for the write-behind worker;
+    "held" is the quantity taken there. Once the transaction commits, call settle_held;
+    if it fails after this returns, give the holds back with release_held.
+    """
+    if not lines:
+        return {}
+
+    try:
+        held = hot_inventory.hold({item_id: qty for (kind, item_id), qty in lines.items() if kind == SURPRISE_BAG})
+    except HotInventoryShortage as e:
+        key = (SURPRISE_BAG, e.bag_id)
+        raise _shortage_error(session, key, lines[key], e.available) from e
+    try:
+        reserved = _reserve_in_database(session, lines)
+    except Exception:
+        hot_inventory.release(held, from_hold=True)
+        raise
+    for (kind, item_id), product in reserved.items():
+        product["held"] = held.get(item_id, 0) if kind == SURPRISE_BAG else 0
+    return reserved
+
+
+def _held(reserved: Dict[StockKey, dict]) -> Dict[uuid.UUID, int]:
+    return {item_id: product["held"] for (kind, item_id), product in reserved.items() if product.get("held")}
+
+
+def release_held(reserved: Dict[StockKey, dict]) -> None:
+    """Give back the hot inventory holds of a reservation whose transaction did not commit."""
+    hot_inventory.release(_held(reserved), from_hold=True)
+
+
+def settle_held(reserved: Dict[StockKey, dict]) -> None:
+    """Forget the hot inventory holds of a reservation whose transaction committed."""
+    hot_inventory.settle(_held(reserved))
+
+
+def _reserve_in_database(session: Session, lines: Dict[StockKey, int]) -> Dict[StockKey, dict]:
+    # Bags before food items and ids in ascending order: a fixed lock order across carts
+    by_kind: Dict[str, Dict[uuid.UUID, int]] = {}
+    for (kind, item_id), qty in sorted(lines.items(), key=lambda line: (line[0][0] != SURPRISE_BAG, line[0][1])):
+        by_kind.setdefault(kind, {})[item_id] = qty
+
+    reserved: Dict[StockKey, dict] = {}
+    shortage: Optional[InsufficientStockError] = None
+    savepoint = session.begin_nested()
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            ctes = [_reserve_batch(kind, quantities) for kind, quantities in by_kind.items()]
+            statement = select(ctes[0])
+            for cte in ctes[1:]:
+                statement = statement.union_all(select(cte))
+            rows = session.execute(statement).all()
+        else:
+            rows = []
+            for kind, quantities in by_kind.items():
+                for item_id, qty in quantities.items():
+                    row = session.execute(_reserve_statement(kind, item_id, qty)).first()
+                    if row is not None:
+                        rows.append(row)
+
+        for row in rows:
+            reserved[(row.kind, row.id)] = {"name": row.name, "price": row.price, "store_id": row.store_id}
+        # Food item stock is part of the merchant listing
+        food_item_cache.invalidate(session, *{row.store_id for row in rows if row.kind == FOOD_ITEM})
+
+        missing = [key for key in lines if key not in reserved]
+        if missing:
+            savepoint.rollback()
+            shortage = _shortage_error(session, missing[0], lines[missing[0]])
+        else:
+            savepoint.commit()
+    except Exception:
+        if savepoint.is_active:
+            savepoint.rollback()
+        raise
+
+    if shortage is not None:
+        raise shortage
+    return reserved
+
+
+def release_stock(session: Session, lines: Dict[StockKey, int]) -> None:
+    """Put reserved quantities back, as relative updates so concurrent reservations are not lost."""
+    hot_inventory.release({item_id: qty for (kind, item_id), qty in lines.items() if kind == SURPRISE_BAG})
+    for (kind, item_id), qty in lines.items():
+        table, stock_column, _ = _STOCK_TABLES[kind]
+        new_values = {stock_column: table.c[stock_column] + qty}
+        if kind == FOOD_ITEM:
+            reserved = table.c.reserved_quantity
+            new_values["reserved_quantity"] = case((reserved >= qty, reserved - qty), else_=0)
+            store_id = session.execute(
+                update(table).where(table.c.id == item_id).values(new_values).returning(table.c.store_id)
+            ).scalar()
+            food_item_cache.invalidate(session, store_id)
+        else:
+            session.execute(update(table).where(table.c.id == item_id).values(new_values))
@@ -0,0 +1,171 @@
+"""
+In-memory inverted index over food items.
+
+Fallback for food search on databases without PostgreSQL full-text search
+(the SQLite test runs). Text is unaccented the same way as the `unaccent`
+extension does it, so "banh mi" matches "Bánh mì". Field weights follow the
+setweight() labels of the PostgreSQL search_vector: name A, description B,
+ingredients C.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+import uuid
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+FIELD_WEIGHTS = {"name": 1.0, "description": 0.4, "ingredients": 0.2}
+SNIPPET_MAX_WORDS = 25
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lower-case and strip Vietnamese diacritics ("Bánh mì Đà Nẵng" -> "banh mi da nang")."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn").lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def highlight(text: Optional[str], tokens: Iterable[str], max_words: int = SNIPPET_MAX_WORDS) -> str:
+    """Wrap words matching any token in <mark>, trimmed to a window around the first match."""
+    words = (text or "").split()
+    wanted = set(tokens)
+    marked = []
+    first_match = None
+    for i, word in enumerate(words):
+        word_tokens = tokenize(word)
+        if word_tokens and any(token in wanted for token in word_tokens):
+            marked.append(f"<mark>{word}</mark>")
+            if first_match is None:
+                first_match = i
+        else:
+            marked.append(word)
+    start = max(0, (first_match or 0) - max_words // 3)
+    return " ".join(marked[start:start + max_words])
+
+
+class FoodSearchIndex:
+    """Thread-safe inverted index of food item text keyed by item id."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: Dict[uuid.UUID, dict] = {}
+        self._postings: Dict[str, Dict[uuid.UUID, float]] = {}
+        self._vocabulary: List[str] = []
+        self._fingerprint: Optional[Hashable] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def is_current(self, fingerprint: Hashable) -> bool:
+        """True if the index was loaded from a table in the state described by `fingerprint`."""
+        return self._fingerprint is not None and self._fingerprint == fingerprint
+
+    def load(self, items: Iterable[dict], fingerprint: Hashable = None) -> None:
+        """Replace the index with the given rows (id, name, description, ingredients, is_available)."""
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            for item in items:
+                doc = dict(item)
+                doc["search_text"] = normalize_text(
+                    " ".join(filter(None, (item.get(field) for field in FIELD_WEIGHTS)))
+                )
+                self._docs[item["id"]] = doc
+                for field, weight in FIELD_WEIGHTS.items():
+                    for token in tokenize(item.get(field)):
+                        postings = self._postings.setdefault(token, {})
+                        postings[item["id"]] = postings.get(item["id"], 0.0) + weight
+            self._vocabulary = sorted(self._postings)
+            self._fingerprint = fingerprint
+
+    def clear(self) -> None:
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            self._vocabulary = []
+            self._fingerprint = None
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "￿")
+        return self._vocabulary[start:end]
+
+    def search(self, query: str, available_only: bool = True) -> List[Tuple[dict, float, str]]:
+        """
+        Items matching every query token, or containing the whole unaccented query as a
+        substring, as (item row, rank, snippet) sorted by rank then id, both descending.
+        """
+        tokens = tokenize(query)
+        phrase = normalize_text(query).strip()
+        if not tokens and not phrase:
+            return []
+
+        with self._lock:
+            total = max(len(self._docs), 1)
+            scores: Dict[uuid.UUID, float] = {}
+            matched: Optional[Set[uuid.UUID]] = None
+            for token in tokens:
+                postings = self._postings.get(token, {})
+                idf = math.log(1 + total / (1 + len(postings)))
+                for item_id, weight in postings.items():
+                    scores[item_id] = scores.get(item_id, 0.0) + weight * idf
+                matched = set(postings) if matched is None else matched & set(postings)
+            matched = matched or set()
+            if phrase:
+                for item_id, doc in self._docs.items():
+                    if phrase in doc["search_text"]:
+                        matched.add(item_id)
+                        # Same role as word_similarity() in the PostgreSQL ranking
+                        scores[item_id] = scores.get(item_id, 0.0) + 1.0
+
+            results = []
+            for item_id in matched:
+                doc = self._docs[item_id]
+                if available_only and not doc.get("is_available", True):
+                    continue
+                snippet_source = " ".join(filter(None, (doc.get("name"), doc.get("description"))))
+                results.append((dict(doc), scores.get(item_id, 0.0), highlight(snippet_source, tokens)))
+
+        results.sort(key=lambda result: (result[1], str(result[0]["id"])), reverse=True)
+        return results
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Distinct item names whose words start with every token of `prefix`, best matches first."""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+
+        with self._lock:
+            candidates: Optional[Dict[uuid.UUID, float]] = None
+            for token in tokens:
+                token_scores: Dict[uuid.UUID, float] = {}
+                for word in self._prefix_tokens(token):
+                    for item_id, weight in self._postings[word].items():
+                        token_scores[item_id] = max(token_scores.get(item_id, 0.0), weight)
+                if candidates is None:
+                    candidates = token_scores
+                else:
+                    candidates = {
+                        item_id: score + token_scores[item_id]
+                        for item_id, score in candidates.items() if item_id in token_scores
+                    }
+
+            best: Dict[str, float] = {}
+            for item_id, score in (candidates or {}).items():
+                doc = self._docs[item_id]
+                if not doc.get("is_available", True):
+                    continue
+                best[doc["name"]] = max(best.get(doc["name"], 0.0), score)
+
+        return [name for name, _ in sorted(best.items(), key=lambda entry: (-entry[1], entry[0]))[:limit]]
+
+
+food_search_index = FoodSearchIndex()
@@ -0,0 +1,157 @@
+"""
+In-process spatial index over store coordinates.
+
+Stores are bucketed into a fixed lat/lon grid. A radius query only visits the
+cells that overlap the search circle and computes haversine distances for the
+candidates in one NumPy pass. Used as the non-PostGIS path for nearby-store
+lookups and, when enabled, as a hot cache in front of PostGIS.
+"""
+import math
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(
+    latitude: float,
+    longitude: float,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray
+) -> np.ndarray:
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - np.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class StoreGridIndex:
+    """Thread-safe grid index of store rows keyed by store id."""
+
+    def __init__(self, cell_size_deg: float = 0.05):
+        self.cell_size_deg = cell_size_deg
+        self._lock = threading.RLock()
+        self._stores: Dict[uuid.UUID, dict] = {}
+        self._cells: Dict[Tuple[int, int], Set[uuid.UUID]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (
+            math.floor(latitude / self.cell_size_deg),
+            math.floor(longitude / self.cell_size_deg),
+        )
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        """True if the index was never fully loaded or the last load is older than max_age_seconds."""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > max_age_seconds
+
+    def load(self, stores: Iterable[dict]) -> None:
+        """Replace the whole index with the given store rows."""
+        with self._lock:
+            self._stores.clear()
+            self._cells.clear()
+            for store in stores:
+                self._insert(store)
+            self._loaded_at = time.monotonic()
+
+    def mark_fresh(self) -> None:
+        """Reset the staleness clock without reloading, e.g. when the source cannot be read."""
+        self._loaded_at = time.monotonic()
+
+    def upsert(self, store: dict) -> None:
+        """Insert or replace one store. Rows without coordinates are removed from the index."""
+        with self._lock:
+            self._discard(store["id"])
+            self._insert(store)
+
+    def remove(self, store_id: uuid.UUID) -> None:
+        with self._lock:
+            self._discard(store_id)
+
+    def get(self, store_id: uuid.UUID) -> Optional[dict]:
+        with self._lock:
+            store = self._stores.get(store_id)
+            return dict(store) if store else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stores.clear()
+            self._cells.clear()
+            self._loaded_at = None
+
+    def _insert(self, store: dict) -> None:
+        if store.get("latitude") is None or store.get("longitude") is None:
+            return
+        self._stores[store["id"]] = dict(store)
+        self._cells.setdefault(self._cell(store["latitude"], store["longitude"]), set()).add(store["id"])
+
+    def _discard(self, store_id: uuid.UUID) -> None:
+        store = self._stores.pop(store_id, None)
+        if store is None:
+            return
+        cell = self._cell(store["latitude"], store["longitude"])
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(store_id)
+            if not members:
+                del self._cells[cell]
+
+    def _candidate_ids(self, latitude: float, longitude: float, radius_km: float) -> List[uuid.UUID]:
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_span, 89.9))), 1e-6)
+        lon_span = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+
+        min_row, min_col = self._cell(latitude - lat_span, longitude - lon_span)
+        max_row, max_col = self._cell(latitude + lat_span, longitude + lon_span)
+
+        # Walk whichever is smaller: the covering cell rectangle or the occupied cells
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            return [
+                store_id
+                for (row, col), members in self._cells.items()
+                if min_row <= row <= max_row and min_col <= col <= max_col
+                for store_id in members
+            ]
+        candidates = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                candidates.extend(self._cells.get((row, col), ()))
+        return candidates
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Tuple[dict, float]]:
+        """Stores within radius_km as (store row, distance_km), nearest first."""
+        with self._lock:
+            candidate_ids = self._candidate_ids(latitude, longitude, radius_km)
+            if not candidate_ids:
+                return []
+            rows = [self._stores[store_id] for store_id in candidate_ids]
+
+        latitudes = np.fromiter((row["latitude"] for row in rows), dtype=np.float64, count=len(rows))
+        longitudes = np.fromiter((row["longitude"] for row in rows), dtype=np.float64, count=len(rows))
+        distances = haversine_km(latitude, longitude, latitudes, longitudes)
+
+        within = np.flatnonzero(distances <= radius_km)
+        # Sort by distance, then id, to match the (distance, id) order of the PostGIS path
+        order = sorted(within, key=lambda i: (distances[i], str(rows[i]["id"])))
+        return [(dict(rows[i]), float(distances[i])) for i in order[skip:skip + limit]]
+
+
+store_index = StoreGridIndex()
@@ -0,0 +1,385 @@
+"""
+Surplus-expiry engine.
+
+Every SURPLUS_EXPIRY_INTERVAL_SECONDS a background worker looks for active items
+expiring within SURPLUS_EXPIRY_WINDOW_HOURS (a range scan on the partial
+ix_fooditem_expires_at index) and, store by store:
+
+- marks their unreserved stock as surplus, with SURPLUS_EXPIRY_DISCOUNT off
+  unless the merchant already set a surplus discount;
+- packs the surplus into auto-generated surprise bags. Each bag is a bounded
+  knapsack (`pack_bag`): as much value as fits in SURPLUS_BAG_MAX_WEIGHT_GRAMS,
+  with items closer to expiry weighted up (SurpriseBagItem.weight_in_selection).
+  A bag is offered as many times as its contents allow, and the packed units
+  move from the items' surplus and total quantities to the bag's stock.
+
+Stores are handled SURPLUS_EXPIRY_STORE_BATCH_SIZE at a time, each batch in its
+own transaction: one `SELECT ... FOR UPDATE SKIP LOCKED` of the batch's items (so
+several API processes can run the engine side by side, and rows held by a
+checkout are picked up on the next run), one UPDATE for all of them (UPDATE ...
+FROM VALUES on PostgreSQL, an executemany elsewhere) and multi-row INSERTs for
+the bags, bag items and InventoryLog rows. A failed batch is rolled back and
+logged; the run carries on with the next one.
+"""
+import logging
+import math
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Uuid, bindparam, column, insert, or_, select, update, values
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import FoodItem, InventoryLog, SurpriseBag, SurpriseBagItem
+from app.services.food_item_cache import food_item_cache
+from app.services.hot_inventory import hot_inventory
+
+logger = logging.getLogger(__name__)
+
+# FoodItem columns the engine writes, after the id
+_ITEM_FIELDS = {
+    "total_quantity": Integer,
+    "available_quantity": Integer,
+    "surplus_quantity": Integer,
+    "surplus_discount_percentage": Float,
+    "surplus_price": Float,
+    "is_marked_for_surplus": Boolean,
+    "marked_surplus_at": DateTime,
+}
+
+
+@dataclass
+class BagCandidate:
+    """A food item's surplus, as seen by the bag packer."""
+    food_item_id: uuid.UUID
+    unit_value: float  # Standard price
+    unit_weight: float  # Grams
+    units: int  # Surplus units not packed yet
+    priority: float  # 1 (end of the window) to 2 (expiring now)
+    expires_at: datetime
+
+
+@dataclass
+class SurplusExpiryStats:
+    stores: int = 0
+    items_marked: int = 0
+    units_marked: int = 0
+    bags_created: int = 0  # Distinct bags; each may be offered several times
+    units_bagged: int = 0
+    failed_batches: int = 0
+    bag_ids: List[uuid.UUID] = field(default_factory=list)
+
+    def add(self, other: "SurplusExpiryStats") -> None:
+        self.stores += other.stores
+        self.items_marked += other.items_marked
+        self.units_marked += other.units_marked
+        self.bags_created += other.bags_created
+        self.units_bagged += other.units_bagged
+        self.failed_batches += other.failed_batches
+        self.bag_ids.extend(other.bag_ids)
+
+
+def pack_bag(candidates: Sequence[BagCandidate], max_weight: float, step: float) -> Dict[uuid.UUID, int]:
+    """
+    Units of each candidate to put in one bag: the bounded knapsack maximising
+    sum(units * unit_value * priority) for a total weight of at most `max_weight`.
+    Weights are rounded up to multiples of `step` grams, which sizes the table.
+    """
+    capacity = int(max_weight // step)
+    # Bounded to 0/1: each candidate's units are split into lots of 1, 2, 4, ... units
+    lots: List[Tuple[int, int, int, float]] = []  # (candidate index, units, cells, score)
+    for index, candidate in enumerate(candidates):
+        cells = max(1, math.ceil(candidate.unit_weight / step))
+        units = min(candidate.units, capacity // cells)
+        size = 1
+        while units > 0:
+            take = min(size, units)
+            lots.append((index, take, take * cells, take * candidate.unit_value * candidate.priority))
+            units -= take
+            size *= 2
+
+    best = [0.0] * (capacity + 1)
+    taken: List[List[bool]] = []
+    for _, _, cells, score in lots:
+        row = [False] * (capacity + 1)
+        for used in range(capacity, cells - 1, -1):
+            if best[used - cells] + score > best[used]:
+                best[used] = best[used - cells] + score
+                row[used] = True
+        taken.append(row)
+
+    chosen: Dict[uuid.UUID, int] = {}
+    used = capacity
+    for (index, units, cells, _), row in zip(reversed(lots), reversed(taken)):
+        if row[used]:
+            food_item_id = candidates[index].food_item_id
+            chosen[food_item_id] = chosen.get(food_item_id, 0) + units
+            used -= cells
+    return chosen
+
+
+def plan_bags(candidates: List[BagCandidate]) -> List[Tuple[Dict[uuid.UUID, int], int]]:
+    """
+    Bags for one store's surplus, as (units per item, copies) pairs, taking the
+    packed units out of the candidates. Stops once the best remaining bag is worth
+    less than SURPLUS_BAG_MIN_VALUE or the store has SURPLUS_BAG_MAX_PER_STORE bags.
+    """
+    by_id = {candidate.food_item_id: candidate for candidate in candidates}
+    bags: List[Tuple[Dict[uuid.UUID, int], int]] = []
+    while len(bags) < settings.SURPLUS_BAG_MAX_PER_STORE:
+        remaining = [candidate for candidate in candidates if candidate.units > 0]
+        contents = pack_bag(remaining, settings.SURPLUS_BAG_MAX_WEIGHT_GRAMS, settings.SURPLUS_BAG_WEIGHT_STEP_GRAMS)
+        value = sum(units * by_id[food_item_id].unit_value for food_item_id, units in contents.items())
+        if not contents or value < settings.SURPLUS_BAG_MIN_VALUE:
+            break
+        copies = min(by_id[food_item_id].units // units for food_item_id, units in contents.items())
+        for food_item_id, units in contents.items():
+            by_id[food_item_id].units -= units * copies
+        bags.append((contents, copies))
+    return bags
+
+
+def _apply_item_changes(session: Session, changes: List[dict]) -> None:
+    """Write the new quantities and surplus fields of [{"id", ...}] in one statement."""
+    table = FoodItem.__table__
+    now = datetime.now()
+    if session.get_bind().dialect.name == "postgresql":
+        planned = values(
+            column("id", Uuid), *(column(name, type_) for name, type_ in _ITEM_FIELDS.items()), name="surplus_expiry"
+        ).data([(change["id"], *(change[name] for name in _ITEM_FIELDS)) for change in changes])
+        session.execute(
+            update(table)
+            .where(table.c.id == planned.c.id)
+            .values(**{name: planned.c[name] for name in _ITEM_FIELDS}, last_inventory_update=now, updated_at=now)
+        )
+        return
+    session.execute(
+        update(table)
+        .where(table.c.id == bindparam("item_id", type_=Uuid))
+        .values(
+            **{name: bindparam(f"new_{name}", type_=type_) for name, type_ in _ITEM_FIELDS.items()},
+            last_inventory_update=now,
+            updated_at=now,
+        ),
+        [{"item_id": change["id"], **{f"new_{name}": change[name] for name in _ITEM_FIELDS}} for change in changes],
+    )
+
+
+def _expiring(now: datetime):
+    """Conditions for items the engine works on (the ix_fooditem_expires_at range)."""
+    return (
+        FoodItem.is_active == True,
+        FoodItem.is_available == True,
+        FoodItem.expires_at > now,
+        FoodItem.expires_at <= now + timedelta(hours=settings.SURPLUS_EXPIRY_WINDOW_HOURS),
+        or_(FoodItem.available_quantity > 0, FoodItem.surplus_quantity > 0),
+    )
+
+
+def process_store_batch(session: Session, store_ids: Sequence[uuid.UUID], now: datetime) -> SurplusExpiryStats:
+    """Mark and bag the expiring items of some stores in the session's transaction (the caller commits)."""
+    stats = SurplusExpiryStats(stores=len(store_ids))
+    table = FoodItem.__table__
+    items = session.execute(
+        select(
+            table.c.id, table.c.store_id, table.c.standard_price, table.c.weight, table.c.expires_at,
+            table.c.total_quantity, table.c.available_quantity, table.c.surplus_quantity,
+            table.c.surplus_discount_percentage, table.c.marked_surplus_at,
+        )
+        .where(table.c.store_id.in_(store_ids), *_expiring(now))
+        .order_by(table.c.id)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not items:
+        return stats
+
+    window = settings.SURPLUS_EXPIRY_WINDOW_HOURS * 3600
+    bag_deadline = now + timedelta(minutes=settings.SURPLUS_BAG_MIN_LEAD_MINUTES)
+    changes: Dict[uuid.UUID, dict] = {}
+    logs: List[dict] = []
+    candidates: Dict[uuid.UUID, List[BagCandidate]] = {}
+    for item in items:
+        discount = item.surplus_discount_percentage
+        if discount is None:
+            discount = settings.SURPLUS_EXPIRY_DISCOUNT
+        surplus = item.surplus_quantity + item.available_quantity
+        changes[item.id] = {
+            "id": item.id,
+            "total_quantity": item.total_quantity,
+            "available_quantity": 0,
+            "surplus_quantity": surplus,
+            "surplus_discount_percentage": discount,
+            "surplus_price": round(item.standard_price * (1 - discount), 2),
+            "is_marked_for_surplus": surplus > 0,
+            "marked_surplus_at": item.marked_surplus_at or now,
+        }
+        if item.available_quantity > 0:
+            stats.items_marked += 1
+            stats.units_marked += item.available_quantity
+            logs.append({
+                "id": uuid.uuid4(),
+                "food_item_id": item.id,
+                "change_type": "surplus_marked",
+                "quantity_change": item.available_quantity,
+                "previous_quantity": item.surplus_quantity,
+                "new_quantity": surplus,
+                "reason": f"Expires at {item.expires_at:%Y-%m-%d %H:%M}; marked with {discount * 100:.1f}% discount",
+                "created_at": now,
+            })
+        if item.expires_at > bag_deadline:
+            time_left = (item.expires_at - now).total_seconds()
+            candidates.setdefault(item.store_id, []).append(BagCandidate(
+                food_item_id=item.id,
+                unit_value=item.standard_price,
+                unit_weight=item.weight or settings.SURPLUS_BAG_DEFAULT_ITEM_WEIGHT_GRAMS,
+                units=surplus,
+                priority=1 + max(0.0, min(1.0, 1 - time_left / window)),
+                expires_at=item.expires_at,
+            ))
+
+    bags: List[dict] = []
+    bag_items: List[dict] = []
+    for store_id, store_candidates in candidates.items():
+        by_id = {candidate.food_item_id: candidate for candidate in store_candidates}
+        for contents, copies in plan_bags(store_candidates):
+            bag_id = uuid.uuid4()
+            original_value = sum(units * by_id[food_item_id].unit_value for food_item_id, units in contents.items())
+            until = min(by_id[food_item_id].expires_at for food_item_id in contents)
+            bags.append({
+                "id": bag_id,
+                "name": "Túi Bất Ngờ",
+                "description": "Tự động tạo từ sản phẩm sắp hết hạn",
+                "bag_type": "combo" if len(contents) > 1 else "single_item",
+                "original_value": original_value,
+                "discounted_price": round(original_value * (1 - settings.SURPLUS_BAG_DISCOUNT), 2),
+                "discount_percentage": settings.SURPLUS_BAG_DISCOUNT,
+                "quantity_available": copies,
+                "max_per_customer": 1,
+                "available_from": now,
+                "available_until": until,
+                "pickup_start_time": now,
+                "pickup_end_time": until,
+                "is_active": True,
+                "is_auto_generated": True,
+                "created_at": now,
+                "updated_at": now,
+                "store_id": store_id,
+            })
+            for food_item_id, units in contents.items():
+                candidate, change, packed = by_id[food_item_id], changes[food_item_id], units * copies
+                bag_items.append({
+                    "id": uuid.uuid4(),
+                    "surprise_bag_id": bag_id,
+                    "food_item_id": food_item_id,
+                    "min_quantity": units,
+                    "max_quantity": units,
+                    "estimated_value_per_unit": candidate.unit_value,
+                    "weight_in_selection": round(candidate.priority, 3),
+                })
+                logs.append({
+                    "id": uuid.uuid4(),
+                    "food_item_id": food_item_id,
+                    "change_type": "surplus_bagged",
+                    "quantity_change": -packed,
+                    "previous_quantity": change["surplus_quantity"],
+                    "new_quantity": change["surplus_quantity"] - packed,
+                    "reason": f"Packed into {copies} auto-generated surprise bag(s)",
+                    "reference_id": bag_id,
+                    "created_at": now,
+                })
+                # The units now belong to the bag's stock
+                change["surplus_quantity"] -= packed
+                change["total_quantity"] -= packed
+                change["is_marked_for_surplus"] = change["surplus_quantity"] > 0
+                stats.units_bagged += packed
+    stats.bags_created = len(bags)
+    stats.bag_ids = [bag["id"] for bag in bags]
+
+    _apply_item_changes(session, list(changes.values()))
+    if bags:
+        session.execute(insert(SurpriseBag), bags)
+        session.execute(insert(SurpriseBagItem), bag_items)
+    if logs:
+        session.execute(insert(InventoryLog), logs)
+    food_item_cache.invalidate(session, *{item.store_id for item in items})
+    return stats
+
+
+def run_surplus_expiry(session: Session, now: Optional[datetime] = None) -> SurplusExpiryStats:
+    """One pass over every store with expiring items, one committed batch of stores at a time."""
+    now = now or datetime.now()
+    stats = SurplusExpiryStats()
+    store_ids = list(session.execute(
+        select(FoodItem.store_id).where(*_expiring(now)).distinct().order_by(FoodItem.store_id)
+    ).scalars())
+    session.rollback()  # Do not hold the scan's snapshot across the batches
+
+    batch_size = settings.SURPLUS_EXPIRY_STORE_BATCH_SIZE
+    for start in range(0, len(store_ids), batch_size):
+        batch = store_ids[start:start + batch_size]
+        try:
+            batch_stats = process_store_batch(session, batch, now)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            stats.failed_batches += 1
+            logger.error(f"Surplus expiry failed for {len(batch)} store(s) from {batch[0]}: {e}")
+            continue
+        stats.add(batch_stats)
+        if batch_stats.bag_ids:
+            hot_inventory.reconcile(session, batch_stats.bag_ids)
+    return stats
+
+
+class SurplusExpiryScheduler:
+    """Background thread that runs the engine every SURPLUS_EXPIRY_INTERVAL_SECONDS."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, session_factory=None) -> SurplusExpiryStats:
+        session_factory = session_factory or _default_session
+        with session_factory() as session:
+            stats = run_surplus_expiry(session)
+        if stats.items_marked or stats.bags_created or stats.failed_batches:
+            logger.info(
+                f"Surplus expiry: {stats.units_marked} unit(s) of {stats.items_marked} item(s) marked, "
+                f"{stats.bags_created} bag(s) created in {stats.stores} store(s), "
+                f"{stats.failed_batches} failed batch(es)"
+            )
+        return stats
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.SURPLUS_EXPIRY_INTERVAL_SECONDS):
+            try:
+                self.run_once()
+            except Exception as e:
+                # Nothing was half-applied: every batch commits or rolls back on its own
+                logger.error(f"Surplus expiry run failed: {e}")
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="surplus-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+def _default_session() -> Session:
+    # Imported here: app.core.db imports crud, which uses the services
+    from app.core.db import engine
+    return Session(engine)
+
+
+surplus_expiry = SurplusExpiryScheduler()
@@ -0,0 +1,55 @@
+"""
+Offline travel-time estimates.
+
+Road distance is approximated as the great-circle distance times
+TRAVEL_ROUTE_DETOUR_FACTOR, and durations use the average speeds configured for
+the city in TRAVEL_SPEED_PROFILES. Everything is computed in one NumPy pass, so
+list views can show travel info for thousands of stores without calling Mapbox.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.city import normalize_city
+from app.services.spatial_index import haversine_km
+
+TRAVEL_MODES = ("driving", "walking")
+
+
+def get_speed_profile(city: Optional[str] = None) -> Dict[str, float]:
+    """Average speeds (km/h) per travel mode for a city, falling back to the default profile."""
+    profiles = settings.TRAVEL_SPEED_PROFILES
+    city = normalize_city(city)
+    if city:
+        profile = profiles.get(city)
+        if profile:
+            return {**profiles["default"], **profile}
+    return profiles["default"]
+
+
+def estimate_travel_info(
+    origin: Tuple[float, float], # (lng, lat)
+    destinations: List[Tuple[float, float]], # Danh sách (lng, lat)
+    city: Optional[str] = None
+) -> Dict[str, List[Dict[str, float]]]:
+    """
+    Estimated travel info in the same shape as get_travel_info_multi_profile:
+    {"driving": [{"duration": seconds, "distance": meters}, ...], "walking": [...]}
+    """
+    if not destinations:
+        return {mode: [] for mode in TRAVEL_MODES}
+
+    coordinates = np.asarray(destinations, dtype=np.float64)
+    distances_m = haversine_km(origin[1], origin[0], coordinates[:, 1], coordinates[:, 0]) * 1000.0
+    distances_m *= settings.TRAVEL_ROUTE_DETOUR_FACTOR
+
+    speeds = get_speed_profile(city)
+    result = {}
+    for mode in TRAVEL_MODES:
+        durations_s = distances_m / (speeds[mode] / 3.6)
+        result[mode] = [
+            {"duration": round(duration, 1), "distance": round(distance, 1)}
+            for duration, distance in zip(durations_s.tolist(), distances_m.tolist())
+        ]
+    return result
@@ -0,0 +1,93 @@
+"""
+Load a product catalogue file into one or more stores.
+
+    python -m scripts.import_catalogue products.csv --store-id <store uuid>
+    python -m scripts.import_catalogue chain.ndjson          # rows carry store_id
+
+Columns / keys are the FoodItemCreate fields (name, sku, standard_price,
+total_quantity, ...), plus `category` (a category name or id) and optionally
+`store_id`. Run from the backend directory with the usual database settings.
+
+Progress is checkpointed after every committed chunk to <file>.checkpoint.json,
+and a rerun of the same file resumes after the last committed line
+(--restart ignores the checkpoint). Rejected rows and their reasons are
+appended to <file>.rejects.ndjson.
+"""
+import argparse
+import json
+import os
+import uuid
+
+from sqlmodel import Session
+
+from app import crud
+from app.core.db import engine
+from app.services.catalogue_import import CatalogueImportStats, import_catalogue, read_product_file
+
+
+def load_checkpoint(path: str, source: str) -> int:
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0
+    if checkpoint.get("file") != source:
+        raise SystemExit(f"{path} belongs to {checkpoint.get('file')}; use --restart or another --checkpoint")
+    return checkpoint["last_line"]
+
+
+def save_checkpoint(path: str, source: str, stats: CatalogueImportStats) -> None:
+    # Written aside and renamed, so an interrupted run never leaves a torn checkpoint
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"file": source, "last_line": stats.last_line}, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def main(args) -> None:
+    source = os.path.abspath(args.file)
+    checkpoint_path = args.checkpoint or f"{args.file}.checkpoint.json"
+    rejects_path = args.rejects or f"{args.file}.rejects.ndjson"
+    resume_after = 0 if args.restart else load_checkpoint(checkpoint_path, source)
+    if resume_after:
+        print(f"Resuming after line {resume_after}")
+
+    def on_chunk(stats: CatalogueImportStats) -> None:
+        save_checkpoint(checkpoint_path, source, stats)
+        print(
+            f"line {stats.last_line}: loaded={stats.loaded} skipped={stats.skipped} "
+            f"rejected={stats.rejected} ({stats.rows_per_second:,.0f} rows/s)"
+        )
+
+    with open(rejects_path, "a", encoding="utf-8") as rejects, Session(engine) as session:
+        def on_reject(line_number: int, data: dict, error: str) -> None:
+            rejects.write(json.dumps({"line": line_number, "error": error, "row": data}, ensure_ascii=False, default=str) + "\n")
+
+        stats = import_catalogue(
+            session,
+            read_product_file(args.file),
+            crud.get_category_tree(session),
+            store_id=args.store_id,
+            resume_after=resume_after,
+            chunk_size=args.chunk_size,
+            on_chunk=on_chunk,
+            on_reject=on_reject,
+        )
+
+    print(
+        f"Done in {stats.elapsed:.1f}s: {stats.read} rows read, {stats.loaded} loaded, "
+        f"{stats.skipped} already present, {stats.rejected} rejected "
+        f"({stats.rows_per_second:,.0f} rows/s)"
+    )
+    if stats.rejected:
+        print(f"Rejected rows: {rejects_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="Product file (.csv with a header row, or .ndjson/.jsonl)")
+    parser.add_argument("--store-id", type=uuid.UUID, help="Store for rows without a store_id")
+    parser.add_argument("--chunk-size", type=int, help="Rows per committed chunk (default CATALOGUE_IMPORT_CHUNK_SIZE)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default <file>.checkpoint.json)")
+    parser.add_argument("--rejects", help="Where rejected rows are appended (default <file>.rejects.ndjson)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first line")
+    main(parser.parse_args())
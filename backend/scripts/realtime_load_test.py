@@ -0,0 +1,144 @@
+"""
+Load test for the real-time push channel: open many idle SSE connections to
+/realtime/events, hold them, and optionally measure how fast a broadcast reaches
+all of them.
+
+    python scripts/realtime_load_test.py --token <access token> --connections 10000 --hold 300
+    python scripts/realtime_load_test.py --token <t> --admin-token <admin t> --connections 10000
+
+All connections may share one user's token (a user can have many connections).
+The server's connection limit is REALTIME_MAX_CONNECTIONS per process; run the
+API with a raised open-files limit (ulimit -n) as well.
+
+Connections use plain asyncio streams rather than an HTTP client library, so a
+single client process can hold 10k of them.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+
+class Stats:
+    def __init__(self):
+        self.open = 0
+        self.failed = 0
+        self.closed = 0
+        self.heartbeats = 0
+        self.received: list = []  # Seconds from publishing to receiving the broadcast
+        self.published_at = None
+
+
+async def hold_connection(host: str, port: int, path: str, token: str, stats: Stats, stop: asyncio.Event):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write((
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n"
+            f"Authorization: Bearer {token}\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        if b" 200 " not in status_line:
+            stats.failed += 1
+            writer.close()
+            return
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+    except OSError:
+        stats.failed += 1
+        return
+
+    stats.open += 1
+    event_type = None
+    try:
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            # Chunked transfer framing lines are not SSE fields and fall through
+            if line.startswith(b": ping"):
+                stats.heartbeats += 1
+            elif line.startswith(b"event:"):
+                event_type = line[6:].strip().decode()
+            elif line.startswith(b"data:") and event_type == "notification" and stats.published_at:
+                stats.received.append(time.monotonic() - stats.published_at)
+    except (OSError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        stats.open -= 1
+        stats.closed += 1
+        writer.close()
+
+
+async def publish_broadcast(base_url: str, admin_token: str, stats: Stats) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        stats.published_at = time.monotonic()
+        response = await client.post(
+            "/notifications/send_all",
+            json={"title": "Load test", "message": "realtime load test", "is_important": False},
+            headers={"Authorization": f"Bearer {admin_token}"},
+        )
+        response.raise_for_status()
+
+
+async def main(args) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.connections + 1024)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    path = f"{url.path.rstrip('/')}/realtime/events"
+    stats, stop = Stats(), asyncio.Event()
+
+    started = time.monotonic()
+    tasks = []
+    for i in range(args.connections):
+        tasks.append(asyncio.create_task(hold_connection(host, port, path, args.token, stats, stop)))
+        if (i + 1) % args.ramp == 0:
+            await asyncio.sleep(1)
+            print(f"{time.monotonic() - started:6.1f}s open={stats.open} failed={stats.failed}")
+
+    deadline = time.monotonic() + args.hold
+    published = False
+    while time.monotonic() < deadline:
+        await asyncio.sleep(5)
+        print(
+            f"{time.monotonic() - started:6.1f}s open={stats.open} failed={stats.failed} "
+            f"closed={stats.closed} heartbeats={stats.heartbeats} received={len(stats.received)}"
+        )
+        if args.admin_token and not published and stats.open + stats.failed + stats.closed >= args.connections:
+            await publish_broadcast(args.url, args.admin_token, stats)
+            published = True
+
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"connections: {args.connections}, failed: {stats.failed}, dropped early: {stats.closed - (args.connections - stats.failed)}")
+    if stats.received:
+        latencies = sorted(stats.received)
+        print(
+            f"broadcast delivered to {len(latencies)} connections: "
+            f"p50={statistics.median(latencies) * 1000:.0f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f}ms "
+            f"max={latencies[-1] * 1000:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--token", required=True, help="Access token used by every connection")
+    parser.add_argument("--admin-token", help="Admin token; when given, a broadcast is sent once all connections are open")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--ramp", type=int, default=500, help="Connections opened per second")
+    parser.add_argument("--hold", type=float, default=120, help="Seconds to hold the connections open")
+    asyncio.run(main(parser.parse_args()))
@@ -1,10 +1,14 @@
 """
 Test food item endpoints for WiseBite Backend.
 """
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.models import Category, FoodItem, Store, User
+from app.services.category_tree import category_tree_cache
 from tests.utils import (
     create_random_user_data,
     create_random_store_data, 
@@ -257,6 +261,35 @@ def test_search_food_items(client: TestClient):
     assert found, "Special Pizza not found in search results"
 
 
+@pytest.mark.integration
+def test_search_food_items_ignores_accents(client: TestClient):
+    """Test that unaccented queries match Vietnamese names, ranked with a highlighted snippet."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    
+    store_data = create_random_store_data()
+    store_response = vendor_client.post("/api/v1/stores/", json=store_data)
+    store_id = store_response.json()["id"]
+    
+    food_data = create_random_food_item_data(store_id)
+    food_data["name"] = "Bánh mì thịt nướng"
+    vendor_client.post("/api/v1/food-items", json=food_data)
+    
+    response = client.get("/api/v1/food-items/search?query=banh mi")
+    
+    assert_status_code(response, 200)
+    response_data = response.json()
+    assert_pagination_response(response_data)
+    
+    match = next(item for item in response_data["data"] if item["name"] == "Bánh mì thịt nướng")
+    assert match["rank"] > 0
+    assert "<mark>Bánh</mark>" in match["snippet"]
+    
+    # Autocomplete on a partial, unaccented prefix
+    response = client.get("/api/v1/food-items/autocomplete?q=banh m")
+    assert_status_code(response, 200)
+    assert "Bánh mì thịt nướng" in response.json()
+
+
 @pytest.mark.integration
 def test_filter_food_items_by_store(client: TestClient):
     """Test filtering food items by store.
@@ -341,3 +374,109 @@ def test_get_vendor_food_items(client: TestClient):
     returned_ids = [item["id"] for item in response_data["data"]]
     for created_id in created_items:
         assert created_id in returned_ids
+
+
+@pytest.mark.integration
+def test_get_vendor_food_items_cursor_pagination(client: TestClient):
+    """Test walking a vendor's food items page by page with next_cursor."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    
+    store_data = create_random_store_data()
+    store_response = vendor_client.post("/api/v1/stores/", json=store_data)
+    store_id = store_response.json()["id"]
+    
+    created_items = set()
+    for i in range(5):
+        food_data = create_random_food_item_data(store_id)
+        create_response = vendor_client.post("/api/v1/food-items", json=food_data)
+        created_items.add(create_response.json()["id"])
+    
+    # First page: offset mode still returns the total count
+    response = vendor_client.get("/api/v1/food-items/me?limit=2")
+    assert_status_code(response, 200)
+    response_data = response.json()
+    assert response_data["count"] == 5
+    assert response_data["next_cursor"]
+    
+    seen = [item["id"] for item in response_data["data"]]
+    cursor = response_data["next_cursor"]
+    while cursor:
+        response = vendor_client.get(f"/api/v1/food-items/me?limit=2&cursor={cursor}")
+        assert_status_code(response, 200)
+        response_data = response.json()
+        # The count is skipped in cursor mode unless asked for
+        assert response_data["count"] is None
+        seen.extend(item["id"] for item in response_data["data"])
+        cursor = response_data["next_cursor"]
+    
+    assert len(seen) == len(set(seen)) == 5
+    assert set(seen) == created_items
+
+
+@pytest.mark.integration
+def test_list_food_items_invalid_cursor(client: TestClient):
+    """Test that a malformed cursor is rejected."""
+    response = client.get("/api/v1/food-items?cursor=not-a-cursor")
+    assert_status_code(response, 400)
+
+
+@pytest.mark.integration
+def test_category_hierarchy_revalidates_with_etag(client: TestClient, session: Session):
+    """Test the category hierarchy is every level deep and answers 304 to a matching ETag."""
+    grocery = Category(name="Fresh Grocery")
+    session.add(grocery)
+    session.flush()
+    vegetables = Category(name="Rau Củ", parent_category_id=grocery.id)
+    session.add(vegetables)
+    session.flush()
+    session.add(Category(name="Củ", parent_category_id=vegetables.id))
+    session.commit()
+    category_tree_cache.clear()
+
+    response = client.get("/api/v1/merchant/food-items/categories/hierarchy")
+    assert_status_code(response, 200)
+    assert [root["name"] for root in response.json()] == ["Fresh Grocery"]
+    assert response.json()[0]["subcategories"][0]["subcategories"][0]["name"] == "Củ"
+
+    etag = response.headers["ETag"]
+    cached = client.get("/api/v1/merchant/food-items/categories/hierarchy", headers={"If-None-Match": etag})
+    assert_status_code(cached, 304)
+    assert cached.headers["ETag"] == etag
+    category_tree_cache.clear()
+
+
+@pytest.mark.integration
+def test_merchant_food_items_need_a_vendor_with_a_store(
+    authenticated_vendor_client: TestClient
+):
+    """Test the merchant listing asks a vendor without a store to create one first."""
+    response = authenticated_vendor_client.get("/api/v1/merchant/food-items/")
+    assert_response_error(response, 404, "Store not found")
+
+
+@pytest.mark.integration
+def test_merchant_food_items_forbidden_for_customers(authenticated_customer_client: TestClient):
+    """Test customers cannot use the merchant endpoints."""
+    response = authenticated_customer_client.get("/api/v1/merchant/food-items/")
+    assert_response_error(response, 403, "Only vendors")
+
+
+@pytest.mark.integration
+def test_merchant_food_item_of_another_store_is_forbidden(
+    authenticated_vendor_client: TestClient, session: Session, test_store: Store, test_customer: User
+):
+    """Test a vendor gets 403 for another store's item and 404 for a missing one."""
+    other_store = Store(name="Other Store", address="2 Test Street, Ho Chi Minh City", owner_id=test_customer.id)
+    session.add(other_store)
+    session.flush()
+    other_item = FoodItem(
+        name="Bánh mì", standard_price=20000, total_quantity=5, available_quantity=5, store_id=other_store.id
+    )
+    session.add(other_item)
+    session.commit()
+
+    response = authenticated_vendor_client.get(f"/api/v1/merchant/food-items/{other_item.id}/inventory-history")
+    assert_response_error(response, 403, "your own food items")
+
+    response = authenticated_vendor_client.get(f"/api/v1/merchant/food-items/{uuid.uuid4()}/inventory-history")
+    assert_response_error(response, 404, "Food item not found")
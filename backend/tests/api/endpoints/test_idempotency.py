@@ -0,0 +1,136 @@
+"""
+Test Idempotency-Key handling on the order and payment endpoints.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app import crud
+from app.models import FoodItem, IdempotencyKey, Order, User
+from app.schemas.order import OrderCreate, OrderItemCreate, OrderPublic
+from app.services.idempotency import (
+    REPLAYED_HEADER, IdempotencyContext, begin, claim_key, complete_key, request_fingerprint
+)
+from tests.utils import assert_status_code
+
+
+def order_body(food_item: FoodItem, quantity: int = 1) -> dict:
+    return {"items": [{"food_item_id": str(food_item.id), "quantity": quantity}]}
+
+
+@pytest.mark.integration
+def test_retry_replays_stored_order(
+    authenticated_customer_client: TestClient, session: Session, test_customer: User, test_food_item: FoodItem
+):
+    headers = {"Idempotency-Key": "order-1"}
+
+    first = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 2), headers=headers)
+    second = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 2), headers=headers)
+
+    assert_status_code(first, 201)
+    assert_status_code(second, 201)
+    assert second.json() == first.json()
+    assert second.headers[REPLAYED_HEADER] == "true"
+    assert REPLAYED_HEADER not in first.headers
+    assert len(session.exec(select(Order).where(Order.customer_id == test_customer.id)).all()) == 1
+    session.refresh(test_food_item)
+    assert test_food_item.available_quantity == 8
+
+
+@pytest.mark.integration
+def test_without_key_every_order_is_created(
+    authenticated_customer_client: TestClient, session: Session, test_customer: User, test_food_item: FoodItem
+):
+    for _ in range(2):
+        assert_status_code(authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item)), 201)
+
+    assert len(session.exec(select(Order).where(Order.customer_id == test_customer.id)).all()) == 2
+
+
+@pytest.mark.integration
+def test_key_reused_for_different_request_is_rejected(
+    authenticated_customer_client: TestClient, test_food_item: FoodItem
+):
+    headers = {"Idempotency-Key": "k"}
+    authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 1), headers=headers)
+
+    response = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 2), headers=headers)
+
+    assert_status_code(response, 422)
+
+
+@pytest.mark.integration
+def test_client_errors_are_replayed(authenticated_customer_client: TestClient, test_food_item: FoodItem):
+    headers = {"Idempotency-Key": "k"}
+
+    first = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 50), headers=headers)
+    second = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item, 50), headers=headers)
+
+    assert_status_code(first, 400)
+    assert_status_code(second, 400)
+    assert second.json() == first.json()
+    assert second.headers[REPLAYED_HEADER] == "true"
+
+
+@pytest.mark.integration
+def test_retry_replays_stored_payment(authenticated_customer_client: TestClient, test_food_item: FoodItem):
+    order = authenticated_customer_client.post("/api/v1/orders/", json=order_body(test_food_item)).json()
+    payment = {"order_id": order["id"], "payment_method": "credit_card", "amount": order["total_amount"]}
+    headers = {"Idempotency-Key": "payment-1"}
+
+    first = authenticated_customer_client.post("/api/v1/transactions", json=payment, headers=headers)
+    second = authenticated_customer_client.post("/api/v1/transactions", json=payment, headers=headers)
+
+    assert_status_code(first, 201)
+    assert_status_code(second, 201)
+    assert second.json() == first.json()
+    assert second.headers[REPLAYED_HEADER] == "true"
+
+
+@pytest.mark.integration
+def test_order_response_is_committed_with_the_order(
+    session: Session, test_customer: User, test_food_item: FoodItem
+):
+    request_hash = request_fingerprint("POST", "/api/v1/orders/", b"{}")
+    assert claim_key(session, test_customer.id, "k", request_hash) is None
+    context = IdempotencyContext(session, test_customer.id, "k", request_hash)
+
+    order = crud.create_order(
+        session,
+        OrderCreate(items=[OrderItemCreate(food_item_id=test_food_item.id, quantity=1)]),
+        test_customer.id,
+        before_commit=lambda order: context.stage(order, OrderPublic, 201)
+    )
+
+    # The request dies before it responds: the retry still finds the outcome
+    record = claim_key(session, test_customer.id, "k", request_hash)
+    assert record.status_code == 201
+    assert json.loads(record.response_body)["id"] == str(order.id)
+
+
+@pytest.mark.integration
+def test_request_in_progress_conflicts_after_wait(session: Session, test_customer: User):
+    assert claim_key(session, test_customer.id, "k", "hash") is None
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(begin(session, test_customer.id, "k", "hash", wait_seconds=0.1))
+
+    assert exc_info.value.status_code == 409
+
+
+@pytest.mark.integration
+def test_expired_claim_is_taken_over(session: Session, test_customer: User):
+    assert claim_key(session, test_customer.id, "k", "hash") is None
+    complete_key(session, test_customer.id, "k", "hash", 201, "{}")
+    record = session.get(IdempotencyKey, (test_customer.id, "k"))
+    record.expires_at = datetime.now() - timedelta(seconds=1)
+    session.add(record)
+    session.commit()
+
+    assert claim_key(session, test_customer.id, "k", "other-hash") is None
+    assert session.get(IdempotencyKey, (test_customer.id, "k"), populate_existing=True).request_hash == "other-hash"
@@ -0,0 +1,47 @@
+"""
+Test the merchant bulk inventory import endpoint.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.models import FoodItem, Store
+from tests.utils import assert_response_error, assert_status_code
+
+
+@pytest.mark.integration
+def test_import_inventory(authenticated_vendor_client: TestClient, session: Session, test_store: Store):
+    item = FoodItem(
+        name="Cà rốt", sku="CAR-1", standard_price=10000, store_id=test_store.id,
+        total_quantity=10, available_quantity=10
+    )
+    session.add(item)
+    session.commit()
+
+    response = authenticated_vendor_client.post(
+        "/api/v1/merchant/food-items/inventory/import",
+        content=b'{"sku": "CAR-1", "new_total": 25}\n{"sku": "NOPE", "new_total": 1}\n',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert_status_code(response, 200)
+    assert [r["status"] for r in response.json()["results"]] == ["updated", "not_found"]
+    session.refresh(item)
+    assert item.total_quantity == 25
+
+
+@pytest.mark.integration
+def test_import_inventory_rejects_bad_bodies(authenticated_vendor_client: TestClient, test_store: Store):
+    response = authenticated_vendor_client.post(
+        "/api/v1/merchant/food-items/inventory/import",
+        content=b"sku\tnew_total",
+        headers={"Content-Type": "text/plain"},
+    )
+    assert_status_code(response, 415)
+
+    response = authenticated_vendor_client.post(
+        "/api/v1/merchant/food-items/inventory/import",
+        content=b"sku,new_total\nA\x00,1\n",
+        headers={"Content-Type": "text/csv"},
+    )
+    assert_response_error(response, 400, "Invalid CSV")
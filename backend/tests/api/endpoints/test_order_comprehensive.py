@@ -5,6 +5,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.services.notification_outbox import deliver_outbox_batch
 from tests.utils import (
     create_random_user_data,
     create_random_store_data, 
@@ -350,7 +351,7 @@ def test_order_unauthorized_access(client: TestClient):
 
 
 @pytest.mark.integration
-def test_order_accepted_notification_sent_to_merchant_and_customer(client: TestClient):
+def test_order_accepted_notification_sent_to_merchant_and_customer(client: TestClient, session: Session):
     """Test that notification is sent to both merchant and customer when order is accepted."""
     vendor_client, vendor_token, vendor_id = create_authenticated_client(client, "vendor")
     customer_client, customer_token, customer_id = create_authenticated_client(client, "customer")
@@ -387,6 +388,9 @@ def test_order_accepted_notification_sent_to_merchant_and_customer(client: TestC
     response_data = response.json()
     assert response_data["status"] == "confirmed"
     
+    # Notifications are delivered from the outbox by the background worker
+    deliver_outbox_batch(session)
+    
     # Check that both vendor and customer received notifications
     vendor_notifications_after = vendor_client.get("/api/v1/users/me/notifications")
     customer_notifications_after = customer_client.get("/api/v1/users/me/notifications")
@@ -399,3 +403,80 @@ def test_order_accepted_notification_sent_to_merchant_and_customer(client: TestC
     if customer_notifications_after.status_code == 200:
         customer_notif_count_after = len(customer_notifications_after.json())
         assert customer_notif_count_after > customer_notif_count_before, "Customer should receive notification when order is accepted"
+
+
+@pytest.mark.integration
+def test_create_order_large_cart(client: TestClient):
+    """Test a 20-line grocery cart: all lines are written, and one short line rejects the whole cart."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    customer_client, _, _ = create_authenticated_client(client, "customer")
+    
+    store_data = create_random_store_data()
+    store_response = vendor_client.post("/api/v1/stores/", json=store_data)
+    store_id = store_response.json()["id"]
+    
+    food_ids = []
+    for i in range(20):
+        food_data = create_random_food_item_data(store_id)
+        food_data["standard_price"] = 10000.0
+        food_data["total_quantity"] = 3
+        food_response = vendor_client.post("/api/v1/food-items/", json=food_data)
+        food_ids.append(food_response.json()["id"])
+    
+    # One line asks for more than is in stock: nothing may be reserved
+    short_cart = {
+        "items": [{"food_item_id": food_id, "quantity": 2} for food_id in food_ids[:-1]]
+                 + [{"food_item_id": food_ids[-1], "quantity": 4}],
+        "delivery_address": "123 Test Street"
+    }
+    response = customer_client.post("/api/v1/orders/", json=short_cart)
+    assert_response_error(response, 400, "not enough stock")
+    
+    cart = {
+        "items": [{"food_item_id": food_id, "quantity": 3} for food_id in food_ids],
+        "delivery_address": "123 Test Street"
+    }
+    response = customer_client.post("/api/v1/orders/", json=cart)
+    assert_status_code(response, 201)
+    response_data = response.json()
+    assert len(response_data["items"]) == 20
+    assert response_data["total_amount"] == 20 * 3 * 10000.0
+    assert {item["food_item"]["id"] for item in response_data["items"]} == set(food_ids)
+
+
+@pytest.mark.integration
+def test_create_order_idempotency_key(client: TestClient):
+    """Test that a retried order with the same Idempotency-Key is not placed twice."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    customer_client, _, _ = create_authenticated_client(client, "customer")
+    
+    store_data = create_random_store_data()
+    store_response = vendor_client.post("/api/v1/stores/", json=store_data)
+    store_id = store_response.json()["id"]
+    
+    food_data = create_random_food_item_data(store_id)
+    food_data["total_quantity"] = 5
+    food_response = vendor_client.post("/api/v1/food-items/", json=food_data)
+    food_id = food_response.json()["id"]
+    
+    order_data = {
+        "items": [{"food_item_id": food_id, "quantity": 2}],
+        "delivery_address": "123 Test Street"
+    }
+    headers = {"Idempotency-Key": "checkout-1"}
+    first = customer_client.post("/api/v1/orders/", json=order_data, headers=headers)
+    retry = customer_client.post("/api/v1/orders/", json=order_data, headers=headers)
+    
+    assert_status_code(first, 201)
+    assert_status_code(retry, 201)
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    
+    # Stock was only taken once
+    food_response = vendor_client.get(f"/api/v1/food-items/{food_id}")
+    assert food_response.json()["available_quantity"] == 3
+    
+    # The same key cannot be reused for a different cart
+    order_data["items"][0]["quantity"] = 1
+    response = customer_client.post("/api/v1/orders/", json=order_data, headers=headers)
+    assert_status_code(response, 422)
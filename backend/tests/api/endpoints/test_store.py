@@ -1,12 +1,35 @@
 """
 Test store management endpoints for WiseBite Backend.
 """
+import uuid
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
-from tests.utils import create_random_store_data, assert_status_code, assert_response_contains_fields
-from app.models import Store
+from tests.conftest import get_cached_password_hash
+from tests.utils import create_random_store_data, assert_status_code, assert_response_contains_fields, count_queries
+from app import crud
+from app.models import Store, User, UserRole
+from app.schemas.store import StoreCreate
+
+
+def create_stores_with_location(session: Session, count: int) -> list[Store]:
+    """Create `count` vendors, each owning one store placed around Ho Chi Minh City."""
+    stores = []
+    for _ in range(count):
+        unique_id = str(uuid.uuid4())[:8]
+        vendor = User(
+            full_name="Nearby Vendor",
+            phone_number=f"0977{unique_id[:6]}",
+            email=f"nearby{unique_id}@test.com",
+            hashed_password=get_cached_password_hash(),
+            role=UserRole.VENDOR
+        )
+        session.add(vendor)
+        session.flush()
+        store_data = create_random_store_data()
+        stores.append(crud.create_store(session=session, store_create=StoreCreate(**store_data), owner_id=vendor.id))
+    return stores
 
 
 @pytest.mark.unit
@@ -108,6 +131,55 @@ def test_list_nearby_stores_basic(client: TestClient):
             assert store["distance_km"] >= 0, "Distance should be non-negative"
 
 
+@pytest.mark.integration
+def test_stores_within_radius_single_query(session: Session):
+    """A page of nearby stores, coordinates included, is fetched in one statement."""
+    create_stores_with_location(session, 5)
+
+    with count_queries(session) as statements:
+        stores = crud.get_stores_within_radius(
+            session=session, latitude=10.7769, longitude=106.7009, radius_km=10.0
+        )
+
+    assert len(stores) >= 5
+    assert len(statements) == 1, statements
+    for store in stores:
+        assert store.latitude is not None
+        assert store.longitude is not None
+        assert store.distance_km is not None
+    assert [s.distance_km for s in stores] == sorted(s.distance_km for s in stores)
+
+
+@pytest.mark.integration
+def test_nearest_stores_keyset_pagination(session: Session):
+    """KNN pages chained by (distance, id) cover the same stores as one big page, in order."""
+    create_stores_with_location(session, 5)
+    search = {"latitude": 10.7769, "longitude": 106.7009, "radius_km": 10.0}
+
+    full = crud.get_nearest_stores(session=session, limit=100, **search)
+    pages = []
+    after_distance, after_id = None, None
+    while True:
+        page = crud.get_nearest_stores(
+            session=session, limit=2, after_distance_meters=after_distance, after_id=after_id, **search
+        )
+        if not page:
+            break
+        pages.extend(page)
+        after_distance, after_id = page[-1].distance_meters, page[-1].id
+
+    assert len(full) >= 5
+    assert [s.id for s in pages] == [s.id for s in full]
+    assert [s.distance_meters for s in full] == sorted(s.distance_meters for s in full)
+
+
+@pytest.mark.integration
+def test_list_nearest_stores_requires_full_cursor(client: TestClient):
+    """after_distance_meters and after_id only make sense together."""
+    response = client.get("/api/v1/stores/nearest?latitude=10.7769&longitude=106.7009&after_distance_meters=10")
+    assert_status_code(response, 400)
+
+
 @pytest.mark.integration 
 def test_list_nearby_stores_with_radius_validation(client: TestClient):
     """Test nearby stores endpoint with invalid radius values."""
@@ -484,3 +484,42 @@ def test_get_available_surprise_bags_only(client: TestClient):
     # All returned bags should be available
     for bag in response_data["data"]:
         assert bag["quantity_available"] > 0
+
+
+@pytest.mark.integration
+def test_browse_surprise_bags_by_city_with_cursor(client: TestClient):
+    """Test the customer browse listing: normalised city filter and cursor pages in pickup order."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    
+    store_data = create_random_store_data()
+    store_data["address"] = "45 Bạch Đằng, Hải Châu, TP. Đà Nẵng"
+    store_response = vendor_client.post("/api/v1/stores/", json=store_data)
+    assert_status_code(store_response, 201)
+    assert store_response.json()["city"] == "da nang"
+    store_id = store_response.json()["id"]
+    
+    created_bags = set()
+    for i in range(3):
+        bag_data = create_random_surprise_bag_data(store_id)
+        create_response = vendor_client.post("/api/v1/surprise-bag", json=bag_data)
+        assert_status_code(create_response, 201)
+        created_bags.add(create_response.json()["id"])
+    
+    response = client.get("/api/v1/customer/surprise-bags?city=Da%20Nang&limit=2&include_count=true")
+    assert_status_code(response, 200)
+    assert len(response.json()) == 2
+    assert int(response.headers["X-Total-Count"]) >= 3
+    
+    seen = response.json()
+    cursor = response.headers.get("X-Next-Cursor")
+    while cursor:
+        response = client.get(f"/api/v1/customer/surprise-bags?city=Da%20Nang&limit=2&cursor={cursor}")
+        assert_status_code(response, 200)
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    
+    seen_ids = [bag["id"] for bag in seen]
+    assert len(seen_ids) == len(set(seen_ids))
+    assert created_bags <= set(seen_ids)
+    pickup_times = [bag["pickup_start_time"] for bag in seen]
+    assert pickup_times == sorted(pickup_times)
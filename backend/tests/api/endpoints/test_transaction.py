@@ -417,6 +417,45 @@ def test_filter_transactions_by_type(client: TestClient):
         assert transaction["transaction_type"] == "payment"
 
 
+@pytest.mark.integration
+def test_transaction_filters_apply_to_the_cursor_page(client: TestClient):
+    """transaction_type and the date range filter the keyset page and its count."""
+    vendor_client, _, _ = create_authenticated_client(client, "vendor")
+    customer_client, _, _ = create_authenticated_client(client, "customer")
+    
+    store_response = vendor_client.post("/api/v1/stores/", json=create_random_store_data())
+    food_data = create_random_food_item_data(store_response.json()["id"])
+    food_id = vendor_client.post("/api/v1/food-items/", json=food_data).json()["id"]
+    order_id = customer_client.post(
+        "/api/v1/orders/", json={"items": [{"food_item_id": food_id, "quantity": 1}], "delivery_address": "123 Test Street"}
+    ).json()["id"]
+    transaction_id = customer_client.post(
+        "/api/v1/transactions", json={"order_id": order_id, "payment_method": "credit_card", "amount": food_data["standard_price"]}
+    ).json()["id"]
+    customer_client.post(f"/api/v1/orders/{order_id}/cancel")
+    refund_response = customer_client.post(
+        "/api/v1/transactions/refund",
+        json={"transaction_id": transaction_id, "reason": "Order cancelled", "amount": food_data["standard_price"]}
+    )
+    assert_status_code(refund_response, 201)
+    
+    for transaction_type, expected_id in (("payment", transaction_id), ("refund", refund_response.json()["id"])):
+        response = customer_client.get(f"/api/v1/transactions/me?transaction_type={transaction_type}&include_count=true")
+        assert_status_code(response, 200)
+        response_data = response.json()
+        assert response_data["count"] == 1
+        assert [(t["id"], t["transaction_type"]) for t in response_data["data"]] == [(expected_id, transaction_type)]
+    
+    from datetime import datetime, timedelta
+    tomorrow = (datetime.now() + timedelta(days=1)).isoformat()
+    response = customer_client.get(f"/api/v1/transactions/me?start_date={tomorrow}&include_count=true")
+    assert_status_code(response, 200)
+    assert response.json()["count"] == 0 and response.json()["data"] == []
+    
+    response = customer_client.get("/api/v1/transactions/me?transaction_type=bogus")
+    assert_response_error(response, 400, "transaction_type")
+
+
 @pytest.mark.integration
 def test_filter_transactions_by_date_range(client: TestClient):
     """Test filtering transactions by date range."""
@@ -0,0 +1,82 @@
+"""
+Tests for the product catalogue ingestion (app/services/catalogue_import.py).
+"""
+import json
+import uuid
+
+import pytest
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.models import Category, FoodItem, InventoryLog, Store
+from app.services.catalogue_import import import_catalogue, read_product_file
+from app.services.category_tree import category_tree_cache
+
+
+@pytest.fixture
+def store_id(session: Session, test_store: Store):
+    session.add_all([Category(name="Rau Củ"), Category(name="Nước/Sữa")])
+    session.commit()
+    category_tree_cache.clear()
+    yield test_store.id
+    category_tree_cache.clear()
+
+
+def write_csv(tmp_path, rows) -> str:
+    path = tmp_path / "products.csv"
+    path.write_text("name,sku,standard_price,total_quantity,category,store_id\n" + "".join(rows), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.integration
+def test_catalogue_is_loaded_in_chunks_with_rejects(tmp_path, session, store_id):
+    path = write_csv(tmp_path, [
+        "Cải ngọt,RAU001,15000,25,rau cu,\n",
+        "Sữa tươi,SUA001,32000,30,Nước/Sữa,\n",
+        "Free lunch,X1,-5,1,,\n",
+        "Nấm,NAM001,20000,5,Nấm,\n",
+        f"Elsewhere,E1,1000,1,,{uuid.uuid4()}\n",
+        "Cải ngọt (dup),RAU001,15000,25,,\n",
+        "Nước suối,NUOC001,8000,60,,\n",
+    ])
+    rejects, chunks = [], []
+    stats = import_catalogue(
+        session, read_product_file(path), crud.get_category_tree(session), store_id=store_id, chunk_size=3,
+        on_chunk=lambda stats: chunks.append(stats.last_line),
+        on_reject=lambda line_number, data, error: rejects.append((line_number, error)),
+    )
+
+    assert (stats.read, stats.loaded, stats.skipped, stats.rejected) == (7, 3, 1, 3)
+    assert chunks == [4, 7, 8]
+    assert [line for line, _ in rejects] == [4, 5, 6]
+    assert "standard_price" in rejects[0][1] and "Unknown category" in rejects[1][1] and "not found" in rejects[2][1]
+
+    items = {item.sku: item for item in session.exec(select(FoodItem).where(FoodItem.store_id == store_id)).all()}
+    assert sorted(items) == ["NUOC001", "RAU001", "SUA001"]
+    vegetables = crud.get_category_tree(session).lookup("Rau Củ")
+    assert items["RAU001"].category_id == vegetables[0] and items["NUOC001"].category_id is None
+    assert items["RAU001"].available_quantity == 25
+    logs = session.exec(select(InventoryLog).where(InventoryLog.food_item_id == items["SUA001"].id)).all()
+    assert [(log.change_type, log.new_quantity) for log in logs] == [("initial_stock", 30)]
+
+
+@pytest.mark.integration
+def test_rerun_resumes_without_duplicates(tmp_path, session, store_id):
+    path = tmp_path / "products.ndjson"
+    path.write_text("".join(
+        json.dumps({"name": f"Item {i}", "sku": f"SKU{i}", "standard_price": 1000, "total_quantity": i}) + "\n"
+        for i in range(10)
+    ))
+
+    first = import_catalogue(session, read_product_file(str(path)), crud.get_category_tree(session), store_id=store_id, chunk_size=4)
+    assert first.loaded == 10 and first.last_line == 10
+
+    resumed = import_catalogue(
+        session, read_product_file(str(path)), crud.get_category_tree(session), store_id=store_id, resume_after=8
+    )
+    assert (resumed.read, resumed.loaded, resumed.skipped) == (2, 0, 2)
+
+    # Without a checkpoint the SKUs already in the store are skipped
+    rerun = import_catalogue(session, read_product_file(str(path)), crud.get_category_tree(session), store_id=store_id)
+    assert (rerun.loaded, rerun.skipped) == (0, 10)
+    assert session.exec(select(func.count(FoodItem.id)).where(FoodItem.store_id == store_id)).one() == 10
@@ -0,0 +1,80 @@
+"""
+Tests for the cached category tree (app/services/category_tree.py, crud.get_category_tree).
+"""
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.models import Category, FoodItem, Store
+from app.services.category_tree import category_tree_cache
+
+
+@pytest.fixture
+def categories(session: Session):
+    category_tree_cache.clear()
+    grocery = Category(name="Fresh Grocery")
+    session.add(grocery)
+    session.flush()
+    vegetables = Category(name="Rau Củ", parent_category_id=grocery.id)
+    packaged = Category(name="Packaged Goods")
+    session.add_all([vegetables, packaged])
+    session.flush()
+    roots = Category(name="Củ", parent_category_id=vegetables.id)
+    hidden = Category(name="Nấm", parent_category_id=vegetables.id, is_active=False)
+    session.add_all([roots, hidden])
+    session.commit()
+    yield {category.name: category.id for category in (grocery, vegetables, packaged, roots, hidden)}
+    category_tree_cache.clear()
+
+
+@pytest.mark.integration
+def test_tree_has_every_level_and_descendants(session, categories):
+    tree = crud.get_category_tree(session)
+
+    assert [root.name for root in tree.roots] == ["Fresh Grocery", "Packaged Goods"]
+    vegetables, = tree.roots[0].subcategories
+    assert [sub.name for sub in vegetables.subcategories] == ["Củ"]
+    assert tree.descendant_ids(categories["Fresh Grocery"]) == {
+        categories["Fresh Grocery"], categories["Rau Củ"], categories["Củ"]
+    }
+    assert tree.find("rau cu") == {categories["Rau Củ"], categories["Củ"]}
+    assert tree.find(str(categories["Packaged Goods"])) == {categories["Packaged Goods"]}
+    assert tree.find("Không có") == set()
+    assert [category.name for category in tree.active_categories()] == [
+        "Fresh Grocery", "Rau Củ", "Packaged Goods", "Củ"
+    ]
+
+
+@pytest.mark.integration
+def test_tree_is_reloaded_only_when_categories_change(monkeypatch, session, categories):
+    first = crud.get_category_tree(session)
+
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert crud.get_category_tree(session) is first
+    assert statements == []
+
+    monkeypatch.setattr(settings, "CATEGORY_TREE_REFRESH_SECONDS", 0)
+    assert crud.get_category_tree(session) is first
+    assert len(statements) == 1
+
+    session.get(Category, categories["Nấm"]).is_active = True
+    session.commit()
+    second = crud.get_category_tree(session)
+    assert second is not first and second.etag != first.etag
+    assert categories["Nấm"] in second.descendant_ids(categories["Rau Củ"])
+
+
+@pytest.mark.integration
+def test_items_filtered_by_category_include_subcategories(session, test_store: Store, categories):
+    for name, category in (("Cà rốt", "Củ"), ("Rau muống", "Rau Củ"), ("Bánh quy", "Packaged Goods")):
+        session.add(FoodItem(
+            name=name, standard_price=10000, total_quantity=1, available_quantity=1,
+            store_id=test_store.id, category_id=categories[category]
+        ))
+    session.commit()
+
+    page = crud.get_food_items_with_filters(session, category="Rau Củ")
+    assert sorted(item.name for item in page["data"]) == ["Cà rốt", "Rau muống"]
@@ -0,0 +1,73 @@
+"""
+Tests for chat storage: cursor-paged message history and the conversation list.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session
+
+from app import crud
+from app.models import Message, User
+from app.schemas.chat import ConversationCreate, MessageCreate
+
+
+@pytest.fixture
+def thread(session: Session, test_customer: User, test_vendor: User):
+    conversation = crud.create_conversation(session, ConversationCreate(member_ids=[test_vendor.id]), test_customer.id)
+    return conversation, test_customer, test_vendor
+
+
+def add_messages(session: Session, conversation_id: uuid.UUID, sender_id: uuid.UUID, count: int) -> None:
+    start = datetime.now()
+    session.add_all([
+        Message(conversation_id=conversation_id, sender_id=sender_id, content=f"m{i}", created_at=start + timedelta(seconds=i))
+        for i in range(count)
+    ])
+    session.commit()
+
+
+@pytest.mark.integration
+def test_history_pages_backwards_and_forwards(session, thread):
+    conversation, customer, _ = thread
+    add_messages(session, conversation.id, customer.id, 7)
+
+    latest = crud.get_messages_by_conversation(session, conversation.id, limit=3)
+    assert [m.content for m in latest["data"]] == ["m4", "m5", "m6"]
+
+    older = crud.get_messages_by_conversation(session, conversation.id, limit=3, before=latest["before_cursor"])
+    assert [m.content for m in older["data"]] == ["m1", "m2", "m3"]
+    oldest = crud.get_messages_by_conversation(session, conversation.id, limit=3, before=older["before_cursor"])
+    assert [m.content for m in oldest["data"]] == ["m0"]
+    assert oldest["before_cursor"] is None
+
+    newer = crud.get_messages_by_conversation(session, conversation.id, limit=3, after=older["after_cursor"])
+    assert [m.content for m in newer["data"]] == ["m4", "m5", "m6"]
+    assert crud.get_messages_by_conversation(session, conversation.id, after=newer["after_cursor"])["data"] == []
+
+    with pytest.raises(ValueError):
+        crud.get_messages_by_conversation(session, conversation.id, before="x", after="y")
+
+
+@pytest.mark.integration
+def test_conversation_list_has_last_message_and_unread_count(session, thread):
+    conversation, customer, vendor = thread
+    other = crud.create_conversation(session, ConversationCreate(member_ids=[]), vendor.id)
+
+    crud.create_message(session, MessageCreate(conversation_id=conversation.id, content="Còn túi không?"), customer.id)
+    last = crud.create_message(session, MessageCreate(conversation_id=conversation.id, content="Còn 2 túi"), customer.id)
+
+    page = crud.get_user_conversations_and_last_message(session, vendor.id, limit=1)
+    first, = page["data"]
+    assert first["id"] == conversation.id
+    assert first["last_message"].id == last.id
+    assert first["unread_count"] == 2
+    assert {member.user_id for member in first["members"]} == {customer.id, vendor.id}
+
+    second, = crud.get_user_conversations_and_last_message(session, vendor.id, cursor=page["next_cursor"])["data"]
+    assert second["id"] == other.id and second["last_message"] is None
+
+    # The sender's own messages are not unread for them
+    assert crud.get_user_conversations_and_last_message(session, customer.id)["data"][0]["unread_count"] == 0
+    assert crud.mark_conversation_read(session, conversation.id, vendor.id)
+    assert crud.get_user_conversations_and_last_message(session, vendor.id)["data"][0]["unread_count"] == 0
@@ -0,0 +1,36 @@
+"""
+Unit tests for city normalisation.
+"""
+import pytest
+
+from app.services.city import city_from_address, normalize_city
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("raw", ["TP. Hồ Chí Minh", "Thành phố Hồ Chí Minh", "TP.HCM", "Sài Gòn", "Ho Chi Minh City"])
+def test_normalize_city_folds_prefixes_and_aliases(raw):
+    assert normalize_city(raw) == "ho chi minh"
+
+
+@pytest.mark.unit
+def test_normalize_city_blank():
+    assert normalize_city(None) is None
+    assert normalize_city("  ") is None
+
+
+@pytest.mark.unit
+def test_city_from_address_uses_last_part():
+    assert city_from_address("12 Lê Lợi, Quận 1, TP. Hồ Chí Minh") == "ho chi minh"
+    assert city_from_address("45 Bạch Đằng, Hải Châu, Đà Nẵng, Việt Nam") == "da nang"
+    assert city_from_address("36 Hàng Bạc, Hoàn Kiếm, Hà Nội") == "ha noi"
+    assert city_from_address("") is None
+
+
+@pytest.mark.unit
+def test_city_from_address_needs_a_comma_or_a_known_city():
+    assert city_from_address("123 Đường Lê Lợi Quận 1") is None
+    assert city_from_address("123 Đường Lê Lợi Quận 1, Việt Nam") is None
+    assert city_from_address("TP. Hồ Chí Minh") == "ho chi minh"
+    assert city_from_address("Đà Nẵng, Việt Nam") == "da nang"
+    assert city_from_address("Thừa Thiên Huế") == "thua thien hue"
+    assert city_from_address("Bà Rịa - Vũng Tàu") == "ba ria vung tau"
@@ -0,0 +1,64 @@
+"""
+Tests for the per-store merchant food-item listing cache (app/services/food_item_cache.py).
+"""
+import uuid
+
+import pytest
+from sqlmodel import Session
+
+from app.models import FoodItem, Store
+from app.services.food_item_cache import food_item_cache
+from app.services.reservation import FOOD_ITEM, release_stock, reserve_stock
+
+
+def listing(store_id: uuid.UUID, loads: list) -> list:
+    return food_item_cache.get_or_load(store_id, (None, None, True), lambda: loads.append(1) or [len(loads)])
+
+
+@pytest.mark.integration
+def test_listing_is_cached_until_a_write_commits(session: Session):
+    store_id, loads = uuid.uuid4(), []
+    assert listing(store_id, loads) == [1]
+    assert listing(store_id, loads) == [1]
+
+    food_item_cache.invalidate(session, store_id)
+    # Not committed yet: readers keep the committed listing
+    assert listing(store_id, loads) == [1]
+    session.commit()
+    assert listing(store_id, loads) == [2]
+
+
+@pytest.mark.integration
+def test_rolled_back_writes_do_not_invalidate(session: Session):
+    store_id, loads = uuid.uuid4(), []
+    listing(store_id, loads)
+
+    session.begin()
+    food_item_cache.invalidate(session, store_id)
+    session.rollback()
+    session.commit()
+    assert listing(store_id, loads) == [1]
+
+    # A savepoint rolling back keeps what the outer transaction recorded
+    session.begin()
+    food_item_cache.invalidate(session, store_id)
+    session.begin_nested().rollback()
+    session.commit()
+    assert listing(store_id, loads) == [2]
+
+
+@pytest.mark.integration
+def test_stock_reservations_invalidate_the_store(session: Session, test_store: Store):
+    store_id, loads = test_store.id, []
+    item = FoodItem(name="Bánh mì", standard_price=20000, total_quantity=5, available_quantity=5, store_id=store_id)
+    session.add(item)
+    session.commit()
+    listing(store_id, loads)
+
+    reserve_stock(session, {(FOOD_ITEM, item.id): 2})
+    session.commit()
+    assert listing(store_id, loads) == [2]
+
+    release_stock(session, {(FOOD_ITEM, item.id): 2})
+    session.commit()
+    assert listing(store_id, loads) == [3]
@@ -0,0 +1,213 @@
+"""
+Tests for the flash-sale hot inventory tier.
+
+The Redis tests are skipped when no Redis server is reachable at REDIS_HOST:REDIS_PORT.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+import redis
+from sqlmodel import Session, select
+
+from app import crud
+from app.core.config import settings
+from app.models import NotificationOutbox, Order, OrderItem, OrderStatus, Store, SurpriseBag, User
+from app.schemas.order import OrderCreate, OrderItemCreate
+from app.services.hot_inventory import (
+    HotInventory, HotInventoryShortage, KEY_PREFIX, held_key, persist_reservations, quantity_key
+)
+
+
+def make_bag(session: Session, store: Store, quantity: int) -> SurpriseBag:
+    now = datetime.now()
+    bag = SurpriseBag(
+        name="Flash Sale Bag",
+        original_value=50000.0,
+        discounted_price=25000.0,
+        discount_percentage=0.5,
+        quantity_available=quantity,
+        available_from=now - timedelta(hours=1),
+        available_until=now + timedelta(hours=4),
+        pickup_start_time=now + timedelta(hours=2),
+        pickup_end_time=now + timedelta(hours=4),
+        store_id=store.id,
+    )
+    session.add(bag)
+    session.commit()
+    session.refresh(bag)
+    return bag
+
+
+def make_entry(bag_id: uuid.UUID, customer: User, quantity: int = 1) -> dict:
+    return {
+        "order_id": str(uuid.uuid4()),
+        "bag_id": str(bag_id),
+        "customer_id": str(customer.id),
+        "quantity": quantity,
+        "price": 25000.0,
+        "created_at": datetime.now().isoformat(),
+    }
+
+
+@pytest.fixture
+def redis_client():
+    client = redis.Redis(
+        host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+        decode_responses=True, socket_connect_timeout=0.2
+    )
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip("Redis is not reachable")
+    yield client
+    keys = list(client.scan_iter(match=f"{KEY_PREFIX}:*"))
+    if keys:
+        client.delete(*keys)
+
+
+@pytest.fixture
+def inventory(redis_client, monkeypatch) -> HotInventory:
+    monkeypatch.setattr(settings, "HOT_INVENTORY_ENABLED", True)
+    return HotInventory(client=redis_client)
+
+
+@pytest.mark.integration
+def test_persist_reservations_is_idempotent(session: Session, test_store: Store, test_customer: User):
+    bag = make_bag(session, test_store, quantity=5)
+    entries = [make_entry(bag.id, test_customer, 2), make_entry(bag.id, test_customer, 1)]
+
+    assert persist_reservations(session, entries) == ({bag.id: 3}, set())
+    # A batch replayed after a crash writes nothing twice but still reports what it held
+    assert persist_reservations(session, entries) == ({bag.id: 3}, set())
+
+    orders = session.exec(select(Order).where(Order.customer_id == test_customer.id)).all()
+    assert sorted(order.total_amount for order in orders) == [25000.0, 50000.0]
+    assert len(session.exec(select(OrderItem).where(OrderItem.surprise_bag_id == bag.id)).all()) == 2
+    session.refresh(bag)
+    assert bag.quantity_available == 2
+
+
+@pytest.mark.integration
+def test_persist_reservations_cancels_bookings_beyond_the_row_stock(
+    session: Session, test_store: Store, test_customer: User
+):
+    bag = make_bag(session, test_store, quantity=2)
+    fits, too_many = make_entry(bag.id, test_customer, 2), make_entry(bag.id, test_customer, 1)
+
+    # The whole batch leaves the in-flight counter; the bag is reported for reconciliation
+    assert persist_reservations(session, [fits, too_many]) == ({bag.id: 3}, {bag.id})
+
+    assert session.get(Order, uuid.UUID(fits["order_id"])).status == OrderStatus.PENDING_PAYMENT
+    assert session.get(Order, uuid.UUID(too_many["order_id"])).status == OrderStatus.CANCELLED
+    session.refresh(bag)
+    assert bag.quantity_available == 0
+    # The customer was told the booking went through, so they are told it did not
+    notification, = session.exec(select(NotificationOutbox)).all()
+    assert notification.recipient_ids == [str(test_customer.id)]
+    assert too_many["order_id"][:8] in notification.message
+
+
+@pytest.mark.integration
+def test_hot_bookings_stop_at_stock_and_are_written_behind(
+    session: Session, test_store: Store, test_customer: User, inventory: HotInventory
+):
+    bag = make_bag(session, test_store, quantity=3)
+    assert inventory.reconcile(session, [bag.id]) == 1
+
+    bookings = [inventory.reserve_booking(bag, test_customer.id, 1, bag.pickup_start_time) for _ in range(3)]
+    with pytest.raises(HotInventoryShortage):
+        inventory.reserve_booking(bag, test_customer.id, 1, bag.pickup_start_time)
+    # Nothing has reached the database yet
+    assert session.exec(select(Order).where(Order.customer_id == test_customer.id)).all() == []
+
+    assert inventory.flush(lambda: Session(session.get_bind()), drain=True) == 3
+    order_ids = set(session.exec(select(Order.id).where(Order.customer_id == test_customer.id)).all())
+    assert order_ids == {booking["id"] for booking in bookings}
+    session.refresh(bag)
+    assert bag.quantity_available == 0
+
+
+@pytest.mark.integration
+def test_reconcile_corrects_drift_and_holds_are_all_or_nothing(
+    session: Session, test_store: Store, inventory: HotInventory, redis_client
+):
+    bag, other = make_bag(session, test_store, quantity=4), make_bag(session, test_store, quantity=1)
+    inventory.reconcile(session, [bag.id, other.id])
+
+    redis_client.set(quantity_key(bag.id), 100)  # drift
+    inventory.reconcile(session, [bag.id])
+    assert redis_client.get(quantity_key(bag.id)) == "4"
+
+    with pytest.raises(HotInventoryShortage):
+        inventory.hold({bag.id: 2, other.id: 2})
+    assert redis_client.get(quantity_key(bag.id)) == "4"
+
+    unloaded = uuid.uuid4()
+    assert inventory.hold({bag.id: 2, unloaded: 1}) == {bag.id: 2}
+    inventory.release({bag.id: 2})
+    assert redis_client.get(quantity_key(bag.id)) == "4"
+
+
+@pytest.mark.integration
+def test_order_gives_its_hold_back_when_the_commit_fails(
+    session: Session, test_store: Store, test_customer: User, inventory: HotInventory,
+    redis_client, monkeypatch
+):
+    bag = make_bag(session, test_store, quantity=4)
+    inventory.reconcile(session, [bag.id])
+    monkeypatch.setattr("app.services.reservation.hot_inventory", inventory)
+
+    def failing_commit():
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(session, "commit", failing_commit)
+    order = OrderCreate(items=[OrderItemCreate(surprise_bag_id=bag.id, quantity=3)])
+    with pytest.raises(RuntimeError):
+        crud.create_order(session, order, test_customer.id)
+    assert redis_client.get(quantity_key(bag.id)) == "4"
+    assert redis_client.get(held_key(bag.id)) is None
+
+
+@pytest.mark.integration
+def test_reconcile_during_a_checkout_keeps_its_hold(
+    session: Session, test_store: Store, test_customer: User, inventory: HotInventory,
+    redis_client, monkeypatch
+):
+    bag = make_bag(session, test_store, quantity=4)
+    inventory.reconcile(session, [bag.id])
+
+    # The checkout holds 3 in Redis; its bag row update has not committed yet
+    held = inventory.hold({bag.id: 3})
+    inventory.reconcile(session, [bag.id])
+    assert redis_client.get(quantity_key(bag.id)) == "1"
+    with pytest.raises(HotInventoryShortage):
+        inventory.hold({bag.id: 2})
+
+    # It commits: the row carries the decrement and the hold is forgotten
+    bag.quantity_available -= 3
+    session.add(bag)
+    session.commit()
+    inventory.settle(held)
+    assert redis_client.get(held_key(bag.id)) is None
+    inventory.reconcile(session, [bag.id])
+    assert redis_client.get(quantity_key(bag.id)) == "1"
+
+    # The order path settles its holds after the commit
+    monkeypatch.setattr("app.services.reservation.hot_inventory", inventory)
+    crud.create_order(session, OrderCreate(items=[OrderItemCreate(surprise_bag_id=bag.id, quantity=1)]), test_customer.id)
+    assert redis_client.get(quantity_key(bag.id)) == "0"
+    assert redis_client.get(held_key(bag.id)) is None
+
+
+@pytest.mark.integration
+def test_redis_fallbacks_mark_bags_for_reconciliation(session: Session, test_store: Store, monkeypatch):
+    monkeypatch.setattr(settings, "HOT_INVENTORY_ENABLED", True)
+    bag = make_bag(session, test_store, quantity=2)
+    inventory = HotInventory(client=redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.2))
+
+    assert inventory.reserve_booking(bag, uuid.uuid4(), 1, bag.pickup_start_time) is None
+    assert inventory.hold({bag.id: 1}) == {}
+    # Still unreachable: the bag stays marked until a reconciliation gets through
+    assert inventory.reconcile_dirty(session) == 0
+    assert inventory._dirty == {bag.id}
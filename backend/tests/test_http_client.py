@@ -0,0 +1,83 @@
+"""
+Unit tests for the shared outbound HTTP client.
+"""
+import httpx
+import pytest
+
+from app.services.http_client import CircuitBreaker, CircuitOpenError, ServiceClient
+
+
+def make_service(handler, max_retries: int = 2, failure_threshold: int = 5) -> ServiceClient:
+    service = ServiceClient(
+        name="test",
+        base_url="https://example.test",
+        max_concurrency=4,
+        max_retries=max_retries,
+        breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=60),
+    )
+    service._client = httpx.AsyncClient(base_url=service.base_url, transport=httpx.MockTransport(handler))
+    return service
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr("app.services.http_client.settings.HTTP_CLIENT_RETRY_BACKOFF_SECONDS", 0)
+
+
+@pytest.mark.unit
+async def test_get_retries_on_server_error():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 3 else 200, json={"ok": True})
+
+    service = make_service(handler)
+    response = await service.get("/ping")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert service.breaker.state == "closed"
+
+
+@pytest.mark.unit
+async def test_post_is_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(502)
+
+    service = make_service(handler)
+    response = await service.post("/orders")
+
+    assert response.status_code == 502
+    assert len(calls) == 1
+
+
+@pytest.mark.unit
+async def test_circuit_opens_after_repeated_failures():
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    service = make_service(handler, max_retries=0, failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            await service.get("/ping")
+
+    assert service.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await service.get("/ping")
+
+
+@pytest.mark.unit
+def test_half_open_breaker_allows_one_trial_call():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+
+    breaker.record_success()
+    assert breaker.state == "closed"
@@ -0,0 +1,140 @@
+"""
+Tests for the bulk inventory import (app/services/inventory_import.py); the
+endpoint is tested in tests/api/endpoints/test_inventory_import.py.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import FoodItem, InventoryLog, Store, User
+from app.services import inventory_import
+from app.services.inventory_import import InventoryImportTooLarge, apply_inventory_import, parse_lines, read_lines
+
+
+def add_item(session: Session, store: Store, sku: str, total: int, reserved: int = 0) -> uuid.UUID:
+    item = FoodItem(
+        name=f"Item {sku}", sku=sku, standard_price=10000, store_id=store.id,
+        total_quantity=total, reserved_quantity=reserved, available_quantity=total - reserved
+    )
+    session.add(item)
+    session.commit()
+    return item.id
+
+
+def lines(text: str) -> list:
+    return text.splitlines(keepends=True)
+
+
+@pytest.mark.integration
+def test_csv_import_reports_every_line(session: Session, test_store: Store, test_customer: User):
+    other_store = Store(name="Other Store", address="1 Other Street", owner_id=test_customer.id)
+    session.add(other_store)
+    session.commit()
+    carrots = add_item(session, test_store, "CAR-1", 10, reserved=4)
+    add_item(session, test_store, "MILK-1", 5)
+    add_item(session, test_store, "DUP-1", 1)
+    add_item(session, test_store, "DUP-1", 1)
+    add_item(session, other_store, "OTHER-1", 1)
+
+    report = apply_inventory_import(session, test_store.id, parse_lines("csv", lines(
+        "SKU,New_Total,change_type,reason\n"
+        "CAR-1,7,,\n"
+        "MILK-1,5,restock,\n"
+        "OTHER-1,3,,\n"
+        "DUP-1,2,,\n"
+        "BAD-1,-1,,\n"
+        "CAR-1,2,adjustment,\"Cuối ngày, hỏng 8\"\n"
+    )))
+    session.commit()
+
+    assert [(r.line, r.status) for r in report.results] == [
+        (2, "superseded"), (3, "unchanged"), (4, "not_found"), (5, "ambiguous"), (6, "invalid"), (7, "updated")
+    ]
+    assert (report.total, report.updated, report.unchanged, report.failed) == (6, 1, 1, 4)
+
+    item = session.get(FoodItem, carrots)
+    # Reserved stock stays reserved; nothing is left to sell
+    assert (item.total_quantity, item.available_quantity, item.reserved_quantity) == (2, 0, 4)
+    log, = session.exec(select(InventoryLog).where(InventoryLog.food_item_id == carrots)).all()
+    assert (log.food_item_id, log.change_type, log.quantity_change, log.previous_quantity, log.new_quantity) == (
+        carrots, "adjustment", -8, 10, 2
+    )
+    assert log.reason == "Cuối ngày, hỏng 8"
+
+
+@pytest.mark.unit
+def test_ndjson_lines_are_validated():
+    parsed = parse_lines("ndjson", lines(
+        '{"sku": "A", "new_total": 3}\n'
+        "\n"
+        "not json\n"
+        '["A", 3]\n'
+        '{"sku": "B"}\n'
+    ))
+    assert [(number, line is not None) for number, line, _ in parsed] == [
+        (1, True), (3, False), (4, False), (5, False)
+    ]
+    assert parsed[0][1].change_type == "restock"
+    assert "new_total" in parsed[3][2]
+
+    with pytest.raises(inventory_import.InventoryImportError):
+        parse_lines("csv", lines("sku,quantity\nA,1\n"))
+
+
+@pytest.mark.unit
+def test_unreadable_csv_is_rejected():
+    with pytest.raises(inventory_import.InventoryImportError, match="line 2"):
+        parse_lines("csv", lines("sku,new_total\nA\0,1\n"))
+    with pytest.raises(inventory_import.InventoryImportError):
+        parse_lines("csv", lines("sku,new_total,reason\nA,1," + "x" * 200000 + "\n"))
+
+
+@pytest.mark.integration
+def test_large_import_locks_in_id_order(monkeypatch, session: Session, test_store: Store):
+    monkeypatch.setattr(settings, "INVENTORY_IMPORT_BATCH_SIZE", 50)
+    for i in range(120):
+        add_item(session, test_store, f"SKU-{i:03d}", 1)
+    store_id = test_store.id
+
+    statements, locked = [], []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        if "FOR UPDATE" in statement:
+            locked.append([value for key, value in parameters.items() if key.startswith("id_")])
+
+    event.listen(session.connection(), "before_cursor_execute", record)
+    body = "sku,new_total\n" + "".join(f"SKU-{i:03d},{i + 2}\n" for i in range(120))
+    report = apply_inventory_import(session, store_id, parse_lines("csv", lines(body)))
+    session.commit()
+
+    assert report.updated == 120
+    # Per batch: the resolving select, the locking select, the update and the log insert
+    assert len([s for s in statements if s.lstrip().upper().startswith(("SELECT", "UPDATE", "INSERT"))]) == 12
+    # One ascending id order across all lock batches
+    assert len(locked) == 3 and [item_id for batch in locked for item_id in sorted(batch)] == sorted(
+        item_id for batch in locked for item_id in batch
+    )
+    totals = session.exec(select(FoodItem.total_quantity).where(FoodItem.store_id == store_id)).all()
+    assert sorted(totals) == list(range(2, 122))
+
+
+@pytest.mark.unit
+def test_body_is_decoded_across_chunks(monkeypatch):
+    async def chunks(*parts):
+        for part in parts:
+            yield part
+
+    encoded = "sku,new_total,reason\nA,1,Bánh\nB,2,x".encode()
+    split = encoded.index("á".encode()) + 1  # Inside the multi-byte character
+    assert asyncio.run(read_lines(chunks(b"\xef\xbb\xbf" + encoded[:split], encoded[split:]))) == [
+        "sku,new_total,reason\n", "A,1,Bánh\n", "B,2,x"
+    ]
+
+    monkeypatch.setattr(settings, "INVENTORY_IMPORT_MAX_LINES", 1)
+    with pytest.raises(InventoryImportTooLarge):
+        asyncio.run(read_lines(chunks(encoded)))
@@ -0,0 +1,104 @@
+"""
+Unit tests for the Mapbox response cache.
+"""
+import pytest
+
+from app.services import mapbox
+from app.services.cache import LRUCache, TieredCache
+
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    cache = TieredCache(LRUCache(max_entries=100))
+    monkeypatch.setattr(mapbox, "mapbox_cache", cache)
+    return cache
+
+
+@pytest.mark.unit
+def test_lru_cache_evicts_oldest_and_expires():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1, ttl_seconds=60)
+    cache.set("b", 2, ttl_seconds=60)
+    cache.get("a")
+    cache.set("c", 3, ttl_seconds=60)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+
+    cache.set("gone", "x", ttl_seconds=-1)
+    assert cache.get("gone") == (False, None)
+
+
+@pytest.mark.unit
+async def test_tiered_cache_counts_and_negative_entries():
+    cache = TieredCache(LRUCache(max_entries=10))
+    await cache.set("geocode", "unknown street", None, ttl_seconds=60)
+
+    assert await cache.get("geocode", "unknown street") == (True, None)
+    assert await cache.get("geocode", "other street") == (False, None)
+    assert cache.stats()["geocode"] == {"hits": 1, "misses": 1, "remote_hits": 0}
+
+
+@pytest.mark.unit
+async def test_matrix_only_requests_uncached_destinations(fresh_cache, monkeypatch):
+    requested = []
+
+    async def fake_get(url, params=None):
+        count = len(params["destinations"].split(";"))
+        requested.append(count)
+        return FakeResponse({
+            "code": "Ok",
+            "durations": [[100.0 * (i + 1) for i in range(count)]],
+            "distances": [[1000.0 * (i + 1) for i in range(count)]],
+        })
+
+    monkeypatch.setattr(mapbox.mapbox_client, "get", fake_get)
+    origin = (106.7009, 10.7769)
+
+    first = await mapbox.get_travel_info_from_mapbox(origin, [(106.7100, 10.7900)])
+    # Second destination differs only past the quantisation precision of the first
+    second = await mapbox.get_travel_info_from_mapbox(
+        (106.70091, 10.77691), [(106.71001, 10.79001), (106.6588, 10.8185)]
+    )
+
+    assert requested == [1, 1]
+    assert second[0] == first[0]
+    assert second[1] == {"duration": 100.0, "distance": 1000.0}
+    assert fresh_cache.stats()["matrix"]["hits"] == 1
+
+
+@pytest.mark.unit
+async def test_matrix_chunks_destinations_and_degrades_per_chunk(fresh_cache, monkeypatch):
+    requested = []
+
+    async def fake_get(url, params=None):
+        count = len(params["destinations"].split(";"))
+        requested.append(count)
+        if len(requested) == 2:
+            return FakeResponse({"code": "ServerError"})
+        return FakeResponse({
+            "code": "Ok",
+            "durations": [[60.0] * count],
+            "distances": [[500.0] * count],
+        })
+
+    monkeypatch.setattr(mapbox.mapbox_client, "get", fake_get)
+    destinations = [(106.60 + i * 0.01, 10.70) for i in range(30)]
+
+    results = await mapbox.get_travel_info_from_mapbox((106.70, 10.77), destinations, "mapbox/walking")
+
+    assert requested == [24, 6]
+    assert len(results) == 30
+    assert all(info == {"duration": 60.0, "distance": 500.0} for info in results[:24])
+    assert results[24:] == [None] * 6
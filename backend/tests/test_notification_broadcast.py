@@ -0,0 +1,95 @@
+"""
+Tests for broadcast notifications (app/services/notification_broadcast.py and the
+virtual broadcast merge in crud).
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.models import BroadcastJobStatus, Noti_User, User
+from app.schemas.notification import NotificationCreate
+from app.schemas.user import UserCreate
+from app.services.notification_broadcast import deliver_broadcast_chunk, run_broadcast_job
+from app.services.notification_inbox import unread_count
+from tests.utils import create_random_user_data
+
+
+def create_users(session: Session, count: int, created_at: datetime = None) -> list:
+    users = [crud.create_user(session, UserCreate(**create_random_user_data())) for _ in range(count)]
+    for user in users:
+        user.created_at = created_at or datetime.now() - timedelta(days=1)
+        session.add(user)
+    session.commit()
+    return users
+
+
+def user_count(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(User)).one()
+
+
+def recipient_count(session: Session, notification_id: uuid.UUID) -> int:
+    return session.exec(
+        select(func.count()).select_from(Noti_User).where(Noti_User.notification_id == notification_id)
+    ).one()
+
+
+@pytest.mark.integration
+def test_broadcast_job_fans_out_in_chunks(session):
+    users = create_users(session, 7)
+    total = user_count(session)
+
+    notification, job = crud.create_notification_to_all(session, NotificationCreate(title="Khuyến mãi", message="m"), virtual=False)
+    job = run_broadcast_job(session, job.id, chunk_size=3)
+
+    assert job.status == BroadcastJobStatus.COMPLETED
+    assert job.total_recipients == job.processed_recipients == total
+    assert recipient_count(session, notification.id) == total
+    assert unread_count(session, users[0].id) == 1
+
+
+@pytest.mark.integration
+def test_broadcast_job_resumes_after_last_chunk(session):
+    create_users(session, 5)
+    total = user_count(session)
+    notification, job = crud.create_notification_to_all(session, NotificationCreate(title="t", message="m"), virtual=False)
+
+    # First chunk committed, then the runner dies
+    deliver_broadcast_chunk(session, job, chunk_size=2)
+    session.commit()
+    # A user who already got the row some other way is skipped, not duplicated
+    last_user_id = session.exec(select(User.id).order_by(User.id.desc())).first()
+    session.add(Noti_User(notification_id=notification.id, user_id=last_user_id))
+    session.commit()
+
+    job = run_broadcast_job(session, job.id, chunk_size=2)
+
+    assert job.status == BroadcastJobStatus.COMPLETED
+    assert job.processed_recipients == total - 1
+    assert recipient_count(session, notification.id) == total
+
+
+@pytest.mark.integration
+def test_virtual_broadcast_is_merged_at_read_time(session):
+    old_user, = create_users(session, 1)
+    personal = crud.create_notification(session, NotificationCreate(title="personal", message="m"), [old_user.id])
+    broadcast, job = crud.create_notification_to_all(session, NotificationCreate(title="broadcast", message="m"), virtual=True)
+    new_user, = create_users(session, 1, created_at=datetime.now() + timedelta(seconds=1))
+
+    assert job is None
+    assert broadcast.is_broadcast
+    assert recipient_count(session, broadcast.id) == 0
+
+    inbox = crud.get_user_notifications(session, old_user.id)
+    assert [n["title"] for n in inbox] == ["broadcast", "personal"]
+    assert not inbox[0]["is_read"]
+    # Not important: users who signed up later do not get it
+    assert crud.get_user_notifications(session, new_user.id) == []
+
+    assert crud.mark_notification_as_read(session, broadcast.id, old_user.id)
+    inbox = crud.get_user_notifications(session, old_user.id)
+    assert [(n["title"], n["is_read"]) for n in inbox] == [("broadcast", True), ("personal", False)]
+    assert recipient_count(session, broadcast.id) == 1
+    assert not crud.mark_notification_as_read(session, personal.id, new_user.id)
@@ -0,0 +1,97 @@
+"""
+Tests for the notification inbox read model (app/services/notification_inbox.py):
+unread counters, cursor paging and mark-all-read.
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, func, select
+
+from app import crud
+from app.models import Noti_User, Notification, NotificationInbox, User
+from app.schemas.notification import NotificationCreate
+from app.schemas.user import UserCreate
+from app.services.notification_broadcast import run_broadcast_job
+from app.services.notification_inbox import unread_count
+from app.services.notification_outbox import deliver_outbox_batch, enqueue_notification
+from tests.utils import create_random_user_data
+
+
+@pytest.fixture
+def user(session: Session, test_customer: User) -> User:
+    # crud.create_user creates the counter row with the user; the fixture user bypasses it
+    test_customer.created_at = datetime.now() - timedelta(days=1)
+    session.add(test_customer)
+    session.add(NotificationInbox(user_id=test_customer.id, unread_count=0))
+    session.commit()
+    return test_customer
+
+
+def stored_count(session: Session, user_id: uuid.UUID) -> int:
+    return session.exec(select(NotificationInbox.unread_count).where(NotificationInbox.user_id == user_id)).one()
+
+
+@pytest.mark.integration
+def test_counter_follows_inserts_and_reads(session, user):
+    first = crud.create_notification(session, NotificationCreate(title="a", message="m"), [user.id])
+    assert crud.get_unread_notification_count(session, user.id) == 1
+
+    crud.create_notification(session, NotificationCreate(title="b", message="m"), [user.id, user.id])
+    enqueue_notification(session, NotificationCreate(title="c", message="m"), [user.id])
+    session.commit()
+    deliver_outbox_batch(session)
+    _, job = crud.create_notification_to_all(session, NotificationCreate(title="d", message="m"), virtual=False)
+    run_broadcast_job(session, job.id)
+    assert stored_count(session, user.id) == 4
+
+    assert crud.mark_notification_as_read(session, first.id, user.id)
+    # Reading twice does not decrement twice
+    assert crud.mark_notification_as_read(session, first.id, user.id)
+    assert crud.get_unread_notification_count(session, user.id) == 3
+
+
+@pytest.mark.integration
+def test_new_users_get_their_counter_with_the_account(session):
+    crud.create_notification(session, NotificationCreate(title="Welcome", message="m", is_important=True), [])
+
+    user = crud.create_user(session, UserCreate(**create_random_user_data()))
+
+    assert unread_count(session, user.id) == 1
+    # No counter row: nothing is rebuilt from Noti_User
+    assert unread_count(session, uuid.uuid4()) == 0
+
+
+@pytest.mark.integration
+def test_mark_all_read_includes_virtual_broadcasts(session, user):
+    crud.create_notification(session, NotificationCreate(title="a", message="m"), [user.id])
+    broadcast, _ = crud.create_notification_to_all(session, NotificationCreate(title="b", message="m"), virtual=True)
+    assert crud.get_unread_notification_count(session, user.id) == 2
+
+    assert crud.mark_all_notifications_as_read(session, user.id) == 2
+
+    assert crud.get_unread_notification_count(session, user.id) == 0
+    assert all(n["is_read"] for n in crud.get_user_notifications(session, user.id))
+    assert session.exec(
+        select(func.count()).select_from(Noti_User).where(Noti_User.notification_id == broadcast.id)
+    ).one() == 1
+
+
+@pytest.mark.integration
+def test_inbox_pages_newest_first(session, user):
+    now = datetime.now()
+    for i in range(5):
+        notification = Notification(title=f"n{i}", message="m", created_at=now + timedelta(seconds=i))
+        session.add(notification)
+        session.flush()
+        session.add(Noti_User(notification_id=notification.id, user_id=user.id, created_at=notification.created_at))
+    session.commit()
+
+    titles, cursor = [], None
+    while True:
+        page = crud.get_user_notifications_page(session, user.id, limit=2, cursor=cursor)
+        titles += [n["title"] for n in page["data"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert titles == ["n4", "n3", "n2", "n1", "n0"]
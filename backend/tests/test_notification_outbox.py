@@ -0,0 +1,83 @@
+"""
+Tests for the notification outbox (app/services/notification_outbox.py).
+"""
+import pytest
+from sqlmodel import Session, func, select
+
+from app.models import Noti_User, Notification, NotificationOutbox, User
+from app.schemas.notification import NotificationCreate
+from app.services.notification_outbox import deliver_outbox_batch, enqueue_notification
+
+
+def count(session: Session, model) -> int:
+    return session.exec(select(func.count()).select_from(model)).one()
+
+
+@pytest.mark.integration
+def test_enqueue_is_part_of_the_callers_transaction(session: Session, test_customer: User):
+    enqueue_notification(session, NotificationCreate(title="t", message="m"), [test_customer.id])
+    session.rollback()
+
+    assert count(session, NotificationOutbox) == 0
+
+
+@pytest.mark.integration
+def test_batch_is_delivered_once(session: Session, test_vendor: User, test_customer: User):
+    merchant, customer = test_vendor.id, test_customer.id
+    first = enqueue_notification(
+        session, NotificationCreate(title="Đơn hàng mới!", message="m", is_important=True), [merchant]
+    )
+    second = enqueue_notification(
+        session, NotificationCreate(title="Đã chấp nhận", message="m"), [merchant, customer, customer]
+    )
+    session.commit()
+    first_id, second_id = first.id, second.id
+
+    assert deliver_outbox_batch(session) == 2
+    assert deliver_outbox_batch(session) == 0
+
+    assert count(session, NotificationOutbox) == 0
+    recipients = session.exec(
+        select(Noti_User.notification_id, Noti_User.user_id)
+        .where(Noti_User.notification_id.in_([first_id, second_id]))
+    ).all()
+    assert sorted(recipients, key=str) == sorted(
+        [(first_id, merchant), (second_id, merchant), (second_id, customer)], key=str
+    )
+    notification = session.get(Notification, first_id)
+    assert notification.title == "Đơn hàng mới!"
+    assert notification.is_important
+
+
+@pytest.mark.integration
+def test_batch_size_limits_delivery(session: Session, test_customer: User):
+    for _ in range(5):
+        enqueue_notification(session, NotificationCreate(title="t", message="m"), [test_customer.id])
+    session.commit()
+
+    assert deliver_outbox_batch(session, limit=3) == 3
+    assert count(session, NotificationOutbox) == 2
+
+
+@pytest.mark.integration
+def test_entry_for_a_deleted_recipient_is_dropped_alone(
+    session: Session, test_customer: User, test_vendor: User
+):
+    ghost = User(
+        full_name="Ghost", phone_number="0900000000", email="ghost@test.com", hashed_password="x"
+    )
+    session.add(ghost)
+    session.commit()
+    ghost_id = ghost.id
+    good = enqueue_notification(session, NotificationCreate(title="ok", message="m"), [test_customer.id])
+    enqueue_notification(session, NotificationCreate(title="lost", message="m"), [ghost_id, test_vendor.id])
+    session.commit()
+    good_id = good.id
+    session.delete(ghost)
+    session.commit()
+
+    assert deliver_outbox_batch(session) == 2
+
+    assert count(session, NotificationOutbox) == 0
+    assert session.get(Notification, good_id) is not None
+    assert session.exec(select(Notification).where(Notification.title == "lost")).all() == []
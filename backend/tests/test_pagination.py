@@ -0,0 +1,26 @@
+"""
+Unit tests for the opaque pagination cursor.
+"""
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.schemas.common import decode_cursor, encode_cursor
+
+
+@pytest.mark.unit
+def test_cursor_round_trip():
+    values = [datetime(2025, 10, 1, 12, 30, 15, 250), uuid.uuid4()]
+
+    cursor = encode_cursor(values)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, [datetime, uuid.UUID]) == values
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(["x"]), encode_cursor(["a", "b"])])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [datetime, uuid.UUID])
@@ -0,0 +1,162 @@
+"""
+Tests for the real-time push channel (app/services/realtime.py, endpoints/realtime.py).
+
+The Redis fan-out test is skipped when no Redis server is reachable at
+REDIS_HOST:REDIS_PORT.
+"""
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+import redis
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_stream_user
+from app.api.endpoints import realtime
+from app.core.config import settings
+from app.services.realtime import HEARTBEAT_EVENT, RESYNC_EVENT, RealtimeHub
+
+
+@pytest.mark.unit
+def test_dispatch_reaches_only_the_users_connections():
+    hub = RealtimeHub()
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+
+    async def scenario():
+        first, second = hub.registry.connect(alice), hub.registry.connect(alice)
+        other = hub.registry.connect(bob)
+        hub.publish([alice], "order_status", {"order_id": uuid.uuid4(), "status": "confirmed"})
+        events = [await first.next_event(1), await second.next_event(1), await other.next_event(0.05)]
+        hub.registry.disconnect(first)
+        return events, len(hub.registry)
+
+    (first, second, other), remaining = asyncio.run(scenario())
+
+    assert first["type"] == second["type"] == "order_status"
+    assert first["data"]["status"] == "confirmed"
+    assert other == HEARTBEAT_EVENT
+    assert remaining == 2
+
+
+@pytest.mark.unit
+def test_slow_consumer_is_asked_to_resync(monkeypatch):
+    monkeypatch.setattr(settings, "REALTIME_SEND_QUEUE_SIZE", 3)
+    hub = RealtimeHub()
+    user_id = uuid.uuid4()
+
+    async def scenario():
+        connection = hub.registry.connect(user_id)
+        for i in range(5):
+            hub.publish([user_id], "notification", {"n": i})
+        await asyncio.sleep(0)
+        events = [await connection.next_event(1), await connection.next_event(0.05)]
+        return events, connection.dropped
+
+    (resync, after), dropped = asyncio.run(scenario())
+
+    # Events 0-2 are dropped when event 3 overflows the queue; later events still arrive
+    assert resync == RESYNC_EVENT
+    assert after["data"] == {"n": 4}
+    assert dropped == 3
+
+
+@pytest.mark.unit
+def test_connection_limit(monkeypatch):
+    monkeypatch.setattr(settings, "REALTIME_MAX_CONNECTIONS", 1)
+    hub = RealtimeHub()
+
+    async def scenario():
+        return hub.registry.connect(uuid.uuid4()), hub.registry.connect(uuid.uuid4())
+
+    first, second = asyncio.run(scenario())
+    assert first is not None and second is None
+
+
+@pytest.mark.unit
+def test_websocket_pushes_events_and_heartbeats(monkeypatch):
+    monkeypatch.setattr(settings, "REALTIME_HEARTBEAT_SECONDS", 0.1)
+    user = SimpleNamespace(id=uuid.uuid4())
+    app = FastAPI()
+    app.include_router(realtime.router)
+    app.dependency_overrides[get_stream_user] = lambda: user
+
+    with TestClient(app).websocket_connect("/realtime/ws") as websocket:
+        assert websocket.receive_json() == HEARTBEAT_EVENT
+        realtime.realtime_hub.publish([user.id], "chat_message", {"content": "xin chào"})
+        assert websocket.receive_json() == {"type": "chat_message", "data": {"content": "xin chào"}}
+
+    deadline = time.monotonic() + 2
+    while len(realtime.realtime_hub.registry) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(realtime.realtime_hub.registry) == 0
+
+
+@pytest.fixture
+def redis_client():
+    client = redis.Redis(
+        host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+        decode_responses=True, socket_connect_timeout=0.2
+    )
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip("Redis is not available")
+    return client
+
+
+@pytest.mark.unit
+def test_events_cross_processes_through_redis(monkeypatch, redis_client):
+    monkeypatch.setattr(settings, "REALTIME_REDIS_ENABLED", True)
+    publisher, subscriber = RealtimeHub(redis_client), RealtimeHub(redis_client)
+    user_id = uuid.uuid4()
+    subscriber.start()
+    try:
+        async def scenario():
+            connection = subscriber.registry.connect(user_id)
+            # Let the listener subscribe before publishing
+            await asyncio.sleep(0.5)
+            publisher.publish([user_id], "notification", {"title": "t"})
+            return await connection.next_event(2)
+
+        event = asyncio.run(scenario())
+    finally:
+        subscriber.stop()
+
+    assert event == {"type": "notification", "data": {"title": "t"}}
+
+
+
+@pytest.mark.unit
+def test_event_stream_holds_a_slot_only_while_streaming(monkeypatch):
+    user = SimpleNamespace(id=uuid.uuid4())
+    disconnected = False
+
+    async def is_disconnected():
+        return disconnected
+
+    request = SimpleNamespace(is_disconnected=is_disconnected)
+
+    async def scenario():
+        nonlocal disconnected
+        monkeypatch.setattr(settings, "REALTIME_MAX_CONNECTIONS", 0)
+        with pytest.raises(HTTPException) as exc_info:
+            await realtime.realtime_events(request, user)
+        assert exc_info.value.status_code == 503
+
+        monkeypatch.setattr(settings, "REALTIME_MAX_CONNECTIONS", 1)
+        # A response whose stream never starts (client gone before the first byte) holds nothing
+        await realtime.realtime_events(request, user)
+        assert len(realtime.realtime_hub.registry) == 0
+
+        stream = (await realtime.realtime_events(request, user)).body_iterator
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        assert len(realtime.realtime_hub.registry) == 1
+        disconnected = True
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+        assert len(realtime.realtime_hub.registry) == 0
+
+    asyncio.run(scenario())
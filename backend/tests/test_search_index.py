@@ -0,0 +1,86 @@
+"""
+Tests for the in-memory food search index and the SQL substring fallback.
+"""
+import uuid
+
+import pytest
+from sqlalchemy import literal, select
+from sqlmodel import Session
+
+from app.crud import _escape_like
+from app.services.search_index import FoodSearchIndex, highlight, normalize_text
+
+
+def make_item(name: str, description: str = None, ingredients: str = None, is_available: bool = True) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "name": name,
+        "description": description,
+        "ingredients": ingredients,
+        "is_available": is_available,
+    }
+
+
+@pytest.fixture
+def index() -> FoodSearchIndex:
+    index = FoodSearchIndex()
+    index.load([
+        make_item("Bánh mì thịt", "Bánh mì Sài Gòn giòn rụm"),
+        make_item("Bánh bao", "Nhân thịt trứng cút"),
+        make_item("Phở bò", "Nước dùng hầm xương", ingredients="bánh phở, thịt bò"),
+        make_item("Bánh mì chay", is_available=False),
+    ])
+    return index
+
+
+@pytest.mark.unit
+def test_normalize_text_strips_vietnamese_diacritics():
+    assert normalize_text("Bánh mì Đà Nẵng") == "banh mi da nang"
+
+
+@pytest.mark.unit
+def test_search_is_accent_insensitive_and_ranked(index):
+    results = index.search("banh mi")
+
+    assert [row["name"] for row, _, _ in results] == ["Bánh mì thịt"]
+    assert "<mark>Bánh</mark> <mark>mì</mark>" in results[0][2]
+
+
+@pytest.mark.unit
+def test_name_matches_outrank_ingredient_matches(index):
+    names = [row["name"] for row, _, _ in index.search("banh")]
+
+    assert names.index("Phở bò") > names.index("Bánh bao")
+    assert "Bánh mì chay" not in names
+
+
+@pytest.mark.unit
+def test_autocomplete_prefix(index):
+    suggestions = index.autocomplete("ban")
+
+    assert set(suggestions) == {"Bánh bao", "Bánh mì thịt", "Phở bò"}
+    # "bánh" only appears in the ingredients of Phở bò
+    assert suggestions[-1] == "Phở bò"
+    assert index.autocomplete("banh m") == ["Bánh mì thịt"]
+
+
+@pytest.mark.unit
+def test_highlight_trims_around_first_match():
+    text = " ".join(f"word{i}" for i in range(40)) + " Phở"
+    snippet = highlight(text, ["pho"], max_words=10)
+
+    assert snippet.endswith("<mark>Phở</mark>")
+    assert len(snippet.split()) <= 10
+
+
+@pytest.mark.integration
+def test_like_pattern_treats_wildcards_literally(session: Session):
+    """The SQL substring match escapes % and _ typed by the user."""
+    def matches(text: str, query: str) -> bool:
+        pattern = f"%{_escape_like(query)}%"
+        return session.execute(select(literal(text).like(pattern, escape="\\"))).scalar()
+
+    assert matches("giảm 50% hôm nay", "50%")
+    assert not matches("giảm 500 hôm nay", "50%")
+    assert matches("banh_mi", "h_m") and not matches("banh mi", "h_m")
+    assert matches("a\\b", "a\\b") and not matches("ab", "a\\b")
@@ -0,0 +1,85 @@
+"""
+Unit tests for the in-process store grid index.
+"""
+import uuid
+
+import numpy as np
+import pytest
+
+from app.services.spatial_index import StoreGridIndex, haversine_km
+
+
+def make_store(latitude: float, longitude: float, name: str = "Store") -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "name": name,
+        "address": "Ho Chi Minh City",
+        "description": None,
+        "logo_url": None,
+        "owner_id": uuid.uuid4(),
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+@pytest.mark.unit
+def test_haversine_known_distance():
+    """Ben Thanh market to Tan Son Nhat airport is roughly 6.6 km."""
+    distance = haversine_km(10.7725, 106.6980, np.array([10.8185]), np.array([106.6588]))
+    assert distance[0] == pytest.approx(6.65, abs=0.2)
+
+
+@pytest.mark.unit
+def test_nearest_returns_sorted_stores_within_radius():
+    index = StoreGridIndex(cell_size_deg=0.01)
+    near = make_store(10.7770, 106.7010, "near")
+    middle = make_store(10.7900, 106.7100, "middle")
+    far = make_store(11.5000, 107.5000, "far")
+    index.load([far, middle, near])
+
+    results = index.nearest(10.7769, 106.7009, radius_km=5.0)
+
+    assert [store["name"] for store, _ in results] == ["near", "middle"]
+    assert results[0][1] < results[1][1] <= 5.0
+
+
+@pytest.mark.unit
+def test_incremental_upsert_and_remove():
+    index = StoreGridIndex(cell_size_deg=0.01)
+    store = make_store(10.7770, 106.7010)
+    index.upsert(store)
+    assert len(index.nearest(10.7769, 106.7009, radius_km=1.0)) == 1
+
+    # Moving the store to another cell must drop it from the old one
+    index.upsert({**store, "latitude": 21.0285, "longitude": 105.8542})
+    assert index.nearest(10.7769, 106.7009, radius_km=1.0) == []
+    assert len(index.nearest(21.0285, 105.8542, radius_km=1.0)) == 1
+
+    index.remove(store["id"])
+    assert len(index) == 0
+
+
+@pytest.mark.unit
+def test_pagination_and_missing_coordinates():
+    index = StoreGridIndex()
+    stores = [make_store(10.7769 + i * 0.001, 106.7009) for i in range(5)]
+    index.load(stores + [make_store(None, None)])
+
+    assert len(index) == 5
+    first = index.nearest(10.7769, 106.7009, radius_km=10.0, skip=0, limit=2)
+    rest = index.nearest(10.7769, 106.7009, radius_km=10.0, skip=2, limit=10)
+    assert [s["id"] for s, _ in first + rest] == [s["id"] for s in stores]
+
+
+@pytest.mark.unit
+def test_store_coordinates_decode_without_postgis():
+    """The index fallback reads the raw location column: EWKB bytes, or hex text from PostgreSQL."""
+    from geoalchemy2.shape import from_shape
+    from shapely.geometry import Point
+
+    from app.crud import _store_index_coordinates
+
+    location = from_shape(Point(106.6980, 10.7725), srid=4326, extended=True)
+    for raw in (bytes(location.data), memoryview(bytes(location.data)), location.desc):
+        assert _store_index_coordinates(raw) == pytest.approx((10.7725, 106.6980))
+    assert _store_index_coordinates(None) == (None, None)
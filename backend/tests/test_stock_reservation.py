@@ -0,0 +1,169 @@
+"""
+Tests for atomic stock reservation (app/services/reservation.py).
+
+The stress test opens its own connections to TEST_DATABASE_URL, since its threads
+need committed rows; it is skipped unless that database is PostgreSQL.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, create_engine, delete
+
+from app.models import FoodItem, Store, SurpriseBag, User, UserRole
+from app.schemas.order import OrderItemCreate
+from app.services.reservation import (
+    FOOD_ITEM, SURPRISE_BAG, InsufficientStockError, release_stock, reserve_stock, stock_lines
+)
+
+
+def make_bag(store_id: uuid.UUID, quantity: int) -> SurpriseBag:
+    now = datetime.now()
+    return SurpriseBag(
+        original_value=50000.0,
+        discounted_price=25000.0,
+        discount_percentage=0.5,
+        quantity_available=quantity,
+        available_from=now,
+        available_until=now + timedelta(hours=4),
+        pickup_start_time=now + timedelta(hours=2),
+        pickup_end_time=now + timedelta(hours=4),
+        store_id=store_id,
+    )
+
+
+@pytest.mark.unit
+def test_stock_lines_sums_repeated_products():
+    bag_id, food_id = uuid.uuid4(), uuid.uuid4()
+    lines = stock_lines([
+        OrderItemCreate(surprise_bag_id=bag_id, quantity=1),
+        OrderItemCreate(food_item_id=food_id, quantity=2),
+        OrderItemCreate(surprise_bag_id=bag_id, quantity=3),
+    ])
+    assert lines == {(SURPRISE_BAG, bag_id): 4, (FOOD_ITEM, food_id): 2}
+
+
+@pytest.mark.integration
+def test_reserve_and_release_stock(session: Session, test_store: Store):
+    bag = make_bag(test_store.id, quantity=3)
+    food = FoodItem(name="Bánh mì", standard_price=20000.0, available_quantity=5, store_id=test_store.id)
+    session.add_all([bag, food])
+    session.commit()
+    lines = {(SURPRISE_BAG, bag.id): 2, (FOOD_ITEM, food.id): 5}
+
+    reserved = reserve_stock(session, lines)
+    session.commit()
+
+    assert reserved[(SURPRISE_BAG, bag.id)] == {
+        "name": bag.name, "price": 25000.0, "store_id": test_store.id, "held": 0
+    }
+    assert reserved[(FOOD_ITEM, food.id)]["price"] == 20000.0
+    session.refresh(bag)
+    session.refresh(food)
+    assert bag.quantity_available == 1
+    assert (food.available_quantity, food.reserved_quantity) == (0, 5)
+
+    release_stock(session, lines)
+    session.commit()
+    session.refresh(bag)
+    session.refresh(food)
+    assert bag.quantity_available == 3
+    assert (food.available_quantity, food.reserved_quantity) == (5, 0)
+
+
+@pytest.mark.integration
+def test_short_line_rolls_back_whole_reservation(session: Session, test_store: Store):
+    bag = make_bag(test_store.id, quantity=3)
+    food = FoodItem(name="Bánh mì", standard_price=20000.0, available_quantity=1, store_id=test_store.id)
+    session.add_all([bag, food])
+    session.commit()
+
+    with pytest.raises(InsufficientStockError) as exc_info:
+        reserve_stock(session, {(FOOD_ITEM, food.id): 2, (SURPRISE_BAG, bag.id): 2})
+    assert exc_info.value.key == (FOOD_ITEM, food.id)
+    assert exc_info.value.available == 1
+    assert "Not enough stock for Bánh mì" in str(exc_info.value)
+
+    missing_id = uuid.uuid4()
+    with pytest.raises(InsufficientStockError, match="not found") as exc_info:
+        reserve_stock(session, {(SURPRISE_BAG, missing_id): 1})
+    assert exc_info.value.available is None
+
+    session.commit()
+    session.refresh(bag)
+    assert bag.quantity_available == 3
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+@pytest.mark.skipif(
+    "postgresql" not in os.getenv("TEST_DATABASE_URL", ""),
+    reason="Concurrency stress test needs PostgreSQL"
+)
+def test_concurrent_reservations_never_oversell():
+    """Many threads race for one bag; exactly its stock is sold and the rest are refused."""
+    engine = create_engine(os.environ["TEST_DATABASE_URL"], pool_size=16, max_overflow=0)
+    stock, threads, attempts_per_thread = 50, 16, 10
+
+    with Session(engine) as session:
+        vendor = User(
+            full_name="Stress Vendor",
+            phone_number=f"09{uuid.uuid4().int % 10**8:08d}",
+            email=f"stress{uuid.uuid4().hex[:8]}@test.com",
+            hashed_password="x",
+            role=UserRole.VENDOR,
+        )
+        session.add(vendor)
+        session.flush()
+        store = Store(name="Stress Store", address="1 Test Street, Ho Chi Minh City", owner_id=vendor.id)
+        session.add(store)
+        session.flush()
+        bag = make_bag(store.id, quantity=stock)
+        session.add(bag)
+        session.commit()
+        bag_id, store_id, vendor_id = bag.id, store.id, vendor.id
+
+    sold, refused, errors = [], [], []
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        for _ in range(attempts_per_thread):
+            with Session(engine) as session:
+                try:
+                    reserve_stock(session, {(SURPRISE_BAG, bag_id): 1})
+                    session.commit()
+                    sold.append(1)
+                except InsufficientStockError:
+                    refused.append(1)
+                except Exception as e:  # pragma: no cover - reported below
+                    errors.append(e)
+
+    began = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    try:
+        with Session(engine) as session:
+            remaining = session.get(SurpriseBag, bag_id).quantity_available
+
+        assert errors == []
+        assert len(sold) == stock
+        assert len(refused) == threads * attempts_per_thread - stock
+        assert remaining == 0
+        # No row locks are held between statements, so 160 attempts finish quickly
+        assert threads * attempts_per_thread / elapsed > 100
+    finally:
+        with Session(engine) as session:
+            session.exec(delete(SurpriseBag).where(SurpriseBag.id == bag_id))
+            session.exec(delete(Store).where(Store.id == store_id))
+            session.exec(delete(User).where(User.id == vendor_id))
+            session.commit()
+        engine.dispose()
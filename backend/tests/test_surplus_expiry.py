@@ -0,0 +1,105 @@
+"""
+Tests for the surplus-expiry engine (app/services/surplus_expiry.py).
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import FoodItem, InventoryLog, Store, SurpriseBag, SurpriseBagItem, User
+from app.services.surplus_expiry import BagCandidate, pack_bag, run_surplus_expiry
+
+
+@pytest.fixture
+def grocer(session: Session, test_customer: User) -> Store:
+    store = Store(name="Grocer", address="2 Test Street, Ho Chi Minh City", owner_id=test_customer.id)
+    session.add(store)
+    session.commit()
+    return store
+
+
+def candidate(value: float, weight: float, units: int, priority: float = 1.0) -> BagCandidate:
+    return BagCandidate(
+        food_item_id=uuid.uuid4(), unit_value=value, unit_weight=weight, units=units,
+        priority=priority, expires_at=datetime.now(),
+    )
+
+
+@pytest.mark.unit
+def test_pack_bag_solves_the_bounded_knapsack():
+    heavy = candidate(value=60000, weight=1000, units=5)
+    light = candidate(value=25000, weight=300, units=4)
+    urgent = candidate(value=20000, weight=300, units=2, priority=2.0)
+
+    chosen = pack_bag([heavy, light, urgent], max_weight=2000, step=50)
+
+    # Best score under 2 kg: 4 light (100000) + 2 urgent (2 x 40000) in 1.8 kg, ahead of
+    # the heavy item with 2 urgent and 1 light (165000 in 1.9 kg)
+    assert chosen == {light.food_item_id: 4, urgent.food_item_id: 2}
+    assert pack_bag([candidate(value=90000, weight=2500, units=3)], max_weight=2000, step=50) == {}
+
+
+@pytest.mark.integration
+def test_expiring_stock_is_marked_and_bagged_per_store(
+    session: Session, test_store: Store, grocer: Store, monkeypatch
+):
+    monkeypatch.setattr(settings, "SURPLUS_EXPIRY_STORE_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "SURPLUS_BAG_MAX_WEIGHT_GRAMS", 1000)
+    monkeypatch.setattr(settings, "SURPLUS_BAG_MIN_VALUE", 50000)
+    now = datetime.now()
+    bakery, grocer = test_store.id, grocer.id
+    bread = FoodItem(
+        name="Bánh mì", standard_price=20000, weight=250, total_quantity=10, available_quantity=8,
+        reserved_quantity=2, expires_at=now + timedelta(hours=6), store_id=bakery,
+    )
+    cake = FoodItem(
+        name="Bánh kem", standard_price=100000, weight=750, total_quantity=4, available_quantity=1,
+        surplus_quantity=3, surplus_discount_percentage=0.3, is_marked_for_surplus=True,
+        expires_at=now + timedelta(hours=12), store_id=bakery,
+    )
+    later = FoodItem(
+        name="Bánh quy", standard_price=30000, total_quantity=5, available_quantity=5,
+        expires_at=now + timedelta(days=5), store_id=bakery,
+    )
+    milk = FoodItem(
+        name="Sữa", standard_price=30000, weight=1000, total_quantity=1, available_quantity=1,
+        expires_at=now + timedelta(hours=20), store_id=grocer,
+    )
+    session.add_all([bread, cake, later, milk])
+    session.commit()
+
+    stats = run_surplus_expiry(session, now=now)
+
+    assert (stats.stores, stats.items_marked, stats.units_marked, stats.failed_batches) == (2, 3, 10, 0)
+    for item in (bread, cake, later, milk):
+        session.refresh(item)
+    assert later.available_quantity == 5 and not later.is_marked_for_surplus
+    assert bread.surplus_discount_percentage == settings.SURPLUS_EXPIRY_DISCOUNT
+    assert cake.surplus_discount_percentage == 0.3 and cake.surplus_price == 70000
+    # 1 kg bags: cake + bread (120000) four times, then 4 bread (80000) once
+    bags = session.exec(
+        select(SurpriseBag).where(SurpriseBag.store_id.in_([bakery, grocer])).order_by(SurpriseBag.original_value.desc())
+    ).all()
+    assert [(bag.store_id, bag.original_value, bag.quantity_available, bag.bag_type) for bag in bags] == [
+        (bakery, 120000, 4, "combo"),
+        (bakery, 80000, 1, "single_item"),
+    ]
+    assert all(bag.is_auto_generated and bag.available_until == bread.expires_at for bag in bags)
+    assert bags[0].discounted_price == round(120000 * (1 - settings.SURPLUS_BAG_DISCOUNT), 2)
+    # Packed units left the items; the milk is marked but worth too little to bag
+    assert (bread.total_quantity, bread.surplus_quantity, bread.available_quantity, bread.reserved_quantity) == (2, 0, 0, 2)
+    assert (cake.total_quantity, cake.surplus_quantity, cake.is_marked_for_surplus) == (0, 0, False)
+    assert (milk.surplus_quantity, milk.available_quantity, milk.is_marked_for_surplus) == (1, 0, True)
+    bag_items = session.exec(select(SurpriseBagItem).where(SurpriseBagItem.surprise_bag_id == bags[0].id)).all()
+    assert {(row.food_item_id, row.max_quantity) for row in bag_items} == {(bread.id, 1), (cake.id, 1)}
+    assert all(1 < row.weight_in_selection <= 2 for row in bag_items)
+    logs = session.exec(select(InventoryLog).where(InventoryLog.food_item_id == bread.id)).all()
+    assert sorted((log.change_type, log.quantity_change) for log in logs) == [
+        ("surplus_bagged", -4), ("surplus_bagged", -4), ("surplus_marked", 8),
+    ]
+
+    # Nothing left to mark, and the leftovers are below the minimum bag value
+    again = run_surplus_expiry(session, now=now)
+    assert (again.items_marked, again.bags_created) == (0, 0)
@@ -0,0 +1,39 @@
+"""
+Unit tests for the offline travel estimator.
+"""
+import pytest
+
+from app.services.travel_estimate import estimate_travel_info, get_speed_profile
+
+
+@pytest.mark.unit
+def test_estimate_matches_multi_profile_shape():
+    origin = (106.6980, 10.7725)  # Ben Thanh market (lng, lat)
+    destinations = [(106.6588, 10.8185), (106.6980, 10.7725)]
+
+    result = estimate_travel_info(origin, destinations)
+
+    assert set(result) == {"driving", "walking"}
+    assert len(result["driving"]) == len(result["walking"]) == 2
+    # ~6.6 km great-circle times the detour factor
+    assert result["driving"][0]["distance"] == pytest.approx(6650 * 1.3, rel=0.05)
+    assert result["walking"][0]["duration"] > result["driving"][0]["duration"]
+    assert result["driving"][1] == {"duration": 0.0, "distance": 0.0}
+
+
+@pytest.mark.unit
+def test_city_speed_profile_changes_durations():
+    origin = (106.6980, 10.7725)
+    destinations = [(106.6588, 10.8185)]
+
+    default = estimate_travel_info(origin, destinations)
+    hcmc = estimate_travel_info(origin, destinations, city="Ho Chi Minh City")
+
+    assert get_speed_profile("unknown city") == get_speed_profile(None)
+    assert hcmc["driving"][0]["distance"] == default["driving"][0]["distance"]
+    assert hcmc["driving"][0]["duration"] > default["driving"][0]["duration"]
+
+
+@pytest.mark.unit
+def test_empty_destinations():
+    assert estimate_travel_info((106.7, 10.77), []) == {"driving": [], "walking": []}
@@ -0,0 +1,41 @@
+"""
+Tests for the merchant store/ownership dependencies (deps.get_current_vendor_store,
+deps.get_vendor_food_item): how many queries they cost. The HTTP status codes they
+raise are covered in tests/api/endpoints/test_food_item.py.
+"""
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app import crud
+from app.api.deps import get_current_vendor_store, get_vendor_food_item
+from app.core.config import settings
+from app.models import FoodItem, Store, User
+
+
+@pytest.mark.integration
+def test_vendor_store_is_resolved_once_per_ttl(monkeypatch, session: Session, test_vendor: User, test_store: Store):
+    store_id = test_store.id
+    assert get_current_vendor_store(session, test_vendor).store_id == store_id
+
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert get_current_vendor_store(session, test_vendor).store_id == store_id
+    assert statements == []
+
+    monkeypatch.setattr(settings, "VENDOR_STORE_CACHE_TTL_SECONDS", 0)
+    crud._store_id_by_owner.clear()
+    get_current_vendor_store(session, test_vendor)
+    get_current_vendor_store(session, test_vendor)
+    assert len(statements) == 2
+
+
+@pytest.mark.integration
+def test_food_item_access_is_authorised_in_one_query(session: Session, test_vendor: User, test_food_item: FoodItem):
+    item_id = test_food_item.id
+    session.refresh(test_vendor)
+
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert get_vendor_food_item(session, test_vendor, item_id).id == item_id
+    assert len(statements) == 1 and "JOIN store" in statements[0]
@@ -3,9 +3,11 @@ Test utilities for WiseBite Backend tests.
 """
 import uuid
 import random
+from contextlib import contextmanager
 from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 
 
 def create_random_user_data(role: str = "customer") -> Dict[str, Any]:
@@ -252,3 +254,19 @@ def cleanup_test_data(session, models_to_delete: list):
     for model in models_to_delete:
         session.delete(model)
     session.commit()
+
+
+@contextmanager
+def count_queries(session):
+    """Count the SQL statements a session sends to the database inside the block."""
+    statements = []
+    engine = session.get_bind().engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)